@@ -3,17 +3,30 @@
 """
 
 import logging
-from typing import List
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
 from discord.ext import commands
-from matchmaker import Database, MatchMaker, Config
+from matchmaker import Database, DatabaseConfig, AsyncDatabase, MatchMaker, Config
 from matchmaker.tables import Round
+from matchmaker.archive import history
+from matchmaker.mm.journal import Journal
 from matchmaker.template import ColumnQuery, QueryKind, Max
 from matchmaker.event import EventKind
+from matchmaker.event.eventmap import shutdown_executors
+from matchmaker.event.handlers import TeamCacheHandler
+from matchmaker.cache import TeamCache
+from matchmaker.ranking import Ranking
+from matchmaker.writer import RoundRecord, RoundWriter
 
 from .config import BotConfig
 from .cogs import MatchMakerCog, DatabaseCog, AdminCog
-from .handlers import MatchStartHandler, MatchEndHandler, ResultHandler
+from .handlers import (
+    MatchStartHandler,
+    MatchEndHandler,
+    MatchExpireHandler,
+    ResultHandler,
+)
 from .help import Help
 
 __all__ = ("MatchMakerBot", "Database", "MatchMaker")
@@ -21,26 +34,63 @@ __all__ = ("MatchMakerBot", "Database", "MatchMaker")
 
 COGS = [AdminCog, DatabaseCog, MatchMakerCog]
 
+T = TypeVar("T")
+
 
 class MatchMakerBot(commands.Bot):
     """ Discord bot implementation of the matchmaker """
 
-    def __init__(self, config: BotConfig, mmcfg: Config, db: Database):
+    def __init__(
+        self,
+        config: BotConfig,
+        mmcfg: Config,
+        db: Database,
+        journal: Optional[Journal] = None,
+    ):
         super().__init__(command_prefix=config.command_prefix)
         self.logger = logging.getLogger(__name__)
         self.help_command = Help()
 
         self.db = db
+        self.adb = AsyncDatabase(db)
         self.config = config
+        self.teams = TeamCache(config.team_cache_size, config.team_cache_ttl)
+
+        dbcfg = db.config if db.config is not None else DatabaseConfig()
+        self.write_timeout = dbcfg.write_timeout
+        self.ranking = Ranking()
+        self.writer = RoundWriter(
+            db,
+            batch_size=dbcfg.write_batch,
+            max_pending=dbcfg.write_queue,
+            retries=dbcfg.write_retries,
+            spill_path=f"{db.path}.failed",
+            on_submitted=self.__submitted,
+            on_written=self.__written,
+        )
+
+        if dbcfg.archive_after_days > 0:
+            self.archive(dbcfg.archive_after_days)
+        # rounds that were not written when the bot stopped
+        self.writer.recover()
 
-        query = ColumnQuery(QueryKind.SELECT, "turn", Max("round_id"), [])
+        # archived rounds still count, their ids must not be reused
+        query = ColumnQuery(
+            QueryKind.SELECT, history("turn", full=True), Max("round_id"), []
+        )
         execq = self.db.execute(query, "QueryInitialRound")
         assert execq is not None
 
         round_id = execq.fetchone()[0]
-        round_id = 0 if round_id is None else round_id
-
-        self.mm = MatchMaker(mmcfg, Round(round_id=round_id + 1))
+        # rounds that are not written yet keep their ids too
+        round_id = max([round_id or 0, *self.writer.unwritten_ids()])
+
+        self.mm = MatchMaker(mmcfg, Round(round_id=round_id + 1), journal)
+        # rounds ended in the journal that never reached the writer
+        self.writer.recover(RoundRecord.of(rnd, mt) for rnd, mt in self.mm.ended)
+        with self.writer.paused():
+            pending = self.writer.pending_deltas()
+            self.ranking.load(self.db, mmcfg.base_elo, pending=pending)
         self.__register_handlers()
 
         for cog in COGS:
@@ -54,16 +104,65 @@ class MatchMakerBot(commands.Bot):
         """ format a successfull message """
         return f"{self.config.ok_prefix}    `{okmsg}`"
 
+    def archive(self, days: float) -> int:
+        """ archive the rounds that ended more than `days` days ago """
+        return self.db.archive_rounds(datetime.now() - timedelta(days=days))
+
+    def check_ranking(self) -> int:
+        """reload the ranking if it differs from the database and the rounds that
+        are not written yet, returns the number of misranked teams
+        """
+        base_elo = self.mm.config.base_elo
+        with self.writer.paused():
+            pending = self.writer.pending_deltas()
+            drifted = self.ranking.drift(self.db, base_elo, pending=pending)
+            if len(drifted) != 0:
+                self.ranking.load(self.db, base_elo, pending=pending)
+        return len(drifted)
+
+    def with_pending(
+        self, func: Callable[..., T], *args: Any
+    ) -> Tuple[T, Dict[int, float]]:
+        """run `func` while the writer is paused, returns its result and the elo
+        deltas of the rounds that are not written yet (every round is either in
+        the database or pending, never both nor neither)
+        """
+        with self.writer.paused():
+            return func(*args), self.writer.pending_deltas()
+
     def reset(self):
         """ reset matchmaker """
         self.mm.reset()
         self.__register_handlers()
 
+    async def close(self):
+        """wait for pending handlers, close the journal, write the queued rounds and
+        commit pending writes before closing the bot
+        """
+        self.mm.close()
+        shutdown_executors()
+        self.writer.close()
+        self.adb.close()
+        self.db.close()
+        await super().close()
+
     def __register_handlers(self):
         """ register bot handlers """
         self.mm.register_handler(MatchStartHandler(self.loop))
         self.mm.register_handler(MatchEndHandler(self.loop))
-        self.mm.register_handler(ResultHandler(self.db))
+        self.mm.register_handler(MatchExpireHandler(self.loop))
+        self.mm.register_handler(ResultHandler(self.writer, self.write_timeout))
+        self.mm.register_handler(TeamCacheHandler(self.teams))
+
+    def __submitted(self, record: RoundRecord):
+        """ move the teams of a round in the ranking as it is queued to be written """
+        self.ranking.add_results(record.results())
+
+    def __written(self, record: RoundRecord):
+        """ drop the teams of a written round from the cache """
+        for result in record.results():
+            assert result.team is not None
+            self.teams.invalidate(result.team.team_id, result.team.name)
 
     async def on_message(self, message):
         """ on message handler """
@@ -80,6 +179,13 @@ class MatchMakerBot(commands.Bot):
                 handler = self.mm.evmap[EventKind.ROUND_START][handler_index]
                 assert isinstance(handler, MatchStartHandler)
                 handler.channel = message.channel
+
+                handler_index = self.mm.evmap[EventKind.ROUND_EXPIRE].index(
+                    MatchExpireHandler(self.loop)
+                )
+                handler = self.mm.evmap[EventKind.ROUND_EXPIRE][handler_index]
+                assert isinstance(handler, MatchExpireHandler)
+                handler.channel = message.channel
             except ValueError:
                 pass
         elif is_command and message.content.startswith("+result"):
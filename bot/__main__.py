@@ -8,6 +8,7 @@ import json
 from typing import Optional
 
 from bot import MatchMakerBot, Database, config as cfg
+from matchmaker.mm.journal import Journal
 
 
 def parse() -> argparse.ArgumentParser:
@@ -21,6 +22,23 @@ def parse() -> argparse.ArgumentParser:
     parser.add_argument(
         "--database", type=str, default="matchmaker.sqlite3", help="Sets database path"
     )
+    parser.add_argument(
+        "--in-memory",
+        action="store_true",
+        help="Runs the database in memory, restored from and snapshot to --database",
+    )
+    parser.add_argument(
+        "--snapshot-interval",
+        type=float,
+        default=None,
+        help="Sets seconds between in-memory database snapshots (0 only at shutdown)",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        default=None,
+        help="Sets journal path, the matchmaker state is recovered from it",
+    )
     return parser
 
 
@@ -53,20 +71,39 @@ def log(log_file: str, level: str):
     return logging.getLogger(__name__)
 
 
-def main(dump_config: bool, loglevel: str, database: str, config: Optional[str]):
+def main(
+    dump_config: bool,
+    loglevel: str,
+    database: str,
+    in_memory: bool,
+    snapshot_interval: Optional[float],
+    config: Optional[str],
+    journal: Optional[str],
+):
     """ run the bot """
     logger = log("matchmaker.log", loglevel)
 
-    botcfg, mmcfg = cfg.from_file(config) if config is not None else cfg.default()
+    botcfg, mmcfg, dbcfg = (
+        cfg.from_file(config) if config is not None else cfg.default()
+    )
+    if in_memory:
+        dbcfg.in_memory = True
+    if snapshot_interval is not None:
+        dbcfg.snapshot_interval = snapshot_interval
     if dump_config:
-        cfgmap = {"bot": botcfg.__dict__, "matchmaker": mmcfg.__dict__}
+        cfgmap = {
+            "bot": botcfg.__dict__,
+            "matchmaker": mmcfg.__dict__,
+            "database": dbcfg.__dict__,
+        }
         print(json.dumps(cfgmap, indent=4))
         return 0
 
     bot = MatchMakerBot(
         botcfg,
         mmcfg,
-        Database(database),
+        Database(database, config=dbcfg),
+        Journal(journal) if journal is not None else None,
     )
 
     token = os.getenv("DISCORD_TOKEN")
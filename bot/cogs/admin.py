@@ -3,6 +3,7 @@
 from discord.ext import commands
 
 from matchmaker.mm.games import Games
+from matchmaker.template import SHAPES
 
 __all__ = ("AdminCog",)
 
@@ -75,3 +76,74 @@ class AdminCog(commands.Cog):
         """ dump games to chat """
         message = f"""```{format_games(ctx.bot.mm.get_games())}\n```"""
         await ctx.message.channel.send(content=message, reference=ctx.message)
+
+    @commands.command()
+    @commands.has_role("matchmaker_admin")
+    async def handlers(self, ctx):
+        """ dump handler latency statistics to chat """
+        content = ""
+        stats = ctx.bot.mm.handler_stats().items()
+        for (kind, handler), stat in sorted(stats, key=lambda x: (x[0][0].value, x[0][1])):
+            content += f"\n{kind.name} | {handler}: calls={stat.calls}, \
+errors={stat.errors}, p50={stat.percentile(50) / 1e6:.2f}ms, \
+p99={stat.percentile(99) / 1e6:.2f}ms, max={stat.max_ns / 1e6:.2f}ms"
+        message = f"""```{content}\n```"""
+        await ctx.message.channel.send(content=message, reference=ctx.message)
+
+    @commands.command()
+    @commands.has_role("matchmaker_admin")
+    async def queries(self, ctx):
+        """ dump compiled query cache and query latency statistics to chat """
+        content = f"shapes={len(SHAPES)}/{SHAPES.maxsize}, hits={SHAPES.hits}, \
+misses={SHAPES.misses}, hit ratio={SHAPES.hit_ratio:.2%}"
+        for title, stat in sorted(ctx.bot.db.query_summary().items()):
+            content += f"\n{title}: calls={stat.calls}, slow={stat.slow}, \
+p50={stat.p50_ms:.2f}ms, p95={stat.p95_ms:.2f}ms, p99={stat.p99_ms:.2f}ms, \
+max={stat.max_ms:.2f}ms"
+        message = f"""```{content}\n```"""
+        await ctx.message.channel.send(content=message, reference=ctx.message)
+
+    @commands.command()
+    @commands.has_role("matchmaker_admin")
+    async def ratings(self, ctx):
+        """verify the stored team ratings and rebuild them if they drifted,
+        then reload the ranking if it differs from the database
+        """
+        bot = ctx.bot
+        drifted = await bot.adb.run(bot.db.verify_ratings)
+        content = ""
+        for team_id, stored, expected in drifted:
+            content += f"\n{team_id} | stored={stored}, expected={expected}"
+        if len(drifted) != 0:
+            await bot.adb.run(bot.db.rebuild_ratings)
+            content = f"Rebuilt drifted team ratings:{content}\n"
+
+        ranked = await bot.loop.run_in_executor(None, bot.check_ranking)
+        if ranked != 0:
+            content += f"Reloaded the ranking, {ranked} team(s) were misranked\n"
+
+        if content == "":
+            message = bot.fmtok("Team ratings and ranking match the results")
+        else:
+            message = f"""```{content}```"""
+        await ctx.message.channel.send(content=message, reference=ctx.message)
+
+    @commands.command()
+    @commands.has_role("matchmaker_admin")
+    async def history(self, ctx):
+        """ replay the recorded matches to rebuild the rating history """
+        await ctx.bot.adb.run(ctx.bot.db.rebuild_history)
+        message = ctx.bot.fmtok("Rebuilt the rating history from the matches")
+        await ctx.message.channel.send(content=message, reference=ctx.message)
+
+    @commands.command()
+    @commands.has_role("matchmaker_admin")
+    async def archive(self, ctx, days: float):
+        """ move the rounds that ended more than `days` days ago to the archive """
+        if not ctx.bot.db.archived:
+            message = ctx.bot.fmterr("No archive database is configured")
+        else:
+            await ctx.bot.loop.run_in_executor(None, ctx.bot.writer.flush)
+            count = await ctx.bot.adb.run(ctx.bot.archive, days)
+            message = ctx.bot.fmtok(f"Archived {count} round(s)")
+        await ctx.message.channel.send(content=message, reference=ctx.message)
@@ -1,13 +1,15 @@
 """ Commands that use the database """
 
 import io
-from typing import Optional, Dict, List
+from typing import Optional
 
 from discord.ext import commands
 from discord import File
 
 import matplotlib.pyplot as plt
 
+from matchmaker.analytics import async_elo_series, async_history_deltas
+from matchmaker.archive import history
 from matchmaker.tables import Player, Team
 from matchmaker.template import (
     ColumnQuery,
@@ -16,8 +18,9 @@ from matchmaker.template import (
     And,
     Or,
     Where,
-    InnerJoin,
-    Alias,
+    OrderBy,
+    Over,
+    Sum,
 )
 
 from ..converters import ToPlayer, ToRegisteredTeam
@@ -25,23 +28,6 @@ from ..converters import ToPlayer, ToRegisteredTeam
 __all__ = ("DatabaseCog",)
 
 
-class SmallResult:  # pylint: disable=too-few-public-methods
-    """ small result class for display """
-
-    turn_id: int
-    team_name: str
-    delta: float
-
-    def __init__(self, turn_id: int, team_name: str, delta: float):
-        self.turn_id = turn_id
-        self.team_name = team_name
-        self.delta = delta
-
-    def as_tuple(self):
-        """ returns a tuple of the round and the delta (for graphing) """
-        return (self.turn_id, self.delta)
-
-
 class DatabaseCog(commands.Cog):
     """ Database operations commands """
 
@@ -56,12 +42,12 @@ class DatabaseCog(commands.Cog):
             await ctx.message.channel.send(content=message, reference=ctx.message)
             return
 
-        if not bot.db.exists(current, "RegisterUnregisteredPlayer"):
-            assert bot.db.insert(current)
-        if not bot.db.exists(teammate, "RegisterUnregisteredPlayer"):
-            assert bot.db.insert(teammate)
+        if not await bot.adb.exists(current, "RegisterUnregisteredPlayer"):
+            assert await bot.adb.insert(current)
+        if not await bot.adb.exists(teammate, "RegisterUnregisteredPlayer"):
+            assert await bot.adb.insert(teammate)
 
-        if bot.db.exists(Team(name=team_name), "IsDuplicateTeamName"):
+        if await bot.adb.exists(Team(name=team_name), "IsDuplicateTeamName"):
             message = f"'{team_name}' is already present, use a different name!"
             message = bot.fmterr(message)
             await ctx.message.channel.send(content=message, reference=ctx.message)
@@ -84,21 +70,25 @@ class DatabaseCog(commands.Cog):
                 )
             ),
         )
-        execq = bot.db.execute(query, "PlayerHasTeam")
-        assert execq is not None
-        if execq.fetchone()[0] == 1:
+        has_team = await bot.adb.fetchone(query, "PlayerHasTeam")
+        assert has_team is not None
+        if has_team[0] == 1:
             query.kind = QueryKind.SELECT
-            cursor = bot.db.execute(query, "FetchTeamName")
-            assert cursor is not None
-            team_name = cursor.fetchone()[0]
+            fetched = await bot.adb.fetchone(query, "FetchTeamName")
+            assert fetched is not None
+            team_name = fetched[0]
             message = bot.fmterr(
                 f"'{current.name}' is already in a team with '{teammate.name}' ('{team_name}')!"
             )
             await ctx.message.channel.send(content=message, reference=ctx.message)
         else:
-            assert bot.db.insert(
+            assert await bot.adb.insert(
                 Team(name=team_name, player_one=current, player_two=teammate)
             )
+            bot.teams.invalidate(name=team_name)
+            team = await bot.adb.load(Team(name=team_name, elo=bot.mm.config.base_elo))
+            assert isinstance(team, Team)
+            bot.ranking.put(team)
             message = bot.fmtok(
                 f"registered {current.name}'s and {teammate.name}'s team {team_name}"
             )
@@ -128,102 +118,74 @@ class DatabaseCog(commands.Cog):
 
         def format_team(query):
             tid, tname, _, p1name, _, p2name, delta = query
-            elo = ctx.bot.mm.config.base_elo + delta
+            elo = ctx.bot.mm.config.base_elo + delta + pending.get(tid, 0.0)
             return f"{tid} | {tname}({elo}): {p1name} & {p2name}"
 
-        execq = ctx.bot.db.execute(query, "FetchTeamsWithElo")
-        assert execq is not None
-        content = "\n".join(map(format_team, execq.fetchall()))
+        rows, pending = await ctx.bot.loop.run_in_executor(
+            None, ctx.bot.with_pending, ctx.bot.db.read, query, "FetchTeamsWithElo"
+        )
+        assert rows is not None
+        content = "\n".join(map(format_team, rows))
         message = f"""```{content}\n```"""
         await ctx.message.channel.send(content=message, reference=ctx.message)
 
     @commands.command()
-    async def leaderboard(self, ctx):
-        """ send the leaderboard """
-        query = ColumnQuery(QueryKind.SELECT, "team_details_with_delta", "*", [])
-
-        def format_team(query):
-            tid, tname, p1id, p1name, p2id, p2name, delta = query
-            elo = ctx.bot.mm.config.base_elo + delta
-            return Team(
-                team_id=tid,
-                name=tname,
-                player_one=Player(discord_id=p1id, name=p1name),
-                player_two=Player(discord_id=p2id, name=p2name),
-                elo=elo,
-            )
-
-        execq = ctx.bot.db.execute(query, "FetchLeaderboard")
-        assert execq is not None
-        teams = list(map(format_team, execq.fetchall()))
-        teams.sort(reverse=True, key=lambda x: x.elo)
+    async def leaderboard(self, ctx, page: int = 1):
+        """ send a page of the leaderboard """
+        page = max(1, page)
         content = ""
-        for rank, team in enumerate(teams, 1):
+        for rank, team in ctx.bot.ranking.page(page):
             content += f"{rank}. {team}\n"
-            if rank > 15:
-                break
-        message = f"""```Leaderboard:\n{content}\n```"""
+        message = f"""```Leaderboard (page {page}):\n{content}\n```"""
+        await ctx.message.channel.send(content=message, reference=ctx.message)
+
+    @commands.command()
+    async def rank(self, ctx, who: ToRegisteredTeam):
+        """ send the rank of a team """
+        rank = ctx.bot.ranking.rank(who.team_id)
+        if rank is None:
+            message = ctx.bot.fmterr(f"'{who.name}' is not ranked yet")
+        else:
+            team = ctx.bot.ranking.get(who.team_id)
+            message = ctx.bot.fmtok(
+                f"{team} is ranked {rank} of {len(ctx.bot.ranking)}"
+            )
         await ctx.message.channel.send(content=message, reference=ctx.message)
 
     @commands.command()
     async def stats(
-        self, ctx, who: Optional[ToRegisteredTeam] = None
+        self, ctx, who: Optional[ToRegisteredTeam] = None, full: bool = False
     ):  # pylint: disable=R0914
-        """ send a graph of the elo variations for one or all teams """
+        """send a graph of the cumulated elo variation of one or all teams, archived
+        rounds are only included with `full`
+        """
+        # rows are read in primary key order, one range of the index per team,
+        # and SQLite sums the variations up to each round in the same pass
         query = ColumnQuery(
             QueryKind.SELECT,
-            "match",
-            [
-                "turn.round_id",
-                "rt1.team_id",
-                "rt1.team_name",
-                "rt1.delta",
-                "rt2.team_id",
-                "rt2.team_name",
-                "rt2.delta",
-            ],
+            history("rating_history", full),
             [
-                InnerJoin("turn", on=Eq("turn.round_id", "match.round_id")),
-                InnerJoin(
-                    Alias("result_with_team_details", "rt1"),
-                    on=Eq("rt1.result_id", "match.result_one"),
-                ),
-                InnerJoin(
-                    Alias("result_with_team_details", "rt2"),
-                    on=Eq("rt2.result_id", "match.result_two"),
-                ),
+                "team_id",
+                "round_id",
+                Over(Sum("delta"), partition_by=["team_id"], order_by=["round_id"]),
             ],
+            [OrderBy(["team_id", "round_id"])],
         )
-
         if who is not None:
             assert isinstance(query.statement, list)
-            query.statement.append(
-                Where(
-                    Or(Eq("rt1.team_id", who.team_id), Eq("rt2.team_id", who.team_id))
-                )
-            )
+            query.statement.insert(0, Where(Eq("team_id", who.team_id)))
 
-        execq = ctx.bot.db.execute(query, "FetchTeamsWithElo")
-        assert execq is not None
+        def name_of(team_id: int) -> Optional[str]:
+            team = ctx.bot.ranking.get(team_id)
+            return None if team is None else team.name
 
-        group: Dict[int, List[SmallResult]] = {}
-        for data in execq.fetchall():
-            turn_id, t1id, t1n, t1d, t2id, t2n, t2d = data
-            team1 = group.get(t1id, [SmallResult(0, t1n, 0)])
-            team2 = group.get(t2id, [SmallResult(0, t2n, 0)])
-            group[t1id] = team1 + [SmallResult(turn_id, t1n, t1d)]
-            group[t2id] = team2 + [SmallResult(turn_id, t2n, t2d)]
+        rows = ctx.bot.adb.iter_rows(query, "FetchRatingHistory")
+        series = await async_elo_series(async_history_deltas(rows, name_of))
 
         figure = plt.figure()
         axes = figure.add_subplot()
-        if who is not None:
-            team = group[who.team_id]
-            name = team[0].team_name if len(team) > 0 else ""
-            axes.plot(*zip(*map(SmallResult.as_tuple, team)), label=name)
-        else:
-            for _, team in group.items():
-                name = team[0].team_name if len(team) > 0 else ""
-                axes.plot(*zip(*map(SmallResult.as_tuple, team)), label=name)
+        for team in series.values():
+            axes.plot(team.rounds, team.deltas, label=team.name)
 
         plt.legend(bbox_to_anchor=(1.04, 0.5), loc="center left", borderaxespad=0)  # type: ignore
         plt.title(
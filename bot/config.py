@@ -6,8 +6,9 @@ from typing import Tuple
 from dataclasses import dataclass, field
 
 from matchmaker.mm import Config as MatchMakerConfig
+from matchmaker.db import DatabaseConfig
 
-__all__ = ("BotConfig", "MatchMakerConfig", "from_file", "default")
+__all__ = ("BotConfig", "MatchMakerConfig", "DatabaseConfig", "from_file", "default")
 
 
 @dataclass
@@ -18,24 +19,28 @@ class BotConfig:
     channel: str = field(default="haxball")
     ok_prefix: str = field(default=":smile:")
     err_prefix: str = field(default=":weary:")
+    team_cache_size: int = field(default=256)
+    team_cache_ttl: float = field(default=60.0)
 
 
-def default() -> Tuple[BotConfig, MatchMakerConfig]:
-    """ return default bot and matchmaker config """
-    return (BotConfig(), MatchMakerConfig())
+def default() -> Tuple[BotConfig, MatchMakerConfig, DatabaseConfig]:
+    """ return default bot, matchmaker and database config """
+    return (BotConfig(), MatchMakerConfig(), DatabaseConfig())
 
 
-def from_file(path: str) -> Tuple[BotConfig, MatchMakerConfig]:
-    """ load bot and matchmaker config from file """
+def from_file(path: str) -> Tuple[BotConfig, MatchMakerConfig, DatabaseConfig]:
+    """ load bot, matchmaker and database config from file """
     with open(path, "r") as config:
         cfg = json.loads(config.read())
 
-    botcfg, mmcfg = default()
+    botcfg, mmcfg, dbcfg = default()
     if "matchmaker" in cfg:
         mmcfg.__dict__.update(cfg["matchmaker"])
     if "bot" in cfg:
         botcfg.__dict__.update(cfg["bot"])
+    if "database" in cfg:
+        dbcfg.__dict__.update(cfg["database"])
 
     logger = logging.getLogger(__name__)
     logger.info("Loaded config from '%s'", path)
-    return (botcfg, mmcfg)
+    return (botcfg, mmcfg, dbcfg)
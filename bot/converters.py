@@ -19,27 +19,34 @@ class ToPlayer(MemberConverter, Player):  # pylint: disable=too-many-ancestors
 
 
 class ToRegisteredTeam(Converter, Team):
-    """ load a team that has to be registered """
+    """ load a team that has to be registered (through the bot's team cache) """
 
     async def convert(self, ctx, argument) -> Team:
-        db = ctx.bot.db
+        adb = ctx.bot.adb
         base_elo = ctx.bot.mm.config.base_elo
 
-        if not db.exists(Team(name=argument), "IsRegisteredTeamExists"):
+        cached = ctx.bot.teams.get(name=argument)
+        if cached is not None:
+            return cached
+
+        if not await adb.exists(Team(name=argument), "IsRegisteredTeamExists"):
             raise BadArgument(
                 f"'{argument}' does not exist, check spelling or register it!"
             )
 
-        team = cast(
-            Optional[Team],
-            db.load(Team(name=argument, elo=base_elo)),
+        loaded, pending = await ctx.bot.loop.run_in_executor(
+            None, ctx.bot.with_pending, adb.db.load, Team(name=argument, elo=base_elo)
         )
+        team = cast(Optional[Team], loaded)
         assert team is not None
         assert team.name is not None
         assert team.player_one is not None
         assert team.player_two is not None
         assert team.player_one.name is not None
         assert team.player_two.name is not None
+        # rounds waiting in the writer are not part of the loaded elo yet
+        team.elo += pending.get(team.team_id, 0.0)
+        ctx.bot.teams.put(team)
         return team
 
 
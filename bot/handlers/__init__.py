@@ -1,4 +1,4 @@
 """ Discord bot specific matchmaker event handlers """
 
 from .database import ResultHandler
-from .discord import MatchStartHandler, MatchEndHandler
+from .discord import MatchStartHandler, MatchEndHandler, MatchExpireHandler
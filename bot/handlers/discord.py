@@ -11,7 +11,7 @@ from matchmaker.mm.context import InGameContext
 from matchmaker.event import EventHandler, EventKind, EventContext
 from matchmaker.event.error import HandlingResult, HandlingError
 
-__all__ = ("MatchStartHandler", "MatchEndHandler")
+__all__ = ("MatchStartHandler", "MatchEndHandler", "MatchExpireHandler")
 
 
 class MatchStartHandler(EventHandler):
@@ -60,7 +60,9 @@ class MatchStartHandler(EventHandler):
         message = f"""
 :crossed_swords: :crossed_swords: :crossed_swords: - GAME START - :crossed_swords: :crossed_swords: :crossed_swords:
 ```{content}\n```"""
-        self.eventloop.create_task(self.channel.send(content=message))
+        asyncio.run_coroutine_threadsafe(
+            self.channel.send(content=message), self.eventloop
+        )
         self.logger.debug("Round start message sent")
         return None
 
@@ -129,6 +131,48 @@ Duration: {hours}:{minutes}:{seconds} | Principal: {principal}\n"
         message = f"""
 :satellite: :satellite: :satellite: - END OF GAME - :satellite: :satellite: :satellite:
 ```{content}\n```"""
-        self.eventloop.create_task(self.channel.send(content=message))
+        asyncio.run_coroutine_threadsafe(
+            self.channel.send(content=message), self.eventloop
+        )
         self.logger.debug("Round end message sent")
         return None
+
+
+class MatchExpireHandler(EventHandler):
+    """ Send a discord message when a round expires before all results are entered """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.logger = logging.getLogger("bot.handlers")
+        self.eventloop = loop
+        self.channel: Optional[TextChannel] = None
+
+    @property
+    def tag(self) -> int:
+        return hash(type(self).__name__)
+
+    @property
+    def kind(self) -> EventKind:
+        return EventKind.ROUND_EXPIRE
+
+    def is_ready(self, ctx: EventContext) -> bool:
+        return True
+
+    def requeue(self) -> bool:
+        return True
+
+    def handle(self, ctx: EventContext) -> HandlingResult:
+        if not isinstance(ctx.context, InGameContext):
+            return HandlingError("Expected an InGameContext", self)
+        if self.channel is None:
+            return HandlingError("Missing channel", self)
+
+        reported = len(ctx.context.matches)
+        content = f"Round: {ctx.context.round.round_id} | Reported matches: {reported}"
+        message = f"""
+:hourglass: :hourglass: :hourglass: - ROUND EXPIRED - :hourglass: :hourglass: :hourglass:
+```{content}\n```"""
+        asyncio.run_coroutine_threadsafe(
+            self.channel.send(content=message), self.eventloop
+        )
+        self.logger.debug("Round expire message sent")
+        return None
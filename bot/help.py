@@ -18,6 +18,12 @@ class Help(commands.HelpCommand):
         - clear_queue: removes everybody from the queue
         - clear_history: removes all matches from the match history
         - games: dumps all current games
+        - handlers: dumps handler latency statistics (needs instrument_handlers)
+        - queries: dumps compiled query cache and query latency statistics
+          (latencies need instrument_queries)
+        - ratings: verifies the stored team ratings and the ranking, rebuilds them on drift
+        - history: rebuilds the rating history of the teams from the matches
+        - archive: moves the rounds older than a number of days to the archive
     
     user:
         - register: 
@@ -29,12 +35,16 @@ class Help(commands.HelpCommand):
             example: +teams / +teams @BabyHaxbud
 
         - leaderboard:
-            shows the 15 best ranked teams
-            example: +leaderboard
+            shows a page of 16 ranked teams
+            example: +leaderboard / +leaderboard 2
+
+        - rank:
+            shows the rank of a team
+            example: +rank MyNewTeam
 
         - stats:
-            creates a graph with elo evolution
-            example: +stats / +stats MyNewTeam
+            creates a graph with elo evolution, add true to include archived rounds
+            example: +stats / +stats MyNewTeam / +stats MyNewTeam true
 
         - queue:
             adds your team to the queue, you need to specify the name
@@ -2,6 +2,20 @@
 
 from .mm import MatchMaker
 from .mm.config import Config
-from .db import Database
+from .db import Database, DatabaseConfig
+from .adb import AsyncDatabase
+from .memory import MemoryStorage
+from .operations import Storage
 
-__all__ = ("Database", "MatchMaker", "Config", "tables", "mm", "template")
+__all__ = (
+    "Database",
+    "DatabaseConfig",
+    "AsyncDatabase",
+    "Storage",
+    "MemoryStorage",
+    "MatchMaker",
+    "Config",
+    "tables",
+    "mm",
+    "template",
+)
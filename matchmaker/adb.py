@@ -0,0 +1,113 @@
+""" Asynchronous database interface for event loops """
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence, TypeVar
+
+from .db import Database, TransactionError
+from .operations import Table, Insertable, Loadable
+from .template import ColumnQuery
+
+__all__ = ("AsyncDatabase",)
+
+
+T = TypeVar("T")
+
+
+class AsyncDatabase:
+    """Awaitable facade of a database, calls are queued to a single connection
+    thread so they run one at a time in the order they were made
+    (results are fetched on that thread, cursors never reach the event loop)
+
+    `read` runs on a separate pool sized to the reader connections of the database
+    so read-heavy commands don't wait behind writes.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="matchmaker.db"
+        )
+        self.read_executor = ThreadPoolExecutor(
+            max_workers=max(1, db.reader_count), thread_name_prefix="matchmaker.db.read"
+        )
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """ run a function on the connection thread """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def execute(self, query: ColumnQuery, title: str) -> Optional[List[Any]]:
+        """ execute a template query, returns every row or None on failure """
+        return await self.run(self.__fetchall, query, title)
+
+    async def read(self, query: ColumnQuery, title: str) -> Optional[List[Any]]:
+        """ execute a read-only template query on a reader, returns every row """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.read_executor, partial(self.db.read, query, title)
+        )
+
+    async def iter_rows(
+        self, query: ColumnQuery, title: str, batch: int = 256
+    ) -> AsyncIterator[Any]:
+        """ stream the rows of a read-only template query, batches are fetched on a reader """
+        loop = asyncio.get_running_loop()
+        batches = self.db.iter_batches(query, title, batch)
+        try:
+            while True:
+                rows = await loop.run_in_executor(self.read_executor, next, batches, None)
+                if rows is None:
+                    return
+                for row in rows:
+                    yield row
+        finally:
+            await loop.run_in_executor(self.read_executor, batches.close)
+
+    async def fetchone(self, query: ColumnQuery, title: str) -> Optional[Any]:
+        """ execute a template query, returns the first row or None on failure """
+        return await self.run(self.__fetchone, query, title)
+
+    async def exists(self, table: Table, title: str = "ExistQuery") -> bool:
+        """ Check if record exists """
+        return await self.run(self.db.exists, table, title)
+
+    async def insert(self, query: Insertable, title: str = "InsertQuery") -> bool:
+        """ insert to the database, returns False on failure """
+        return await self.run(self.db.insert, query, title)
+
+    async def insert_many(
+        self, rows: Sequence[Insertable], title: str = "InsertManyQuery"
+    ) -> Optional[List[int]]:
+        """ insert rows of the same table in a transaction, returns their ids """
+        return await self.run(self.__insert_many, rows, title)
+
+    async def load(self, query: Loadable, title: str = "LoadQuery") -> Optional[Loadable]:
+        """ Load the class using information of passed through rhs """
+        return await self.run(self.db.load, query, title)
+
+    def close(self, wait_pending: bool = True):
+        """ stop the connection thread once queued calls are done """
+        self.executor.shutdown(wait=wait_pending)
+        self.read_executor.shutdown(wait=wait_pending)
+
+    def __fetchall(self, query: ColumnQuery, title: str) -> Optional[List[Any]]:
+        execq = self.db.execute(query, title)
+        return None if execq is None else execq.fetchall()
+
+    def __fetchone(self, query: ColumnQuery, title: str) -> Optional[Any]:
+        execq = self.db.execute(query, title)
+        return None if execq is None else execq.fetchone()
+
+    def __insert_many(
+        self, rows: Sequence[Insertable], title: str
+    ) -> Optional[List[int]]:
+        try:
+            with self.db.transaction():
+                ids = self.db.insert_many(rows, title)
+                if ids is None:
+                    raise TransactionError(f"{title} failed")
+                return ids
+        except TransactionError:
+            return None
@@ -0,0 +1,98 @@
+""" Single pass aggregations over streamed query rows """
+
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+__all__ = (
+    "EloSeries",
+    "history_deltas",
+    "group_deltas",
+    "elo_series",
+    "async_history_deltas",
+    "async_elo_series",
+)
+
+
+# round id, team id, team name, delta
+TeamDelta = Tuple[int, int, str, float]
+
+
+@dataclass
+class EloSeries:
+    """ Elo variation of a team by round, starts at round 0 with no variation """
+
+    name: str
+    rounds: List[int] = field(default_factory=lambda: [0])
+    deltas: List[float] = field(default_factory=lambda: [0.0])
+
+    def append(self, round_id: int, delta: float):
+        """ add the variation of a round """
+        self.rounds.append(round_id)
+        self.deltas.append(delta)
+
+
+def history_deltas(
+    rows: Iterable[Any], name_of: Callable[[int], Optional[str]]
+) -> Iterator[TeamDelta]:
+    """ add the team names to rows of (team id, round id, delta) of the rating history """
+    for team_id, round_id, delta in rows:
+        yield round_id, team_id, name_of(team_id) or str(team_id), delta
+
+
+def group_deltas(
+    series: Dict[int, EloSeries],
+    deltas: Iterable[TeamDelta],
+    team_id: Optional[int] = None,
+):
+    """ add the variations to the series of their team, only keeps `team_id` if it is set """
+    for delta in deltas:
+        _group_delta(series, delta, team_id)
+
+
+def elo_series(
+    deltas: Iterable[TeamDelta], team_id: Optional[int] = None
+) -> Dict[int, EloSeries]:
+    """ group the variations by team, only keeps `team_id` if it is set """
+    series: Dict[int, EloSeries] = {}
+    group_deltas(series, deltas, team_id)
+    return series
+
+
+
+async def async_history_deltas(
+    rows: AsyncIterable[Any], name_of: Callable[[int], Optional[str]]
+) -> AsyncIterator[TeamDelta]:
+    """ `history_deltas` of rows streamed by an async iterator """
+    async for team_id, round_id, delta in rows:
+        yield round_id, team_id, name_of(team_id) or str(team_id), delta
+
+
+async def async_elo_series(
+    deltas: AsyncIterable[TeamDelta], team_id: Optional[int] = None
+) -> Dict[int, EloSeries]:
+    """ `elo_series` of variations streamed by an async iterator """
+    series: Dict[int, EloSeries] = {}
+    async for delta in deltas:
+        _group_delta(series, delta, team_id)
+    return series
+
+
+def _group_delta(series: Dict[int, EloSeries], delta: TeamDelta, team_id: Optional[int]):
+    round_id, tid, name, variation = delta
+    if team_id is not None and tid != team_id:
+        return
+    team = series.get(tid)
+    if team is None:
+        team = series[tid] = EloSeries(name)
+    team.append(round_id, variation)
@@ -0,0 +1,183 @@
+""" Archival of old rounds into an attached database
+
+Rounds are moved with their matches, results and rating history to the `archive`
+schema, the delta sum of the archived results of each team is kept in
+`rating_checkpoint` so team ratings don't change. The `all_turn`, `all_match`,
+`all_result` and `all_rating_history` temporary views union the archive for
+queries that need the full history,
+`all_match_result` joins the matches to their results in each database
+(a match is archived with its results) so the join can use their keys.
+"""
+
+import pathlib
+import sqlite3 as sql
+
+__all__ = (
+    "ARCHIVE",
+    "ARCHIVE_HISTORY",
+    "ARCHIVE_ROUNDS",
+    "HISTORY_TABLES",
+    "attach",
+    "create_views",
+    "history",
+)
+
+
+ARCHIVE = "archive"
+
+HISTORY_TABLES = ("turn", "result", "match", "rating_history")
+
+# same columns and keys as the tables of matchmaker_db.sql (foreign keys can't
+# reference the main database)
+ARCHIVE_TABLES = {
+    "turn": """CREATE TABLE IF NOT EXISTS {schema}.turn (
+        round_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        start_time DATETIME NOT NULL,
+        end_time DATETIME,
+        participants INT NOT NULL
+    )""",
+    "result": """CREATE TABLE IF NOT EXISTS {schema}.result (
+        result_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        team_id INT NOT NULL,
+        points INT NOT NULL,
+        delta FLOAT NOT NULL
+    )""",
+    "match": """CREATE TABLE IF NOT EXISTS {schema}.match (
+        match_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        round_id INTEGER NOT NULL,
+        result_one INTEGER NOT NULL,
+        result_two INTEGER NOT NULL,
+        odds_ratio FLOAT
+    )""",
+    "rating_history": """CREATE TABLE IF NOT EXISTS {schema}.rating_history (
+        team_id INTEGER NOT NULL,
+        round_id INTEGER NOT NULL,
+        rating FLOAT NOT NULL,
+        delta FLOAT NOT NULL,
+
+        PRIMARY KEY (team_id, round_id)
+    ) WITHOUT ROWID""",
+}
+
+ARCHIVE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS {schema}.match_round ON match(round_id)",
+    "CREATE INDEX IF NOT EXISTS {schema}.match_result_one ON match(result_one)",
+    "CREATE INDEX IF NOT EXISTS {schema}.match_result_two ON match(result_two)",
+    "CREATE INDEX IF NOT EXISTS {schema}.result_team_delta ON result(team_id, delta)",
+]
+
+# executed in a single transaction with the `before` parameter
+ARCHIVE_ROUNDS = [
+    "CREATE TEMP TABLE IF NOT EXISTS archived_round (round_id INTEGER PRIMARY KEY)",
+    "CREATE TEMP TABLE IF NOT EXISTS archived_result (result_id INTEGER PRIMARY KEY)",
+    "DELETE FROM archived_round",
+    "DELETE FROM archived_result",
+    """INSERT INTO archived_round
+    SELECT round_id FROM main.turn WHERE end_time IS NOT NULL AND end_time < :before""",
+    """INSERT INTO archived_result
+    SELECT result_one FROM main.match WHERE round_id IN archived_round
+    UNION SELECT result_two FROM main.match WHERE round_id IN archived_round""",
+    """INSERT INTO rating_checkpoint(team_id, delta_sum, results)
+    SELECT team_id, SUM(delta), COUNT(*) FROM main.result
+    WHERE result_id IN archived_result
+    GROUP BY team_id
+    ON CONFLICT (team_id) DO UPDATE
+    SET delta_sum = delta_sum + excluded.delta_sum, results = results + excluded.results""",
+    """INSERT INTO archive.turn
+    SELECT * FROM main.turn WHERE round_id IN archived_round""",
+    """INSERT INTO archive.result
+    SELECT * FROM main.result WHERE result_id IN archived_result""",
+    """INSERT INTO archive.match
+    SELECT * FROM main.match WHERE round_id IN archived_round""",
+    """INSERT INTO archive.rating_history
+    SELECT * FROM main.rating_history WHERE round_id IN archived_round""",
+    "DELETE FROM main.rating_history WHERE round_id IN archived_round",
+    "DELETE FROM main.match WHERE round_id IN archived_round",
+    "DELETE FROM main.result WHERE result_id IN archived_result",
+    "DELETE FROM main.turn WHERE round_id IN archived_round",
+    # the result triggers took the archived deltas out of team_rating
+    """UPDATE team_rating
+    SET delta_sum = team_rating.delta_sum + archived.delta_sum,
+        results = team_rating.results + archived.results
+    FROM (
+        SELECT team_id, SUM(delta) AS delta_sum, COUNT(*) AS results
+        FROM archive.result WHERE result_id IN archived_result
+        GROUP BY team_id
+    ) AS archived
+    WHERE team_rating.team_id = archived.team_id""",
+]
+
+
+# run after a rating history rebuild, moves the history of archived rounds back
+ARCHIVE_HISTORY = [
+    "DELETE FROM archive.rating_history",
+    """INSERT INTO archive.rating_history
+    SELECT * FROM main.rating_history
+    WHERE round_id IN (SELECT round_id FROM archive.turn)""",
+    """DELETE FROM main.rating_history
+    WHERE round_id IN (SELECT round_id FROM archive.turn)""",
+]
+
+def attach(conn: sql.Connection, path: str, readonly: bool = False):
+    """attach the archive database, its tables are created unless it is read-only
+    (read-only connections must be opened with uri=True)
+    """
+    if readonly:
+        target = f"{pathlib.Path(path).resolve().as_uri()}?mode=ro"
+    else:
+        target = path
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE}", (target,))
+    if readonly:
+        return
+
+    for table in HISTORY_TABLES:
+        if not _has_primary_key(conn, table):
+            _rebuild(conn, table)
+        conn.execute(ARCHIVE_TABLES[table].format(schema=ARCHIVE))
+    for index in ARCHIVE_INDEXES:
+        conn.execute(index.format(schema=ARCHIVE))
+    conn.commit()
+
+
+def _has_primary_key(conn: sql.Connection, table: str) -> bool:
+    """ False if an archive table exists without its primary key """
+    columns = conn.execute(f"PRAGMA {ARCHIVE}.table_info({table})").fetchall()
+    return len(columns) == 0 or any(column[5] != 0 for column in columns)
+
+
+def _rebuild(conn: sql.Connection, table: str):
+    """ copy an archive table created without keys to a table with the real schema """
+    conn.execute(f"ALTER TABLE {ARCHIVE}.{table} RENAME TO {table}_unkeyed")
+    conn.execute(ARCHIVE_TABLES[table].format(schema=ARCHIVE))
+    conn.execute(
+        f"INSERT INTO {ARCHIVE}.{table} SELECT * FROM {ARCHIVE}.{table}_unkeyed"
+    )
+    conn.execute(f"DROP TABLE {ARCHIVE}.{table}_unkeyed")
+
+
+def create_views(conn: sql.Connection, attached: bool):
+    """create the full history views of the connection (temporary views can union
+    tables of attached databases)
+    """
+    for table in HISTORY_TABLES:
+        query = f"SELECT * FROM main.{table}"
+        if attached:
+            query += f" UNION ALL SELECT * FROM {ARCHIVE}.{table}"
+        conn.execute(f"DROP VIEW IF EXISTS temp.all_{table}")
+        conn.execute(f"CREATE TEMP VIEW all_{table} AS {query}")
+
+    schemas = ["main", ARCHIVE] if attached else ["main"]
+    query = " UNION ALL ".join(
+        f"""SELECT result.team_id, match.round_id, result.delta
+        FROM {schema}.match AS match
+        INNER JOIN {schema}.result AS result
+            ON result.result_id IN (match.result_one, match.result_two)"""
+        for schema in schemas
+    )
+    conn.execute("DROP VIEW IF EXISTS temp.all_match_result")
+    conn.execute(f"CREATE TEMP VIEW all_match_result AS {query}")
+
+
+def history(table: str, full: bool = False) -> str:
+    """ name of the history table to query, archived rows are only read if `full` """
+    return f"all_{table}" if full else table
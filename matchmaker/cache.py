@@ -0,0 +1,91 @@
+""" Read-through cache of loaded teams """
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .tables import Team
+
+__all__ = ("TeamCache",)
+
+
+class TeamCache:
+    """Bounded LRU cache of teams keyed by team id and name
+    - maxsize: number of teams kept before the least recently used is evicted
+    - ttl: seconds a team stays valid after it was loaded
+
+    Copies are stored and returned so callers can modify the teams they get.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.teams: "OrderedDict[int, Tuple[float, Team]]" = OrderedDict()
+        self.names: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.teams)
+
+    @property
+    def hit_ratio(self) -> float:
+        """ ratio of lookups that found a valid team """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups != 0 else 0.0
+
+    def get(
+        self, team_id: int = 0, name: Optional[str] = None, now: Optional[float] = None
+    ) -> Optional[Team]:
+        """ get a copy of the cached team by id or name, counts the hit or miss """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if team_id == 0 and name is not None:
+                team_id = self.names.get(name, 0)
+
+            entry = self.teams.get(team_id)
+            if entry is None or now - entry[0] > self.ttl:
+                if entry is not None:
+                    self.__remove(team_id)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.teams.move_to_end(team_id)
+            return copy.copy(entry[1])
+
+    def put(self, team: Team, now: Optional[float] = None):
+        """ cache a copy of a loaded team """
+        if not Team.validate(team) or team.name is None:
+            return
+
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.__remove(team.team_id)
+            self.teams[team.team_id] = (now, copy.copy(team))
+            self.names[team.name] = team.team_id
+            while len(self.teams) > self.maxsize:
+                self.__remove(next(iter(self.teams)))
+
+    def invalidate(self, team_id: int = 0, name: Optional[str] = None):
+        """ drop the team with this id or name """
+        with self.lock:
+            if team_id == 0 and name is not None:
+                team_id = self.names.get(name, 0)
+            self.__remove(team_id)
+
+    def clear(self):
+        """ drop every team and reset the counters """
+        with self.lock:
+            self.teams.clear()
+            self.names.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __remove(self, team_id: int):
+        entry = self.teams.pop(team_id, None)
+        if entry is not None and entry[1].name is not None:
+            self.names.pop(entry[1].name, None)
@@ -2,10 +2,20 @@
 
 import sqlite3 as sql
 import logging
-from typing import Any, Optional, Dict, cast
+import pathlib
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Any, Iterator, List, Optional, Dict, Sequence, Tuple, cast
 
-from .operations import Table, Insertable, Loadable
-from .template import ColumnQuery, QueryKind, Where
+from .archive import ARCHIVE_HISTORY, ARCHIVE_ROUNDS, attach, create_views
+from .migrations import REBUILD_HISTORY, REBUILD_RATINGS, VERIFY_RATINGS, migrate
+from .operations import Table, Insertable, Loadable, Storage
+from .querystats import QueryStats, QuerySummary
+from .template import ColumnQuery, QueryKind, Values, Where
 
 QUERYERROR = """{title} {{
     item: {item},
@@ -13,34 +23,325 @@ QUERYERROR = """{title} {{
     exception: {exception}
 }}"""
 
-__all__ = ("Database",)
+__all__ = ("Database", "DatabaseConfig", "TransactionError")
 
+MAX_VARIABLES = 999
 
-class Database:
-    """ Database abstraction from which you can check existence, insert and load """
+# pages copied per backup step and seconds to wait when a step finds the
+# connection writing
+SNAPSHOT_PAGES = 256
+SNAPSHOT_RETRY = 0.001
 
-    def __init__(self, path: str, log_handler=None, log_level=None):
-        self.__conn = sql.connect(path)
+# in-memory database behind a regular pager, without a leading "/" the name is
+# private to the connection that opens it
+MEMDB = "file:matchmaker?vfs=memdb"
+
+JOURNAL_MODES = ("delete", "truncate", "persist", "memory", "wal", "off")
+SYNCHRONOUS = ("off", "normal", "full", "extra")
+TEMP_STORES = ("default", "file", "memory")
+
+COMMIT_BATCH = "batch"
+COMMIT_INTERVAL = "interval"
+COMMIT_ROUND = "round"
+COMMIT_POLICIES = (COMMIT_BATCH, COMMIT_INTERVAL, COMMIT_ROUND)
+
+
+@dataclass
+class DatabaseConfig:
+    """Storage profile of the database connection
+    - journal_mode, synchronous, cache_size, mmap_size, temp_store, busy_timeout:
+      applied as sqlite pragmas when connecting (busy_timeout is in milliseconds)
+    - commit_policy: 'batch' commits after every insert, 'interval' commits pending
+      writes every `commit_interval` seconds, 'round' only commits transactions
+    - readers: read-only connections opened for `Database.read` in WAL mode
+    - instrument_queries: time queries by title over the last `query_window` calls,
+      queries slower than `slow_query_ms` are logged with their query plan
+    - write_batch, write_queue, write_retries, write_timeout: rounds written per
+      transaction, rounds queued before round ends are deferred to the failed rounds
+      (after waiting `write_timeout` seconds) and attempts of a transaction by the
+      round writer
+    - archive_path: database file attached to archive old rounds (none if empty),
+      rounds that ended more than `archive_after_days` ago are archived by the bot
+      when it starts (never if 0)
+    - in_memory, snapshot_interval: run the database in memory, restored from the
+      database file when connecting and copied back to it with the backup api every
+      `snapshot_interval` seconds (only when closing if 0) and when closing
+    """
+
+    journal_mode: str = field(default="wal")
+    synchronous: str = field(default="normal")
+    cache_size: int = field(default=-16000)
+    mmap_size: int = field(default=64 * 1024 * 1024)
+    temp_store: str = field(default="memory")
+    busy_timeout: int = field(default=5000)
+
+    commit_policy: str = field(default=COMMIT_BATCH)
+    commit_interval: float = field(default=1.0)
+
+    readers: int = field(default=2)
+
+    instrument_queries: bool = field(default=False)
+    slow_query_ms: float = field(default=100.0)
+    query_window: int = field(default=1024)
+
+    write_batch: int = field(default=8)
+    write_queue: int = field(default=64)
+    write_retries: int = field(default=3)
+    write_timeout: float = field(default=0.0)
+
+    archive_path: str = field(default="")
+    archive_after_days: float = field(default=0.0)
+
+    in_memory: bool = field(default=False)
+    snapshot_interval: float = field(default=60.0)
+
+    def validate(self):
+        """ raise ValueError on unsupported settings """
+        for name, value, choices in (
+            ("journal_mode", self.journal_mode, JOURNAL_MODES),
+            ("synchronous", self.synchronous, SYNCHRONOUS),
+            ("temp_store", self.temp_store, TEMP_STORES),
+            ("commit_policy", self.commit_policy, COMMIT_POLICIES),
+        ):
+            if value.lower() not in choices:
+                raise ValueError(f"Unsupported {name} '{value}', expected one of {choices}")
+        if self.commit_interval <= 0:
+            raise ValueError("commit_interval must be positive")
+        if self.readers < 0:
+            raise ValueError("readers can't be negative")
+        if self.query_window <= 0:
+            raise ValueError("query_window must be positive")
+        if self.archive_after_days < 0:
+            raise ValueError("archive_after_days can't be negative")
+        if self.snapshot_interval < 0:
+            raise ValueError("snapshot_interval can't be negative")
+
+    def pragmas(self) -> List[str]:
+        """ pragma statements of the profile """
+        return [
+            f"PRAGMA journal_mode={self.journal_mode.lower()}",
+            f"PRAGMA synchronous={self.synchronous.lower()}",
+            f"PRAGMA cache_size={int(self.cache_size)}",
+            f"PRAGMA mmap_size={int(self.mmap_size)}",
+            f"PRAGMA temp_store={self.temp_store.lower()}",
+            f"PRAGMA busy_timeout={int(self.busy_timeout)}",
+        ]
+
+
+class TransactionError(Exception):
+    """ raised inside a transaction to roll it back """
+
+
+class Database(Storage):
+    """SQLite storage from which you can check existence, insert and load
+    (sqlite defaults are kept and only transactions are committed without a config)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        log_handler=None,
+        log_level=None,
+        config: Optional[DatabaseConfig] = None,
+    ):
+        self.lock = threading.RLock()
         self.logger = logging.getLogger(__name__)
         if log_level:
             self.logger.setLevel(log_level)
         if log_handler:
             self.logger.addHandler(log_handler)
-        self.logger.info("Successfully connected to database file '%s'", path)
+
+        self.path = path
+        self.in_memory = config is not None and config.in_memory
+        self.__conn = self.__connect(path, self.in_memory)
+        self.config = config
+        self.commit_policy = COMMIT_ROUND
+        self.depth = 0
+        self.closed = False
+        self.closing = threading.Event()
+        self.committer: Optional[threading.Thread] = None
+        self.snapshotter: Optional[threading.Thread] = None
+        self.readers: "queue.Queue[sql.Connection]" = queue.Queue()
+        self.reader_count = 0
+        self.stats: Optional[QueryStats] = None
+        if config is not None:
+            self.__configure(config)
+        self.version = migrate(self.__conn)
+        self.archived = False
+        if config is not None and config.archive_path != "" and self.version > 0:
+            attach(self.__conn, config.archive_path)
+            self.archived = True
+        if self.version > 0:
+            create_views(self.__conn, self.archived)
+        if config is not None and not self.in_memory:
+            self.__open_readers(path, config)
+        if self.in_memory and config is not None and config.snapshot_interval > 0:
+            self.snapshotter = threading.Thread(
+                target=self.__snapshot_periodically,
+                args=(config.snapshot_interval,),
+                name="matchmaker.db.snapshot",
+                daemon=True,
+            )
+            self.snapshotter.start()
+
+        self.logger.info(
+            "Successfully connected to database %s '%s' (schema version %d)",
+            "snapshot" if self.in_memory else "file",
+            path,
+            self.version,
+        )
         self.last_err: Optional[Dict[str, Any]] = None
 
     def __del__(self):
-        self.__conn.commit()
-        self.__conn.close()
+        self.close()
+
+    def close(self):
+        """ commit pending writes and close the connection """
+        if self.closed:
+            return
+        self.closing.set()
+        if self.committer is not None:
+            self.committer.join()
+        if self.snapshotter is not None:
+            self.snapshotter.join()
+        for _ in range(self.reader_count):
+            self.readers.get().close()
+        self.reader_count = 0
+        with self.lock:
+            self.__conn.commit()
+            if self.in_memory:
+                self.snapshot()
+            self.__conn.close()
+            self.closed = True
+
+    def commit(self):
+        """ commit pending writes, transactions in progress are left untouched """
+        with self.lock:
+            if self.depth == 0 and self.__conn.in_transaction:
+                self.__conn.commit()
+
+    def snapshot(self, pages: int = SNAPSHOT_PAGES) -> bool:
+        """Copy the in-memory database to its file with the online backup api,
+        `pages` at a time, returns False on failure (the connection is released
+        between steps, writes made meanwhile are copied by the running backup)
+        """
+        if not self.in_memory:
+            return False
+
+        def step(_status: int, _remaining: int, _total: int):
+            self.lock.release()
+            time.sleep(0)
+            self.lock.acquire()
+            # the backup can't step while the connection has uncommitted writes
+            self.commit()
+
+        start = time.perf_counter_ns()
+        try:
+            dest = sql.connect(self.path)
+            try:
+                with self.lock:
+                    self.commit()
+                    self.__conn.backup(
+                        dest, pages=pages, progress=step, sleep=SNAPSHOT_RETRY
+                    )
+            finally:
+                dest.close()
+        except sql.Error as err:
+            self.logger.error("Failed to snapshot to '%s': %s", self.path, err)
+            return False
+        elapsed = (time.perf_counter_ns() - start) / 1e6
+        self.logger.debug("Snapshot database to '%s' in %.2fms", self.path, elapsed)
+        return True
 
     @property
     def conn(self) -> sql.Cursor:
         """ get sqlite3 cursor """
         return self.__conn.cursor()
 
+    @contextmanager
+    def transaction(self) -> Iterator["Database"]:
+        """Run the statements of the block in a single transaction, committed when
+        the block exits and rolled back if it raises
+        (other threads are blocked from the connection until then, nested blocks
+        are part of the outer transaction)
+        """
+        with self.lock:
+            if self.depth != 0:
+                self.depth += 1
+                try:
+                    yield self
+                finally:
+                    self.depth -= 1
+                return
+
+            if self.__conn.in_transaction:
+                self.__conn.commit()
+            self.__conn.execute("BEGIN IMMEDIATE")
+            self.depth = 1
+            try:
+                yield self
+            except BaseException:
+                self.__conn.rollback()
+                self.logger.warning("Rolled back transaction")
+                raise
+            finally:
+                self.depth = 0
+            self.__conn.commit()
+
     def insert(self, query: Insertable, title: str = "InsertQuery") -> bool:
         """ insert to the database, returns False on failure """
-        return self.execute(query.as_insert_query(), title) is not None
+        inserted = self.execute(query.as_insert_query(), title) is not None
+        self.__written(inserted)
+        return inserted
+
+    def insert_many(
+        self, rows: Sequence[Insertable], title: str = "InsertManyQuery"
+    ) -> Optional[List[int]]:
+        """Insert rows of the same table with multi-row inserts, returns the row ids
+        in order or None on failure (use inside a transaction so ids are contiguous)
+        """
+        if len(rows) == 0:
+            return []
+
+        queries = [row.as_insert_query() for row in rows]
+        headers = queries[0].headers
+        chunk = max(1, MAX_VARIABLES // max(1, len(headers)))
+        ids: List[int] = []
+        with self.lock:
+            for begin in range(0, len(queries), chunk):
+                batch = queries[begin : begin + chunk]
+                query = ColumnQuery(
+                    QueryKind.INSERT,
+                    batch[0].table,
+                    headers,
+                    [cast(Values, query.statement) for query in batch],
+                )
+                execq = self.execute(query, title)
+                if execq is None:
+                    return None
+                last = execq.lastrowid
+                ids.extend(range(last - len(batch) + 1, last + 1))
+            self.__written(True)
+        return ids
+
+    def insert_all(self, rows: Sequence[Insertable], title: str = "InsertAllQuery") -> bool:
+        """ insert rows of the same table with executemany, returns False on failure """
+        if len(rows) == 0:
+            return True
+
+        compiled = [row.as_insert_query().compile() for row in rows]
+        query = compiled[0][0]
+        try:
+            with self.lock:
+                start = time.perf_counter_ns()
+                self.conn.executemany(query, [params for _, params in compiled])
+                self.__timed(self.__conn, title, query, compiled[0][1], start)
+                self.__written(True)
+            self.logger.debug("Executed %s query", title)
+            return True
+        except Exception as err:  # pylint: disable=broad-except
+            self.__failed(title, rows[0], query, err)
+            return False
 
     def exists(self, table: Table, title: str = "ExistQuery") -> bool:
         """ Check if record exists """
@@ -54,25 +355,141 @@ class Database:
     def execute(self, query: ColumnQuery, title: str) -> Optional[sql.Cursor]:
         """ Execute a template query """
         try:
-            execq = self.conn.execute(query.render())
+            sql_query, params = query.compile()
+            with self.lock:
+                start = time.perf_counter_ns()
+                execq = self.conn.execute(sql_query, params)
+                self.__timed(self.__conn, title, sql_query, params, start)
             self.logger.debug("Executed %s query", title)
             return execq
         except Exception as err:  # pylint: disable=broad-except
-            context = {
-                "title": title,
-                "item": query,
-                "query": query.render(),
-                "exception": err,
-            }
-            self.logger.error(QUERYERROR.format(**context))  # pylint: disable=W1202
-            del context["query"]
-            self.last_err = context
+            self.__failed(title, query, query.render(), err)
+            return None
+
+    def read(self, query: ColumnQuery, title: str) -> Optional[List[Any]]:
+        """Execute a read-only template query on a reader connection, returns every
+        row or None on failure (the writer connection is used without readers)
+        """
+        if self.reader_count == 0:
+            with self.lock:
+                execq = self.execute(query, title)
+                return None if execq is None else execq.fetchall()
+
+        conn = self.readers.get()
+        try:
+            sql_query, params = query.compile()
+            start = time.perf_counter_ns()
+            rows = conn.execute(sql_query, params).fetchall()
+            self.__timed(conn, title, sql_query, params, start)
+            self.logger.debug("Executed %s query on a reader", title)
+            return rows
+        except Exception as err:  # pylint: disable=broad-except
+            self.__failed(title, query, query.render(), err)
             return None
+        finally:
+            self.readers.put(conn)
+
+    def iter_batches(
+        self, query: ColumnQuery, title: str, batch: int = 256
+    ) -> Iterator[List[Any]]:
+        """Execute a read-only template query and yield its rows `batch` at a time,
+        a reader connection is held until the iteration ends (the writer connection
+        is only locked while a batch is fetched without readers)
+        """
+        sql_query, params = query.compile()
+        if self.reader_count == 0:
+            with self.lock:
+                start = time.perf_counter_ns()
+                cursor = self.__conn.execute(sql_query, params)
+                self.__timed(self.__conn, title, sql_query, params, start)
+            while True:
+                with self.lock:
+                    rows = cursor.fetchmany(batch)
+                if len(rows) == 0:
+                    return
+                yield rows
+
+        conn = self.readers.get()
+        try:
+            start = time.perf_counter_ns()
+            cursor = conn.execute(sql_query, params)
+            self.__timed(conn, title, sql_query, params, start)
+            while True:
+                rows = cursor.fetchmany(batch)
+                if len(rows) == 0:
+                    return
+                yield rows
+        finally:
+            self.readers.put(conn)
+
+    def iter_rows(self, query: ColumnQuery, title: str, batch: int = 256) -> Iterator[Any]:
+        """ Execute a read-only template query and stream its rows """
+        for rows in self.iter_batches(query, title, batch):
+            yield from rows
+
+    def query_summary(self) -> Dict[str, QuerySummary]:
+        """ latency summary by query title (empty unless instrument_queries is set) """
+        return {} if self.stats is None else self.stats.summary()
+
+    def query_plan(self, query: ColumnQuery) -> List[str]:
+        """ details of the query plan sqlite chooses for the query """
+        sql_query, params = query.compile()
+        with self.lock:
+            plan = self.conn.execute(f"EXPLAIN QUERY PLAN {sql_query}", params)
+            return [row[3] for row in plan.fetchall()]
+
+    def verify_ratings(self, tolerance: float = 1e-6) -> List[Tuple[int, float, float]]:
+        """ teams whose stored rating drifted from their results (id, stored, expected) """
+        with self.lock:
+            rows = self.conn.execute(VERIFY_RATINGS).fetchall()
+        return [
+            (team_id, stored, expected)
+            for team_id, stored, expected in rows
+            if stored is None or abs(stored - expected) > tolerance
+        ]
+
+    def rebuild_ratings(self):
+        """ recompute the stored rating of every team from the result table """
+        with self.transaction():
+            for statement in REBUILD_RATINGS:
+                self.conn.execute(statement)
+        self.logger.info("Rebuilt team ratings")
+
+    def rebuild_history(self):
+        """replay the matches to recompute the rating history of every team (the
+        history of archived rounds stays in the archive)
+        """
+        statements = REBUILD_HISTORY + (ARCHIVE_HISTORY if self.archived else [])
+        with self.transaction():
+            for statement in statements:
+                self.conn.execute(statement)
+        self.logger.info("Rebuilt rating history")
+
+    def archive_rounds(self, before: datetime) -> int:
+        """Move the rounds that ended before a date with their matches, results and
+        rating history to the archive, returns the number of archived rounds
+        (team ratings are kept by folding the archived results into checkpoints)
+        """
+        if not self.archived:
+            self.logger.warning("No archive attached, rounds are not archived")
+            return 0
+        with self.transaction():
+            for statement in ARCHIVE_ROUNDS:
+                params = {"before": before} if ":before" in statement else {}
+                self.conn.execute(statement, params)
+            count = self.conn.execute("SELECT COUNT(*) FROM archived_round").fetchone()[0]
+        self.logger.info("Archived %d round(s) that ended before %s", count, before)
+        if self.in_memory:
+            # the archive is on disk, a crash must not restore the archived rounds
+            self.snapshot()
+        return count
 
     def load(self, query: Loadable, title: str = "LoadQuery") -> Optional[Loadable]:
         """ Load the class using information of passed through rhs """
         try:
-            loaded = cast(Optional[Loadable], type(query).load_from(self, query))  # type: ignore
+            # rows are fetched from the shared connection, other threads wait
+            with self.lock:
+                loaded = cast(Optional[Loadable], type(query).load_from(self, query))  # type: ignore
             self.logger.debug("Executed %s query", title)
             return loaded
         except Exception as err:  # pylint: disable=broad-except
@@ -80,6 +497,28 @@ class Database:
             self.logger.error(QUERYERROR.format(**context))  # pylint: disable=W1202
             return None
 
+    def load_many(
+        self, rows: Sequence[Loadable], title: str = "LoadManyQuery"
+    ) -> Dict[Any, Loadable]:
+        """Load rows of the same table by primary key with `IN` queries, returns the
+        loaded rows keyed by primary key (missing rows are left out)
+        """
+        if len(rows) == 0:
+            return {}
+
+        loaded: Dict[Any, Loadable] = {}
+        table = type(rows[0])
+        try:
+            with self.lock:
+                for begin in range(0, len(rows), MAX_VARIABLES):
+                    chunk = rows[begin : begin + MAX_VARIABLES]
+                    loaded.update(table.load_many_from(self, chunk))  # type: ignore
+            self.logger.debug("Executed %s query", title)
+            return loaded
+        except Exception as err:  # pylint: disable=broad-except
+            self.__failed(title, rows[0], None, err)
+            return loaded
+
     def summarize(self):
         """ summarise team data """
         query = """
@@ -88,7 +527,9 @@ class Database:
             INNER JOIN player as p1 ON team.player_one = p1.discord_id
             INNER JOIN player as p2 ON team.player_two = p2.discord_id
         """
-        for result in self.conn.execute(query).fetchall():
+        with self.lock:
+            results = self.conn.execute(query).fetchall()
+        for result in results:
             tid = result[0]
             team = result[1]
             p1_name, p1_id, p2_name, p2_id = result[2:]
@@ -97,3 +538,94 @@ class Database:
     {p1_name} ({p1_id})
     {p2_name} ({p2_id})"""
             )
+
+    def __configure(self, config: DatabaseConfig):
+        config.validate()
+        for pragma in config.pragmas():
+            self.__conn.execute(pragma)
+        if config.instrument_queries:
+            self.stats = QueryStats(config.query_window, config.slow_query_ms)
+        self.commit_policy = config.commit_policy.lower()
+        if self.commit_policy == COMMIT_INTERVAL:
+            self.committer = threading.Thread(
+                target=self.__commit_periodically,
+                args=(config.commit_interval,),
+                name="matchmaker.db.commit",
+                daemon=True,
+            )
+            self.committer.start()
+
+    def __connect(self, path: str, in_memory: bool) -> sql.Connection:
+        if not in_memory:
+            return sql.connect(path, check_same_thread=False)
+        # a running backup copies the pages the source connection writes, but a
+        # ":memory:" database never writes its pages and restarts the backup on
+        # every commit, the memdb vfs does (writes from other connections would
+        # restart it too, none can open this database)
+        conn = sql.connect(MEMDB, uri=True, check_same_thread=False)
+        if pathlib.Path(path).exists():
+            snapshot = sql.connect(path)
+            try:
+                snapshot.backup(conn)
+            finally:
+                snapshot.close()
+            self.logger.info("Restored in-memory database from '%s'", path)
+        return conn
+
+    def __open_readers(self, path: str, config: DatabaseConfig):
+        if config.journal_mode.lower() != "wal" or path == ":memory:":
+            return
+        uri = f"{pathlib.Path(path).resolve().as_uri()}?mode=ro"
+        for _ in range(config.readers):
+            conn = sql.connect(uri, uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA cache_size={int(config.cache_size)}")
+            conn.execute(f"PRAGMA mmap_size={int(config.mmap_size)}")
+            conn.execute(f"PRAGMA busy_timeout={int(config.busy_timeout)}")
+            if self.archived:
+                attach(conn, config.archive_path, readonly=True)
+            if self.version > 0:
+                create_views(conn, self.archived)
+            self.readers.put(conn)
+            self.reader_count += 1
+
+    def __timed(
+        self, conn: sql.Connection, title: str, query: str, params: List[Any], start: int
+    ):
+        if self.stats is None:
+            return
+        elapsed = time.perf_counter_ns() - start
+        if not self.stats.record(title, elapsed):
+            return
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+            details = "\n    ".join(row[3] for row in plan)
+        except sql.Error as err:
+            details = f"unavailable ({err})"
+        self.logger.warning(
+            "Slow %s query (%.2fms):%s\n  plan:\n    %s",
+            title,
+            elapsed / 1e6,
+            query,
+            details,
+        )
+
+    def __failed(self, title: str, item: Any, query: Optional[str], err: Exception):
+        context = {"title": title, "item": item, "query": query, "exception": err}
+        self.logger.error(QUERYERROR.format(**context))  # pylint: disable=W1202
+        del context["query"]
+        self.last_err = context
+
+    def __written(self, success: bool):
+        if success and self.commit_policy == COMMIT_BATCH:
+            self.commit()
+
+    def __snapshot_periodically(self, interval: float):
+        while not self.closing.wait(interval):
+            self.snapshot()
+
+    def __commit_periodically(self, interval: float):
+        while not self.closing.wait(interval):
+            try:
+                self.commit()
+            except sql.Error as err:
+                self.logger.error("Failed to commit: %s", err)
@@ -1,7 +1,7 @@
 """ Asynchronous event handling for the matchmaker """
 
 from .eventmap import EventMap
-from .event import Event, EventKind, EventHandler, EventContext
+from .event import Event, EventKind, EventHandler, EventContext, ExecutionPolicy
 
 __all__ = (
     "Event",
@@ -9,4 +9,5 @@ __all__ = (
     "EventHandler",
     "EventMap",
     "EventContext",
+    "ExecutionPolicy",
 )
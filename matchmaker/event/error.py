@@ -14,5 +14,8 @@ class HandlingError(Error):
         super().__init__(message)
         self.handler = handler
 
+    def __reduce__(self):
+        return (type(self), (self.message, self.handler))
+
 
 HandlingResult = Union[None, HandlingError]
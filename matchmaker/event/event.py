@@ -3,12 +3,12 @@
 import abc
 from dataclasses import dataclass, field
 from enum import Enum, unique
-from typing import Optional, Union
+from typing import List, Optional, Union
 
 from ..tables import Team, Result, Player, Match, Round
 from ..mm.context import QueueContext, InGameContext
 
-__all__ = ("EventKind", "EventContext", "EventHandler", "Event")
+__all__ = ("EventKind", "ExecutionPolicy", "EventContext", "EventHandler", "Event")
 
 
 @unique
@@ -22,6 +22,16 @@ class EventKind(Enum):
 
     ROUND_START = 4
     ROUND_END = 5
+    ROUND_EXPIRE = 6
+
+
+@unique
+class ExecutionPolicy(Enum):
+    """ Where a handler is executed when its event occurs """
+
+    INLINE = 1
+    THREAD = 2
+    PROCESS = 3
 
 
 @dataclass
@@ -35,12 +45,14 @@ class EventContext:
     match: Optional[Match] = field(default=None)
     result: Optional[Result] = field(default=None)
     round: Optional[Round] = field(default=None)
+    teams: List[Team] = field(default_factory=list)
 
 
 class EventHandler(abc.ABC):
     """Asynchronous event handler
     - kind: kind of events handled
     - tag: unique tag
+    - policy: execution policy (inline by default)
     """
 
     def __eq__(self, rhs):
@@ -57,6 +69,13 @@ class EventHandler(abc.ABC):
     def tag(self) -> int:
         """ unique tag """
 
+    @property
+    def policy(self) -> ExecutionPolicy:
+        """execution policy, handlers that are not inline must not mutate the
+        matchmaker state and process handlers must be picklable
+        """
+        return ExecutionPolicy.INLINE
+
     @abc.abstractmethod
     def is_ready(self, ctx: EventContext) -> bool:
         """ is_ready: check context for trigger condition """
@@ -1,16 +1,74 @@
 """ Registration and polling map for handlers """
 
-from typing import Iterator, Dict
+import logging
+import time
+from typing import Iterator, Dict, List, Optional, Tuple
 from collections import deque
+from functools import partial
+from concurrent.futures import (
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    ProcessPoolExecutor,
+    wait,
+)
 
-from .event import Event, EventHandler, EventKind
+from .event import Event, EventHandler, EventKind, ExecutionPolicy
 from .error import HandlingError, HandlingResult
+from .stats import HandlerStats
 
-__all__ = ("EventMap",)
+__all__ = ("EventMap", "get_executor", "shutdown_executors")
+
+
+EXECUTORS: Dict[ExecutionPolicy, Executor] = {}
+
+
+def get_executor(policy: ExecutionPolicy) -> Executor:
+    """ get the executor shared by every event map for the policy """
+    executor = EXECUTORS.get(policy)
+    if executor is None:
+        if policy is ExecutionPolicy.THREAD:
+            executor = ThreadPoolExecutor(thread_name_prefix="matchmaker.event")
+        elif policy is ExecutionPolicy.PROCESS:
+            executor = ProcessPoolExecutor()
+        else:
+            raise ValueError(f"No executor for policy {policy}")
+        EXECUTORS[policy] = executor
+    return executor
+
+
+def _record_future(
+    stats: HandlerStats, kind: EventKind, handler: EventHandler, start: int, future: Future
+):
+    elapsed = time.perf_counter_ns() - start
+    failed = future.exception() is not None or isinstance(
+        future.result(), HandlingError
+    )
+    stats.record(kind, handler, elapsed, failed)
+
+
+def shutdown_executors(wait_pending: bool = True):
+    """ shutdown the shared executors, they are recreated on demand """
+    for executor in EXECUTORS.values():
+        executor.shutdown(wait=wait_pending)
+    EXECUTORS.clear()
 
 
 class EventMap(Dict[EventKind, deque]):
-    """ Maps event kinds to a list of event handlers """
+    """Maps event kinds to a list of event handlers, handlers that are not inline
+    are dispatched to a shared executor and joined back on later calls
+    (handler calls are timed when `stats` is set)
+
+    Errors of joined handlers are logged and the latest is returned by `join`,
+    they are never reported as the error of a later event.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.pending: List[Tuple[EventHandler, Future]] = []
+        self.joined: HandlingResult = None
+        self.stats: Optional[HandlerStats] = None
 
     @classmethod
     def new(cls) -> "EventMap":
@@ -29,21 +87,80 @@ class EventMap(Dict[EventKind, deque]):
         """ poll handlers for readiness when an event occurs """
         return filter(lambda h: h.is_ready(event.ctx), self[event.kind])
 
+    def dispatch(self, handler: EventHandler, event: Event) -> HandlingResult:
+        """ run the handler inline or submit it to its executor """
+        stats = self.stats
+        if handler.policy is ExecutionPolicy.INLINE:
+            if stats is None:
+                return handler.handle(event.ctx)
+
+            start = time.perf_counter_ns()
+            err = handler.handle(event.ctx)
+            elapsed = time.perf_counter_ns() - start
+            stats.record(event.kind, handler, elapsed, isinstance(err, HandlingError))
+            return err
+
+        start = time.perf_counter_ns()
+        future = get_executor(handler.policy).submit(handler.handle, event.ctx)
+        if stats is not None:
+            future.add_done_callback(
+                partial(_record_future, stats, event.kind, handler, start)
+            )
+        self.pending.append((handler, future))
+        return None
+
     def handle(self, event: Event) -> HandlingResult:
-        """ trigger appropriate handlers for the event, returns the latest error """
+        """trigger appropriate handlers for the event, returns the latest error of
+        its inline handlers (handlers that are not inline are joined by `join`)
+        """
         error = None
-        just_err = False
         dereg = []
         for handler in self.poll(event):
-            just_err = False
-            err = handler.handle(event.ctx)
+            err = self.dispatch(handler, event)
             if isinstance(err, HandlingError):
-                just_err = True
                 error = err
 
-            if not handler.requeue() or just_err:
+            if not handler.requeue() or isinstance(err, HandlingError):
                 dereg.append(handler)
 
         for handler in dereg:
             self.deregister(handler)
+
+        self.collect()
+        return error
+
+    def collect(self, block: bool = False) -> HandlingResult:
+        """join finished handlers of the executors, their errors are logged and the
+        latest is kept for `join`
+        """
+        error = None
+        pending = []
+        for handler, future in self.pending:
+            if not block and not future.done():
+                pending.append((handler, future))
+                continue
+
+            err = self.__result(handler, future)
+            if isinstance(err, HandlingError):
+                self.logger.error("%s failed: %s", type(handler).__name__, err.message)
+                error = err
+                self.joined = err
+                if handler in self[handler.kind]:
+                    self.logger.error("%s is deregistered", type(handler).__name__)
+                    self.deregister(handler)
+        self.pending = pending
         return error
+
+    def join(self, timeout: Optional[float] = None) -> HandlingResult:
+        """ wait for handlers submitted to the executors, returns the latest error """
+        wait([future for _, future in self.pending], timeout=timeout)
+        self.collect(block=timeout is None)
+        error, self.joined = self.joined, None
+        return error
+
+    @staticmethod
+    def __result(handler: EventHandler, future: Future) -> HandlingResult:
+        exception = future.exception()
+        if exception is not None:
+            return HandlingError(f"Handler raised: {exception!r}", handler)
+        return future.result()
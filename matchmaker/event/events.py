@@ -1,6 +1,7 @@
 """ EventContext implementations """
 
 from dataclasses import dataclass
+from typing import List
 
 from .event import Event, EventKind, EventContext
 from ..mm.context import QueueContext, InGameContext
@@ -9,9 +10,11 @@ from ..tables import Team, Match, Round
 __all__ = (
     "QueueEvent",
     "DequeueEvent",
+    "QueueBatchEvent",
     "ResultEvent",
     "RoundStartEvent",
     "RoundEndEvent",
+    "RoundExpireEvent",
 )
 
 
@@ -47,6 +50,28 @@ class DequeueEvent(Event):
         return EventContext(context=self.context, team=self.team)
 
 
+@dataclass
+class QueueBatchEvent(Event):
+    """Teams have queued, or dequeued, during a coalescing window
+
+    `ctx.teams` holds every team of the batch, `ctx.team` is only set when the
+    batch holds a single team.
+    """
+
+    context: QueueContext
+    teams: List[Team]
+    dequeue: bool = False
+
+    @property
+    def kind(self) -> EventKind:
+        return EventKind.DEQUEUE if self.dequeue else EventKind.QUEUE
+
+    @property
+    def ctx(self) -> EventContext:
+        team = self.teams[0] if len(self.teams) == 1 else None
+        return EventContext(context=self.context, team=team, teams=self.teams)
+
+
 @dataclass
 class ResultEvent(Event):
     """ New result for match """
@@ -99,3 +124,22 @@ class RoundEndEvent(Event):
             context=self.context,
             round=self.round,
         )
+
+
+@dataclass
+class RoundExpireEvent(Event):
+    """ Set expired before all results were entered """
+
+    context: InGameContext
+    round: Round
+
+    @property
+    def kind(self) -> EventKind:
+        return EventKind.ROUND_EXPIRE
+
+    @property
+    def ctx(self) -> EventContext:
+        return EventContext(
+            context=self.context,
+            round=self.round,
+        )
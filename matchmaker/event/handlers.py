@@ -1,5 +1,6 @@
 """ Default event loop for the match maker :
     QueueFull -> NewGame -> WaitForGameEnd -> ClearGame
+    (rounds are journaled when the matchmaker has a journal)
 """
 
 from datetime import datetime
@@ -10,6 +11,9 @@ from ..mm.games import Games
 from ..mm.config import Config
 from ..mm.principal import get_principal
 from ..mm.error import GameAlreadyExistError
+from ..mm.journal import Journal
+from ..cache import TeamCache
+from ..ranking import Ranking
 
 from . import EventMap
 
@@ -19,7 +23,13 @@ from .error import HandlingResult, HandlingError
 
 from ..tables import Round
 
-__all__ = ("MatchTriggerHandler", "GameEndHandler")
+__all__ = (
+    "MatchTriggerHandler",
+    "GameEndHandler",
+    "JournalHandler",
+    "TeamCacheHandler",
+    "RankingHandler",
+)
 
 
 class GameEndHandler(EventHandler):
@@ -117,3 +127,98 @@ class MatchTriggerHandler(EventHandler):
         self.evmap.register(GameEndHandler(rnd, self.games, self.evmap))
         self.logger.info("Round '%s' has started", rnd.round_id)
         return self.evmap.handle(RoundStartEvent(context, rnd))
+
+
+class JournalHandler(EventHandler):
+    """ Appends round starts and ends to the matchmaker journal """
+
+    def __init__(self, kind: EventKind, journal: Journal):
+        self.journal = journal
+        self.__kind = kind
+
+    @property
+    def kind(self) -> EventKind:
+        return self.__kind
+
+    @property
+    def tag(self) -> int:
+        return hash((type(self).__name__, self.__kind))
+
+    def is_ready(self, ctx: EventContext) -> bool:
+        return isinstance(ctx.context, InGameContext)
+
+    def requeue(self) -> bool:
+        return True
+
+    def handle(self, ctx: EventContext) -> HandlingResult:
+        if not isinstance(ctx.context, InGameContext):
+            return HandlingError("Expected an InGameContext", self)
+
+        if self.kind is EventKind.ROUND_START:
+            principal = ctx.context.principal.config.principal
+            self.journal.append(
+                self.kind, (principal, ctx.context.round, ctx.context.matches)
+            )
+        else:
+            self.journal.append(self.kind, ctx.context.round)
+        return None
+
+
+class TeamCacheHandler(EventHandler):
+    """ Drops the teams of an ended round from the team cache """
+
+    def __init__(self, cache: TeamCache):
+        self.cache = cache
+
+    @property
+    def kind(self) -> EventKind:
+        return EventKind.ROUND_END
+
+    @property
+    def tag(self) -> int:
+        return hash(type(self).__name__)
+
+    def is_ready(self, ctx: EventContext) -> bool:
+        return isinstance(ctx.context, InGameContext)
+
+    def requeue(self) -> bool:
+        return True
+
+    def handle(self, ctx: EventContext) -> HandlingResult:
+        if not isinstance(ctx.context, InGameContext):
+            return HandlingError("Expected an InGameContext", self)
+
+        for match in ctx.context.matches:
+            for result in (match.team_one, match.team_two):
+                if result is not None and result.team is not None:
+                    self.cache.invalidate(result.team.team_id, result.team.name)
+        return None
+
+
+class RankingHandler(EventHandler):
+    """ Moves the teams of an ended round in the ranking by their elo variation """
+
+    def __init__(self, ranking: Ranking):
+        self.ranking = ranking
+
+    @property
+    def kind(self) -> EventKind:
+        return EventKind.ROUND_END
+
+    @property
+    def tag(self) -> int:
+        return hash(type(self).__name__)
+
+    def is_ready(self, ctx: EventContext) -> bool:
+        return isinstance(ctx.context, InGameContext)
+
+    def requeue(self) -> bool:
+        return True
+
+    def handle(self, ctx: EventContext) -> HandlingResult:
+        if not isinstance(ctx.context, InGameContext):
+            return HandlingError("Expected an InGameContext", self)
+
+        for match in ctx.context.matches:
+            self.ranking.add_results((match.team_one, match.team_two))
+        return None
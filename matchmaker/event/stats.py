@@ -0,0 +1,75 @@
+""" Per handler call, error and latency statistics """
+
+import copy
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from .event import EventHandler, EventKind
+
+__all__ = ("HandlerStat", "HandlerStats")
+
+
+BUCKETS = 40
+
+
+def _empty_histogram() -> List[int]:
+    return [0] * BUCKETS
+
+
+@dataclass
+class HandlerStat:
+    """Statistics of a handler type for an event kind, latencies are stored in
+    a histogram of power of two nanoseconds buckets
+    """
+
+    calls: int = field(default=0)
+    errors: int = field(default=0)
+    total_ns: int = field(default=0)
+    max_ns: int = field(default=0)
+    histogram: List[int] = field(default_factory=_empty_histogram)
+
+    def record(self, elapsed_ns: int, failed: bool):
+        """ record a call """
+        self.calls += 1
+        self.errors += int(failed)
+        self.total_ns += elapsed_ns
+        self.max_ns = max(self.max_ns, elapsed_ns)
+        self.histogram[min(elapsed_ns.bit_length(), BUCKETS - 1)] += 1
+
+    @property
+    def mean_ns(self) -> float:
+        """ mean latency of the calls """
+        return self.total_ns / self.calls if self.calls != 0 else 0.0
+
+    def percentile(self, pct: float) -> int:
+        """ upper bound of the latency percentile in nanoseconds """
+        rank = pct / 100 * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count != 0 and seen >= rank:
+                return min(1 << bucket, self.max_ns)
+        return self.max_ns
+
+
+class HandlerStats(Dict[Tuple[EventKind, str], HandlerStat]):
+    """ Statistics keyed by event kind and handler type """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+
+    def record(self, kind: EventKind, handler: EventHandler, elapsed_ns: int, failed: bool):
+        """ record a handler call, handlers on executors record from their threads """
+        key = (kind, type(handler).__name__)
+        with self.lock:
+            stat = self.get(key)
+            if stat is None:
+                stat = self[key] = HandlerStat()
+            stat.record(elapsed_ns, failed)
+
+    def snapshot(self) -> Dict[Tuple[EventKind, str], HandlerStat]:
+        """ copy of the current statistics """
+        with self.lock:
+            return {key: copy.deepcopy(stat) for key, stat in self.items()}
@@ -0,0 +1,376 @@
+""" In-memory storage backend
+
+Rows are kept normalized like the sqlite tables (matches reference their round
+and results by id, results their team) and loaded objects are rebuilt from them,
+so callers can't modify stored rows. Team elo is the base elo of the loaded
+team plus the delta sum of its results, as with `team_details_with_delta`.
+"""
+
+import copy
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .db import TransactionError
+from .operations import Insertable, Loadable, Storage, Table
+from .tables import Match, Player, Result, Round, Team
+from .template import And, AsStatement, Conditional, Eq, In, Or
+
+__all__ = ("MemoryStorage", "evaluate")
+
+
+Row = Dict[str, Any]
+
+
+def evaluate(cond: Conditional, row: Row) -> bool:
+    """evaluate the conditions of a table against a row of column values
+    (conditions on columns the row doesn't have are false, NotImplementedError is
+    raised for other statements)
+    """
+    if isinstance(cond, (And, Or)):
+        lhs = evaluate(cond.operand_1, row)  # type: ignore
+        if isinstance(cond, And):
+            return lhs and evaluate(cond.operand_2, row)  # type: ignore
+        return lhs or evaluate(cond.operand_2, row)  # type: ignore
+    if isinstance(cond, Eq) and not isinstance(cond.operand_2, AsStatement):
+        column = cond.operand_1
+        if isinstance(column, str):
+            return column in row and row[column] == cond.operand_2
+    if isinstance(cond, In) and isinstance(cond.operand, str):
+        column = cond.operand
+        return column in row and row[column] in cond.values
+    raise NotImplementedError(f"Can't evaluate {type(cond).__name__}")
+
+
+@dataclass
+class _ResultRow:
+    team_id: int
+    points: float
+    delta: float
+
+
+@dataclass
+class _MatchRow:
+    round_id: int
+    result_one: int
+    result_two: int
+    odds_ratio: float
+
+
+class MemoryStorage(Storage):
+    """Storage of the tables in dictionaries, for simulations and tests that
+    don't need sqlite (same contract as `Database`: ids are assigned on insert,
+    team names are unique, transactions are rolled back when they raise and
+    other failures are logged and returned as False or None)
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.RLock()
+        self.players: Dict[int, Optional[str]] = {}
+        self.teams: Dict[int, Tuple[str, int, int]] = {}
+        self.team_names: Dict[str, int] = {}
+        self.rounds: Dict[int, Round] = {}
+        self.results: Dict[int, _ResultRow] = {}
+        self.matches: Dict[int, _MatchRow] = {}
+        self.deltas: Dict[int, float] = {}
+        self.last_ids: Dict[str, int] = {}
+        self.depth = 0
+        self.undo: List[Callable[[], None]] = []
+        self.last_err: Optional[str] = None
+
+    def close(self):
+        pass
+
+    @contextmanager
+    def transaction(self) -> Iterator["MemoryStorage"]:
+        """ Run the writes of the block together, undone if the block raises """
+        with self.lock:
+            last_ids = dict(self.last_ids)
+            self.depth += 1
+            try:
+                yield self
+            except BaseException:
+                if self.depth == 1:
+                    while self.undo:
+                        self.undo.pop()()
+                    self.last_ids = last_ids
+                    self.logger.warning("Rolled back transaction")
+                raise
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.undo.clear()
+
+    def exists(self, table: Table, title: str = "ExistQuery") -> bool:
+        cond = table.match_conditions()
+        if cond is None:
+            return False
+        try:
+            with self.lock:
+                return any(evaluate(cond, row) for row in self.__rows(table))
+        except NotImplementedError as err:
+            self.__failed(title, table, str(err))
+            return False
+
+    def insert(self, query: Insertable, title: str = "InsertQuery") -> bool:
+        with self.lock:
+            return self.__insert(query, title) is not None
+
+    def insert_many(
+        self, rows: Sequence[Insertable], title: str = "InsertManyQuery"
+    ) -> Optional[List[int]]:
+        ids: List[int] = []
+        try:
+            with self.transaction():
+                for row in rows:
+                    row_id = self.__insert(row, title)
+                    if row_id is None:
+                        raise TransactionError(f"{title} failed")
+                    ids.append(row_id)
+        except TransactionError:
+            return None
+        return ids
+
+    def insert_all(
+        self, rows: Sequence[Insertable], title: str = "InsertAllQuery"
+    ) -> bool:
+        return self.insert_many(rows, title) is not None
+
+    def load(self, query: Loadable, title: str = "LoadQuery") -> Optional[Loadable]:
+        if not isinstance(query, Table):
+            return None
+        cond = query.match_conditions()
+        if cond is None:
+            return None
+        try:
+            with self.lock:
+                for row in self.__rows(query):
+                    if evaluate(cond, row):
+                        return self.__decode(query, row)
+        except NotImplementedError as err:
+            self.__failed(title, query, str(err))
+        return None
+
+    def load_many(
+        self, rows: Sequence[Loadable], title: str = "LoadManyQuery"
+    ) -> Dict[Any, Loadable]:
+        loaded: Dict[Any, Loadable] = {}
+        try:
+            with self.lock:
+                for rhs in rows:
+                    if not isinstance(rhs, Table):
+                        raise NotImplementedError(f"Unsupported row {rhs}")
+                    key = getattr(rhs, rhs.primary_key)
+                    row = self.__row(rhs, key)
+                    if row is not None:
+                        loaded[key] = self.__decode(rhs, row)
+        except NotImplementedError as err:
+            self.__failed(title, rows[0], str(err))
+        return loaded
+
+    def __next_id(self, table: str, row_id: int = 0) -> int:
+        last = self.last_ids.get(table, 0)
+        if row_id == 0:
+            row_id = last + 1
+        self.last_ids[table] = max(last, row_id)
+        return row_id
+
+    def __added(self, store: Dict[Any, Any], key: Any, undo: Callable[[], None]):
+        if self.depth == 0:
+            return
+        self.undo.append(lambda: store.pop(key, None))
+        self.undo.append(undo)
+
+    def __failed(self, title: str, row: Any, reason: str) -> None:
+        self.last_err = f"{title} failed for {row}: {reason}"
+        self.logger.error(self.last_err)
+
+    def __insert(self, row: Insertable, title: str) -> Optional[int]:
+        # pylint: disable=too-many-return-statements
+        if isinstance(row, Player):
+            if row.discord_id in self.players:
+                return self.__failed(title, row, "duplicate discord_id")
+            self.players[row.discord_id] = row.name
+            self.__added(self.players, row.discord_id, lambda: None)
+            return row.discord_id
+
+        if isinstance(row, Team):
+            if row.name is None or row.player_one is None or row.player_two is None:
+                return self.__failed(title, row, "missing name or players")
+            if row.name in self.team_names:
+                return self.__failed(title, row, "duplicate name")
+            team_id = self.__next_id("team")
+            name = row.name
+            players = (row.player_one.discord_id, row.player_two.discord_id)
+            self.teams[team_id] = (name, *players)
+            self.team_names[name] = team_id
+            self.deltas[team_id] = 0.0
+            self.__added(self.teams, team_id, lambda: self.__drop_team(name, team_id))
+            return team_id
+
+        if isinstance(row, Round):
+            if row.round_id in self.rounds or row.start_time is None:
+                return self.__failed(title, row, "duplicate round or no start time")
+            round_id = self.__next_id("turn", row.round_id)
+            self.rounds[round_id] = Round(
+                round_id, row.start_time, row.end_time, row.participants
+            )
+            self.__added(self.rounds, round_id, lambda: None)
+            return round_id
+
+        if isinstance(row, Result):
+            if row.team is None or row.team.team_id not in self.teams:
+                return self.__failed(title, row, "unknown team")
+            result_id = self.__next_id("result")
+            team_id, delta = row.team.team_id, row.delta
+            self.results[result_id] = _ResultRow(team_id, row.points, delta)
+            self.deltas[team_id] += delta
+            self.__added(
+                self.results, result_id, lambda: self.__add_delta(team_id, -delta)
+            )
+            return result_id
+
+        if isinstance(row, Match):
+            if row.round is None or row.team_one is None or row.team_two is None:
+                return self.__failed(title, row, "missing round or results")
+            match_id = self.__next_id("match")
+            self.matches[match_id] = _MatchRow(
+                row.round.round_id,
+                row.team_one.result_id,
+                row.team_two.result_id,
+                row.odds_ratio,
+            )
+            self.__added(self.matches, match_id, lambda: None)
+            return match_id
+
+        return self.__failed(title, row, "unsupported table")
+
+    def __drop_team(self, name: str, team_id: int):
+        self.team_names.pop(name, None)
+        self.deltas.pop(team_id, None)
+
+    def __add_delta(self, team_id: int, delta: float):
+        if team_id in self.deltas:
+            self.deltas[team_id] += delta
+
+    def __columns(self, table: Table, key: Any) -> Row:
+        """ columns of a row as named in the views the tables are loaded from """
+        if isinstance(table, Player):
+            return {"discord_id": key, "name": self.players[key]}
+        if isinstance(table, Team):
+            name, one, two = self.teams[key]
+            return {
+                "team_id": key,
+                "team_name": name,
+                "player_one_id": one,
+                "player_two_id": two,
+            }
+        if isinstance(table, Round):
+            rnd = self.rounds[key]
+            return {
+                "round_id": key,
+                "start_time": rnd.start_time,
+                "end_time": rnd.end_time,
+                "participants": rnd.participants,
+            }
+        if isinstance(table, Result):
+            result = self.results[key]
+            return {
+                "result_id": key,
+                "team_id": result.team_id,
+                "points": result.points,
+                "delta": result.delta,
+            }
+        if isinstance(table, Match):
+            match = self.matches[key]
+            return {
+                "match_id": key,
+                "round_id": match.round_id,
+                "result_one": match.result_one,
+                "result_two": match.result_two,
+                "odds_ratio": match.odds_ratio,
+            }
+        raise NotImplementedError(f"Unsupported table {type(table).__name__}")
+
+    def __store(self, table: Table) -> Dict[Any, Any]:
+        if isinstance(table, Player):
+            return self.players
+        if isinstance(table, Team):
+            return self.teams
+        if isinstance(table, Round):
+            return self.rounds
+        if isinstance(table, Result):
+            return self.results
+        if isinstance(table, Match):
+            return self.matches
+        raise NotImplementedError(f"Unsupported table {type(table).__name__}")
+
+    def __rows(self, table: Table) -> Iterator[Row]:
+        # primary key lookups don't scan the table
+        cond = table.match_conditions()
+        if (
+            isinstance(cond, Eq)
+            and cond.operand_1 == table.primary_key
+            and not isinstance(cond.operand_2, AsStatement)
+        ):
+            row = self.__row(table, cond.operand_2)
+            if row is not None:
+                yield row
+            return
+        if isinstance(table, Team) and table.name is not None:
+            team_id = self.team_names.get(table.name)
+            if team_id is not None:
+                yield self.__columns(table, team_id)
+            return
+        for key in self.__store(table):
+            yield self.__columns(table, key)
+
+    def __row(self, table: Table, key: Any) -> Optional[Row]:
+        if key not in self.__store(table):
+            return None
+        return self.__columns(table, key)
+
+    def __decode(self, rhs: Table, row: Row) -> Loadable:
+        key = row[rhs.primary_key]
+        if isinstance(rhs, Player):
+            return Player(key, self.players[key])
+        if isinstance(rhs, Team):
+            return self.__team(key, rhs.elo + self.deltas[key])
+        if isinstance(rhs, Round):
+            return copy.copy(self.rounds[key])
+        if isinstance(rhs, Result):
+            return self.__result(key)
+        if isinstance(rhs, Match):
+            match = self.matches[key]
+            rnd = self.rounds.get(match.round_id, Round(round_id=match.round_id))
+            return Match(
+                match_id=key,
+                round=copy.copy(rnd),
+                team_one=self.__result(match.result_one),
+                team_two=self.__result(match.result_two),
+                odds_ratio=match.odds_ratio,
+            )
+        raise NotImplementedError(f"Unsupported table {type(rhs).__name__}")
+
+    def __team(self, team_id: int, elo: float) -> Team:
+        name, one, two = self.teams[team_id]
+        return Team(
+            team_id=team_id,
+            name=name,
+            player_one=Player(one, self.players.get(one)),
+            player_two=Player(two, self.players.get(two)),
+            elo=elo,
+        )
+
+    def __result(self, result_id: int) -> Result:
+        row = self.results[result_id]
+        # loaded results hold their team without elo, like result_with_team_details
+        return Result(
+            result_id=result_id,
+            team=self.__team(row.team_id, 0.0),
+            points=row.points,
+            delta=row.delta,
+        )
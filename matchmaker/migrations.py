@@ -0,0 +1,225 @@
+""" Schema migrations applied when the database is opened """
+
+import logging
+import sqlite3 as sql
+from typing import List, Tuple
+
+__all__ = (
+    "MIGRATIONS",
+    "REBUILD_HISTORY",
+    "REBUILD_RATINGS",
+    "VERIFY_RATINGS",
+    "migrate",
+    "schema_version",
+)
+
+
+# backfills as they were when their migration was added, later migrations change
+# what the rebuilds below read from
+_BACKFILL_RATINGS = [
+    "DELETE FROM team_rating",
+    """INSERT INTO team_rating(team_id, delta_sum, results)
+    SELECT team.team_id, COALESCE(SUM(result.delta), 0), COUNT(result.result_id)
+    FROM team
+    LEFT OUTER JOIN result ON team.team_id = result.team_id
+    GROUP BY team.team_id""",
+]
+
+_BACKFILL_HISTORY = [
+    "DELETE FROM rating_history",
+    """INSERT INTO rating_history(team_id, round_id, rating, delta)
+    SELECT team_id, round_id,
+        SUM(delta) OVER (PARTITION BY team_id ORDER BY round_id), delta
+    FROM (
+        SELECT result.team_id AS team_id, match.round_id AS round_id,
+            SUM(result.delta) AS delta
+        FROM match
+        INNER JOIN result
+            ON result.result_id IN (match.result_one, match.result_two)
+        GROUP BY result.team_id, match.round_id
+    )""",
+]
+
+# results of archived rounds are folded into the team checkpoint
+REBUILD_RATINGS = [
+    "DELETE FROM team_rating",
+    """INSERT INTO team_rating(team_id, delta_sum, results)
+    SELECT team.team_id,
+        COALESCE(checkpoint.delta_sum, 0) + COALESCE(SUM(result.delta), 0),
+        COALESCE(checkpoint.results, 0) + COUNT(result.result_id)
+    FROM team
+    LEFT OUTER JOIN rating_checkpoint AS checkpoint
+        ON team.team_id = checkpoint.team_id
+    LEFT OUTER JOIN result ON team.team_id = result.team_id
+    GROUP BY team.team_id""",
+]
+
+# replays every match in round order, the rating is the delta sum after the round
+# (archived matches are included through the `all_match_result` view)
+REBUILD_HISTORY = [
+    "DELETE FROM rating_history",
+    """INSERT INTO rating_history(team_id, round_id, rating, delta)
+    SELECT team_id, round_id,
+        SUM(delta) OVER (PARTITION BY team_id ORDER BY round_id), delta
+    FROM (
+        SELECT team_id, round_id, SUM(delta) AS delta
+        FROM all_match_result
+        GROUP BY team_id, round_id
+    )""",
+]
+
+# team_id, stored delta sum, delta sum of the checkpoint and result table
+VERIFY_RATINGS = """
+SELECT team.team_id, rating.delta_sum,
+    COALESCE(checkpoint.delta_sum, 0) + COALESCE(SUM(result.delta), 0)
+FROM team
+LEFT OUTER JOIN team_rating AS rating ON team.team_id = rating.team_id
+LEFT OUTER JOIN rating_checkpoint AS checkpoint ON team.team_id = checkpoint.team_id
+LEFT OUTER JOIN result ON team.team_id = result.team_id
+GROUP BY team.team_id"""
+
+
+# (description, statements), the schema version is the number of applied migrations
+MIGRATIONS: List[Tuple[str, List[str]]] = [
+    (
+        "secondary indexes for the join and filter columns",
+        [
+            "CREATE INDEX IF NOT EXISTS result_team_delta ON result(team_id, delta)",
+            "CREATE INDEX IF NOT EXISTS match_round ON match(round_id)",
+            "CREATE INDEX IF NOT EXISTS match_result_one ON match(result_one)",
+            "CREATE INDEX IF NOT EXISTS match_result_two ON match(result_two)",
+            "CREATE INDEX IF NOT EXISTS team_players ON team(player_one, player_two)",
+            "CREATE INDEX IF NOT EXISTS team_player_two ON team(player_two)",
+        ],
+    ),
+    (
+        "team rating maintained by triggers on result",
+        [
+            """CREATE TABLE IF NOT EXISTS team_rating (
+                team_id INTEGER PRIMARY KEY,
+                delta_sum FLOAT NOT NULL DEFAULT 0,
+                results INT NOT NULL DEFAULT 0,
+
+                FOREIGN KEY (team_id) REFERENCES team(team_id)
+            )""",
+            """CREATE TRIGGER IF NOT EXISTS team_rating_team_insert
+            AFTER INSERT ON team BEGIN
+                INSERT OR IGNORE INTO team_rating(team_id) VALUES (NEW.team_id);
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS team_rating_team_delete
+            AFTER DELETE ON team BEGIN
+                DELETE FROM team_rating WHERE team_id = OLD.team_id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS team_rating_result_insert
+            AFTER INSERT ON result BEGIN
+                INSERT OR IGNORE INTO team_rating(team_id) VALUES (NEW.team_id);
+                UPDATE team_rating
+                SET delta_sum = delta_sum + NEW.delta, results = results + 1
+                WHERE team_id = NEW.team_id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS team_rating_result_delete
+            AFTER DELETE ON result BEGIN
+                UPDATE team_rating
+                SET delta_sum = delta_sum - OLD.delta, results = results - 1
+                WHERE team_id = OLD.team_id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS team_rating_result_update
+            AFTER UPDATE OF team_id, delta ON result BEGIN
+                UPDATE team_rating
+                SET delta_sum = delta_sum - OLD.delta, results = results - 1
+                WHERE team_id = OLD.team_id;
+                INSERT OR IGNORE INTO team_rating(team_id) VALUES (NEW.team_id);
+                UPDATE team_rating
+                SET delta_sum = delta_sum + NEW.delta, results = results + 1
+                WHERE team_id = NEW.team_id;
+            END""",
+            *_BACKFILL_RATINGS,
+            "DROP VIEW IF EXISTS team_details_with_delta",
+            """CREATE VIEW team_details_with_delta AS
+            SELECT team.*, rating.delta_sum as delta_sum
+            FROM team_with_details as team
+            INNER JOIN team_rating as rating ON team.team_id = rating.team_id""",
+        ],
+    ),
+    (
+        "team rating index for the leaderboard order",
+        [
+            "CREATE INDEX IF NOT EXISTS team_rating_delta ON team_rating(delta_sum)",
+        ],
+    ),
+    (
+        "rating history of every team by round, written when a match is inserted",
+        [
+            """CREATE TABLE IF NOT EXISTS rating_history (
+                team_id INTEGER NOT NULL,
+                round_id INTEGER NOT NULL,
+                rating FLOAT NOT NULL,
+                delta FLOAT NOT NULL,
+
+                PRIMARY KEY (team_id, round_id)
+            ) WITHOUT ROWID""",
+            # results are inserted before their match so team_rating is up to date
+            """CREATE TRIGGER IF NOT EXISTS rating_history_match_insert
+            AFTER INSERT ON match BEGIN
+                INSERT INTO rating_history(team_id, round_id, rating, delta)
+                SELECT result.team_id, NEW.round_id, rating.delta_sum, result.delta
+                FROM result
+                INNER JOIN team_rating AS rating ON rating.team_id = result.team_id
+                WHERE result.result_id IN (NEW.result_one, NEW.result_two)
+                ON CONFLICT (team_id, round_id) DO UPDATE
+                SET rating = excluded.rating, delta = delta + excluded.delta;
+            END""",
+            *_BACKFILL_HISTORY,
+        ],
+    ),
+    (
+        "delta sum of the archived results of every team",
+        [
+            """CREATE TABLE IF NOT EXISTS rating_checkpoint (
+                team_id INTEGER PRIMARY KEY,
+                delta_sum FLOAT NOT NULL DEFAULT 0,
+                results INT NOT NULL DEFAULT 0
+            )""",
+        ],
+    ),
+]
+
+
+def schema_version(conn: sql.Connection) -> int:
+    """ version of the schema stored in the database """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sql.Connection) -> int:
+    """Apply pending migrations in their own transaction, returns the schema version
+    (databases without the base schema from `matchmaker_db.sql` are left untouched)
+    """
+    logger = logging.getLogger(__name__)
+    version = schema_version(conn)
+    if version >= len(MIGRATIONS):
+        return version
+
+    tables = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'result'"
+    ).fetchone()[0]
+    if tables == 0:
+        logger.warning("Database has no schema, skipping migrations")
+        return version
+
+    if conn.in_transaction:
+        conn.commit()
+    for number, (description, statements) in enumerate(
+        MIGRATIONS[version:], version + 1
+    ):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+        except sql.Error:
+            conn.rollback()
+            logger.error("Migration %d (%s) failed", number, description)
+            raise
+        conn.commit()
+        logger.info("Applied migration %d: %s", number, description)
+    return len(MIGRATIONS)
@@ -24,3 +24,9 @@ class Config:
     max_history: int = field(default=3)
 
     principal: str = field(default="max_sum")
+
+    coalesce_window: float = field(default=0.0)
+    instrument_handlers: bool = field(default=False)
+
+    round_timeout: float = field(default=0.0)
+    sweep_interval: float = field(default=60.0)
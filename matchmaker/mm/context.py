@@ -1,6 +1,6 @@
 """ Context for the wait queue and ongoing sets """
 
-from typing import Set, List, Optional
+from typing import Set, List, Optional, Iterator
 from enum import Enum
 
 from .error import (
@@ -216,6 +216,25 @@ round_id={self.round.round_id}, principal={type(self.principal).__name__})"
         """ check if the game ended """
         return self.state is InGameState.ENDED
 
+    def players(self) -> Iterator[Player]:
+        """ iterate over the players of the set """
+        for match in self.matches:
+            assert match.team_one is not None and match.team_one.team is not None
+            assert match.team_two is not None and match.team_two.team is not None
+            for team in (match.team_one.team, match.team_two.team):
+                assert team.player_one is not None and team.player_two is not None
+                yield team.player_one
+                yield team.player_two
+
+    def reported_matches(self) -> List[Match]:
+        """ get the matches that have a result """
+        reported = []
+        for match in self.matches:
+            assert match.team_one is not None and match.team_one.team is not None
+            if match.team_one.team.player_one in self.results:
+                reported.append(match)
+        return reported
+
     def get_match_player(self, player: Player) -> Optional[Match]:
         """ get the match the player is currently in """
         for match in self.matches:
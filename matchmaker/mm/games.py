@@ -1,6 +1,6 @@
 """ Map of ongoing sets """
 
-from typing import Optional, Union
+from typing import Dict, Optional, Union
 
 from ..tables import Match, Player, Team, Index
 from .context import InGameContext
@@ -11,7 +11,41 @@ __all__ = ("Games",)
 
 
 class Games(dict):
-    """ Map of ongoing InGameContexts """
+    """ Map of ongoing InGameContexts, players are indexed to their context key """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.players: Dict[Player, int] = {}
+        for key, context in self.items():
+            self.__index(key, context)
+
+    def __index(self, key: int, context: InGameContext):
+        for player in context.players():
+            self.players[player] = key
+
+    def __unindex(self, context: InGameContext):
+        for player in context.players():
+            if self.players.get(player) == context.key:
+                del self.players[player]
+
+    def __setitem__(self, key: int, context: InGameContext):
+        super().__setitem__(key, context)
+        self.__index(key, context)
+
+    def __delitem__(self, key: int):
+        self.__unindex(super().__getitem__(key))
+        super().__delitem__(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        context = super().pop(key)
+        self.__unindex(context)
+        return context
+
+    def clear(self):
+        super().clear()
+        self.players.clear()
 
     @classmethod
     def new(cls):
@@ -46,10 +80,10 @@ class Games(dict):
 
     def get_context_player(self, player: Player) -> Optional[InGameContext]:
         """ get the InGameContext for the player """
-        for context in self.values():
-            if context[player] is not None:
-                return context
-        return None
+        key = self.players.get(player)
+        if key is None:
+            return None
+        return self.get(key)
 
     def push_game(self, context: InGameContext) -> Failable:
         """ push a new unique ongoing set """
@@ -0,0 +1,165 @@
+""" Append-only journal of matchmaker events for crash recovery """
+
+import os
+import pickle
+import queue
+import struct
+import threading
+import logging
+import zlib
+from typing import Any, List, Optional, Tuple
+
+from ..event import EventKind
+
+__all__ = ("Journal",)
+
+
+MAGIC = b"MMJ1"
+FILE_HEADER = struct.Struct("<4sQ")  # magic, generation
+RECORD_HEADER = struct.Struct("<BII")  # event kind, payload size, crc32
+
+RECORD = 0
+SNAPSHOT = 1
+CLOSE = 2
+
+
+class Journal:
+    """Append-only binary journal of matchmaker events
+    - path: journal file, the last snapshot is stored in `path.snapshot`
+    - snapshot_every: records appended before the matchmaker takes a snapshot
+    - batch_size: maximum records written per fsync
+
+    Records are pickled on the caller's thread and written by a background thread,
+    the journal is truncated every time a snapshot is written so recovery only
+    replays the activity since the last snapshot.
+    """
+
+    def __init__(self, path: str, snapshot_every: int = 1024, batch_size: int = 256):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.snapshot_path = f"{path}.snapshot"
+        self.snapshot_every = snapshot_every
+        self.batch_size = batch_size
+        self.records = 0
+
+        self.generation = self.__snapshot_generation()
+        if self.__journal_generation() != self.generation:
+            with open(self.path, "wb") as journal:
+                journal.write(FILE_HEADER.pack(MAGIC, self.generation))
+
+        self.file = open(self.path, "ab")  # pylint: disable=consider-using-with
+        self.queue: "queue.Queue[Tuple[int, Optional[EventKind], bytes]]" = queue.Queue()
+        self.writer = threading.Thread(
+            target=self.__drain, name="matchmaker.journal", daemon=True
+        )
+        self.writer.start()
+
+    def append(self, kind: EventKind, payload: Any):
+        """ append a record, the write happens on the journal thread """
+        data = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+        self.queue.put((RECORD, kind, data))
+        self.records += 1
+
+    def snapshot(self, state: Any):
+        """ write a snapshot of the state, records appended before it are discarded """
+        data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+        self.queue.put((SNAPSHOT, None, data))
+        self.records = 0
+
+    def needs_snapshot(self) -> bool:
+        """ check if enough records were appended since the last snapshot """
+        return self.records >= self.snapshot_every
+
+    def flush(self):
+        """ wait until every appended record has been written """
+        self.queue.join()
+
+    def close(self):
+        """ write pending records and stop the journal thread """
+        if not self.writer.is_alive():
+            return
+        self.queue.put((CLOSE, None, b""))
+        self.writer.join()
+        self.file.close()
+
+    def read(self) -> Tuple[Optional[Any], List[Tuple[EventKind, Any]]]:
+        """ read the last snapshot and the records appended after it """
+        state = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as snapshot:
+                snapshot.seek(FILE_HEADER.size)
+                state = pickle.loads(snapshot.read())
+
+        records: List[Tuple[EventKind, Any]] = []
+        with open(self.path, "rb") as journal:
+            journal.seek(FILE_HEADER.size)
+            while True:
+                header = journal.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                kind, size, crc = RECORD_HEADER.unpack(header)
+                data = journal.read(size)
+                if len(data) < size or zlib.crc32(data) != crc:
+                    self.logger.warning("Ignoring torn record at the end of the journal")
+                    break
+                records.append((EventKind(kind), pickle.loads(data)))
+        return state, records
+
+    def __snapshot_generation(self) -> int:
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        with open(self.snapshot_path, "rb") as snapshot:
+            _, generation = FILE_HEADER.unpack(snapshot.read(FILE_HEADER.size))
+        return generation
+
+    def __journal_generation(self) -> Optional[int]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as journal:
+            header = journal.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            return None
+        magic, generation = FILE_HEADER.unpack(header)
+        return generation if magic == MAGIC else None
+
+    def __write_snapshot(self, data: bytes):
+        self.generation += 1
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "wb") as snapshot:
+            snapshot.write(FILE_HEADER.pack(MAGIC, self.generation))
+            snapshot.write(data)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(tmp, self.snapshot_path)
+
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(FILE_HEADER.pack(MAGIC, self.generation))
+
+    def __drain(self):
+        stop = False
+        while not stop:
+            items = [self.queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                for action, kind, data in items:
+                    if action == RECORD:
+                        assert kind is not None
+                        header = RECORD_HEADER.pack(kind.value, len(data), zlib.crc32(data))
+                        self.file.write(header + data)
+                    elif action == SNAPSHOT:
+                        self.__write_snapshot(data)
+                    else:
+                        stop = True
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            except OSError as err:
+                self.logger.error("Failed to write journal: %s", err)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
@@ -1,15 +1,28 @@
 """ Matchmaker interface """
 
 import logging
-from typing import List, Optional
+import threading
+from datetime import datetime, timedelta
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
 
-from .context import QueueContext
+from .context import QueueContext, InGameContext, InGameState
 from .config import Config
 from .games import Games
-
-from ..event import EventMap, EventHandler
-from ..event.events import QueueEvent, DequeueEvent, ResultEvent
-from ..event.handlers import MatchTriggerHandler
+from .journal import Journal
+from .principal import get_principal
+
+from ..event import EventMap, EventHandler, EventKind
+from ..event.events import (
+    QueueEvent,
+    DequeueEvent,
+    QueueBatchEvent,
+    ResultEvent,
+    RoundEndEvent,
+    RoundExpireEvent,
+)
+from ..event.handlers import MatchTriggerHandler, GameEndHandler, JournalHandler
+from ..event.stats import HandlerStats, HandlerStat
 from ..error import Failable, Error
 
 from ..tables import Player, Team, Match, Round
@@ -20,19 +33,59 @@ __all__ = ("MatchMaker",)
 class MatchMaker:
     """Single queue, multiple games utility based matchmaker
     with asynchronous event handling
+
+    When `config.coalesce_window` is set, queue and dequeue events are coalesced
+    during the window and emitted as one QueueBatchEvent per kind. The queue itself
+    is updated immediately and the batch is flushed as soon as the trigger
+    threshold is reached, so rounds fire exactly as they do without coalescing.
+
+    When a journal is passed, the queue and ongoing games are recovered from it
+    and every queue mutation, result and round start/end is appended to it. The
+    rounds ended by the recovered records are kept in `ended` with their matches,
+    handlers registered later never see their end event.
+
+    When `config.instrument_handlers` is set, handler calls are timed, see `handler_stats`.
+
+    When `config.round_timeout` is set, a background sweeper expires the rounds that
+    did not receive all of their results in time, see `expire_rounds`.
     """
 
-    def __init__(self, config: Config, base_round: Round):
+    def __init__(
+        self, config: Config, base_round: Round, journal: Optional[Journal] = None
+    ):
         assert base_round.round_id != 0
 
         self.logger = logging.getLogger(__name__)
         self.config = config
+        self.journal = journal
 
         self.qctx = QueueContext(base_round, config.max_history)
         self.games = Games.new()
 
+        self.stats: Optional[HandlerStats] = None
+        if config.instrument_handlers:
+            self.stats = HandlerStats()
+
         self.evmap = EventMap.new()
-        self.__register_trigger_handler()
+        self.evmap.stats = self.stats
+        self.__register_handlers()
+
+        self.lock = threading.RLock()
+        self.queued: List[Team] = []
+        self.dequeued: List[Team] = []
+        self.flush_timer: Optional[threading.Timer] = None
+
+        self.ended: List[Tuple[Round, List[Match]]] = []
+        if self.journal is not None:
+            self.__recover(self.journal)
+
+        self.sweeping = threading.Event()
+        self.sweeper: Optional[threading.Thread] = None
+        if config.round_timeout > 0:
+            self.sweeper = threading.Thread(
+                target=self.__sweep, name="matchmaker.sweeper", daemon=True
+            )
+            self.sweeper.start()
 
         self.logger.info("MatchMaker initialized at round: %s", base_round.round_id)
 
@@ -62,22 +115,195 @@ class MatchMaker:
 
     def reset(self):
         """ reset the matchmaker, clears queue, games and handlers """
-        self.qctx.clear()
-        self.games = Games.new()
-        self.evmap = EventMap.new()
-        self.logger.info("cleared queue, games and handlers")
-        self.__register_trigger_handler()
+        self.join()
+        with self.lock:
+            self.__clear_batch()
+            self.qctx.clear()
+            self.games = Games.new()
+            self.evmap = EventMap.new()
+            self.evmap.stats = self.stats
+            self.logger.info("cleared queue, games and handlers")
+            self.__register_handlers()
+            self.snapshot()
 
     def clear_history(self):
         """ clear the game history """
-        self.qctx.clear_history()
+        with self.lock:
+            self.qctx.clear_history()
+            self.snapshot()
 
     def clear_queue(self):
         """ clear the queue """
-        self.qctx.clear()
-
-    def __register_trigger_handler(self):
+        with self.lock:
+            self.__clear_batch()
+            self.qctx.clear()
+            self.snapshot()
+
+    def close(self):
+        """ stop the sweeper, flush pending events, wait for handlers and close the journal """
+        self.sweeping.set()
+        if self.sweeper is not None:
+            self.sweeper.join()
+        self.flush()
+        self.join()
+        if self.journal is not None:
+            self.journal.close()
+
+    def __register_handlers(self):
         self.evmap.register(MatchTriggerHandler(self.config, self.games, self.evmap))
+        if self.journal is not None:
+            self.evmap.register(JournalHandler(EventKind.ROUND_START, self.journal))
+            self.evmap.register(JournalHandler(EventKind.ROUND_END, self.journal))
+            self.evmap.register(JournalHandler(EventKind.ROUND_EXPIRE, self.journal))
+
+    def snapshot(self):
+        """ write a snapshot of the queue and the ongoing games to the journal """
+        if self.journal is None:
+            return
+        with self.lock:
+            games = [
+                (
+                    context.principal.config.principal,
+                    context.round,
+                    context.matches,
+                    context.results,
+                    context.state,
+                )
+                for context in self.games.values()
+            ]
+            self.journal.snapshot(
+                {
+                    "round_id": self.qctx.round.round_id,
+                    "queue": self.qctx.queue,
+                    "history": self.qctx.history,
+                    "games": games,
+                }
+            )
+
+    def __append(self, kind: EventKind, payload: Any):
+        if self.journal is None:
+            return
+        self.journal.append(kind, payload)
+
+    def __checkpoint(self):
+        if self.journal is not None and self.journal.needs_snapshot():
+            self.snapshot()
+
+    def __recover(self, journal: Journal):
+        state, records = journal.read()
+        if state is not None:
+            self.qctx.round.round_id = max(self.qctx.round.round_id, state["round_id"])
+            for team in state["queue"]:
+                self.qctx.queue_team(team)
+            self.qctx.history = state["history"]
+            for principal, rnd, matches, results, ingame in state["games"]:
+                context = self.__start_round(principal, rnd, matches)
+                context.results = results
+                context.state = ingame
+
+        for kind, payload in records:
+            if kind is EventKind.QUEUE:
+                self.qctx.queue_team(payload)
+            elif kind is EventKind.DEQUEUE:
+                self.qctx.dequeue_team(payload)
+            elif kind is EventKind.RESULT:
+                self.games.add_result(payload)
+                self.qctx.push_history(payload)
+            elif kind is EventKind.ROUND_START:
+                principal, rnd, matches = payload
+                self.qctx.clear()
+                self.__start_round(principal, rnd, matches)
+                self.qctx.round.round_id = max(
+                    self.qctx.round.round_id, rnd.round_id + 1
+                )
+            elif kind is EventKind.ROUND_END:
+                context = self.games.get(hash(payload.round_id))
+                if context is not None:
+                    self.ended.append((payload, context.reported_matches()))
+                self.__end_round(payload)
+            else:
+                self.__end_round(payload)
+
+        # the journal may hold the result completing a round but not its end
+        for context in list(self.games.values()):
+            if context.is_complete():
+                self.__end_recovered(context)
+
+        self.logger.info(
+            "Recovered %s queued teams and %s games from %s journal records",
+            len(self.qctx),
+            len(self.games),
+            len(records),
+        )
+        self.snapshot()
+
+    def __end_recovered(self, context: InGameContext):
+        """ end a recovered round as its GameEndHandler would have """
+        self.__end_round(context.round)
+        context.round.end_time = datetime.now()
+        self.logger.info("Recovered round '%s' has ended", context.round.round_id)
+        self.ended.append((context.round, context.matches))
+        err = self.evmap.handle(RoundEndEvent(context, context.round))
+        if isinstance(err, Error):
+            self.logger.error("recovered round end failed: %s", err.message)
+
+    def __start_round(
+        self, principal: str, rnd: Round, matches: List[Match]
+    ) -> InGameContext:
+        config = replace(self.config, principal=principal)
+        context = InGameContext(get_principal(rnd, config), matches)
+        self.games.push_game(context)
+        self.evmap.register(GameEndHandler(rnd, self.games, self.evmap))
+        return context
+
+    def __end_round(self, rnd: Round):
+        self.games.pop(hash(rnd.round_id), None)
+        handler = GameEndHandler(rnd, self.games, self.evmap)
+        if handler in self.evmap[EventKind.RESULT]:
+            self.evmap.deregister(handler)
+
+    def expire_rounds(self, now: Optional[datetime] = None) -> List[Round]:
+        """expire the rounds that started more than `round_timeout` seconds ago,
+        rounds with reported matches are ended with those matches only
+        """
+        if self.config.round_timeout <= 0:
+            return []
+
+        now = datetime.now() if now is None else now
+        timeout = timedelta(seconds=self.config.round_timeout)
+        with self.lock:
+            stale = [
+                context
+                for context in self.games.values()
+                if context.round.start_time is not None
+                and now - context.round.start_time > timeout
+            ]
+            for context in stale:
+                err = self.__expire(context, now)
+                if isinstance(err, Error):
+                    self.logger.error("round expiry failed: %s", err.message)
+        return [context.round for context in stale]
+
+    def __expire(self, context: InGameContext, now: datetime) -> Failable:
+        self.__end_round(context.round)
+        context.round.end_time = now
+        context.matches = context.reported_matches()
+        context.state = InGameState.ENDED
+        self.logger.info(
+            "Round '%s' has expired with %s reported matches",
+            context.round.round_id,
+            len(context.matches),
+        )
+
+        error = None
+        if len(context.matches) != 0:
+            error = self.evmap.handle(RoundEndEvent(context, context.round))
+        err = self.evmap.handle(RoundExpireEvent(context, context.round))
+        return err if error is None else error
+
+    def __sweep(self):
+        while not self.sweeping.wait(self.config.sweep_interval):
+            self.expire_rounds()
 
     def get_queue(self) -> List[Team]:
         """ get queue """
@@ -107,34 +333,111 @@ class MatchMaker:
 
     def queue_team(self, team: Team) -> Failable:
         """ queue a team """
-        err = self.qctx.queue_team(team)
-        if isinstance(err, Error):
-            return err
-
-        self.logger.info("queued (%s) %s", team.team_id, team.name)
-        return self.evmap.handle(QueueEvent(self.qctx, team))
+        with self.lock:
+            self.__checkpoint()
+            err = self.qctx.queue_team(team)
+            if isinstance(err, Error):
+                return err
+
+            self.logger.info("queued (%s) %s", team.team_id, team.name)
+            self.__append(EventKind.QUEUE, team)
+            if self.config.coalesce_window <= 0:
+                return self.evmap.handle(QueueEvent(self.qctx, team))
+
+            self.queued.append(team)
+            if len(self.qctx) == self.config.trigger_threshold:
+                return self.flush()
+            self.__schedule_flush()
+            return None
 
     def dequeue_team(self, team: Team) -> Failable:
         """ dequeue a team """
-        err = self.qctx.dequeue_team(team)
-        if isinstance(err, Error):
+        with self.lock:
+            self.__checkpoint()
+            err = self.qctx.dequeue_team(team)
+            if isinstance(err, Error):
+                return err
+
+            self.logger.info("dequeued (%s) %s", team.team_id, team.name)
+            self.__append(EventKind.DEQUEUE, team)
+            if self.config.coalesce_window <= 0:
+                return self.evmap.handle(DequeueEvent(self.qctx, team))
+
+            if team in self.queued:
+                self.queued.remove(team)
+            else:
+                self.dequeued.append(team)
+            self.__schedule_flush()
+            return None
+
+    def flush(self) -> Failable:
+        """ emit the coalesced events for the queue mutations of the current window """
+        with self.lock:
+            queued, dequeued = self.queued, self.dequeued
+            self.__clear_batch()
+            if len(queued) == 0 and len(dequeued) == 0:
+                return None
+
+            self.logger.debug(
+                "flushed %s queued and %s dequeued teams", len(queued), len(dequeued)
+            )
+            err = None
+            if len(queued) != 0:
+                err = self.evmap.handle(QueueBatchEvent(self.qctx, queued))
+            if len(dequeued) != 0:
+                failed = self.evmap.handle(QueueBatchEvent(self.qctx, dequeued, True))
+                if failed is not None:
+                    err = failed
             return err
 
-        self.logger.info("dequeued (%s) %s", team.team_id, team.name)
-        return self.evmap.handle(DequeueEvent(self.qctx, team))
+    def __schedule_flush(self):
+        if self.flush_timer is not None:
+            return
+        self.flush_timer = threading.Timer(
+            self.config.coalesce_window, self.__timed_flush
+        )
+        self.flush_timer.daemon = True
+        self.flush_timer.start()
+
+    def __timed_flush(self):
+        err = self.flush()
+        if isinstance(err, Error):
+            self.logger.error("coalesced queue event failed: %s", err.message)
+
+    def __clear_batch(self):
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        self.queued = []
+        self.dequeued = []
 
     def insert_result(self, match: Match) -> Failable:
         """ enter a result for an ongoing set """
-        key = self.games.add_result(match)
-        if isinstance(key, Error):
-            return key
-
-        err = self.qctx.push_history(match)
-        if isinstance(err, Error):
-            return err
-
-        self.logger.info("handled result for match '%s'", match.match_id)
-        return self.evmap.handle(ResultEvent(self.games[key], match))
+        with self.lock:
+            self.__checkpoint()
+            key = self.games.add_result(match)
+            if isinstance(key, Error):
+                return key
+            self.__append(EventKind.RESULT, match)
+
+            err = self.qctx.push_history(match)
+            if isinstance(err, Error):
+                return err
+
+            self.logger.info("handled result for match '%s'", match.match_id)
+            return self.evmap.handle(ResultEvent(self.games[key], match))
+
+    def join(self, timeout: Optional[float] = None) -> Failable:
+        """wait for handlers running outside of the dispatch path, returns the latest
+        error they returned since the last join (errors are logged by the event map)
+        """
+        return self.evmap.join(timeout)
+
+    def handler_stats(self) -> Dict[Tuple[EventKind, str], HandlerStat]:
+        """ snapshot of the handler statistics keyed by event kind and handler type """
+        if self.stats is None:
+            return {}
+        return self.stats.snapshot()
 
     def register_handler(self, handler: EventHandler):
         """ register a handler to event map """
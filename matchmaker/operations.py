@@ -1,11 +1,12 @@
 """ Base class for database operations """
 
 import abc
-from typing import Optional
+from contextlib import AbstractContextManager
+from typing import Any, Dict, List, Optional, Sequence
 
 from .template import ColumnQuery, Conditional
 
-__all__ = ("Insertable", "Table", "Loadable")
+__all__ = ("Insertable", "Table", "Loadable", "Storage")
 
 
 class Table(abc.ABC):
@@ -54,3 +55,51 @@ class Loadable(abc.ABC):  # pylint: disable=R0903
     @abc.abstractclassmethod
     def load_from(cls, conn, rhs) -> Optional["Loadable"]:
         """ loads itself from the database using the set fields """
+
+    @abc.abstractclassmethod
+    def load_many_from(cls, conn, rhs) -> Dict[Any, "Loadable"]:
+        """ loads the rows of the primary keys set in rhs, keyed by primary key """
+
+
+class Storage(abc.ABC):
+    """Abstract storage backend of the tables, failures are logged and reported
+    through the return values (only `transaction` raises)
+    """
+
+    @abc.abstractmethod
+    def exists(self, table: Table, title: str = "ExistQuery") -> bool:
+        """ Check if record exists """
+
+    @abc.abstractmethod
+    def insert(self, query: Insertable, title: str = "InsertQuery") -> bool:
+        """ insert a row, returns False on failure """
+
+    @abc.abstractmethod
+    def insert_many(
+        self, rows: Sequence[Insertable], title: str = "InsertManyQuery"
+    ) -> Optional[List[int]]:
+        """ insert rows of the same table, returns their ids or None on failure """
+
+    @abc.abstractmethod
+    def insert_all(
+        self, rows: Sequence[Insertable], title: str = "InsertAllQuery"
+    ) -> bool:
+        """ insert rows of the same table without their ids, False on failure """
+
+    @abc.abstractmethod
+    def load(self, query: Loadable, title: str = "LoadQuery") -> Optional[Loadable]:
+        """ Load the class using information of passed through rhs """
+
+    @abc.abstractmethod
+    def load_many(
+        self, rows: Sequence[Loadable], title: str = "LoadManyQuery"
+    ) -> Dict[Any, Loadable]:
+        """ load rows of the same table by primary key, keyed by primary key """
+
+    @abc.abstractmethod
+    def transaction(self) -> AbstractContextManager:
+        """ context in which writes are applied together or rolled back if it raises """
+
+    @abc.abstractmethod
+    def close(self):
+        """ release the storage, pending writes are kept """
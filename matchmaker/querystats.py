@@ -0,0 +1,86 @@
+""" Per query title timing statistics """
+
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict
+
+__all__ = ("QueryStat", "QueryStats", "QuerySummary")
+
+
+@dataclass
+class QuerySummary:
+    """ Latency summary of a query title in milliseconds """
+
+    calls: int
+    slow: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+@dataclass
+class QueryStat:
+    """Timings of a query title, percentiles are computed over the last `window`
+    calls while counts and maximum cover every call
+    """
+
+    window: int = field(default=1024)
+    calls: int = field(default=0)
+    slow: int = field(default=0)
+    max_ns: int = field(default=0)
+    samples: Deque[int] = field(default_factory=deque)
+
+    def record(self, elapsed_ns: int, slow: bool):
+        """ record a call """
+        self.calls += 1
+        self.slow += int(slow)
+        self.max_ns = max(self.max_ns, elapsed_ns)
+        self.samples.append(elapsed_ns)
+        if len(self.samples) > self.window:
+            self.samples.popleft()
+
+    def percentile(self, pct: float) -> int:
+        """ latency percentile of the window in nanoseconds """
+        if len(self.samples) == 0:
+            return 0
+        ordered = sorted(self.samples)
+        rank = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def summary(self) -> QuerySummary:
+        """ summary of the statistics in milliseconds """
+        return QuerySummary(
+            calls=self.calls,
+            slow=self.slow,
+            p50_ms=self.percentile(50) / 1e6,
+            p95_ms=self.percentile(95) / 1e6,
+            p99_ms=self.percentile(99) / 1e6,
+            max_ms=self.max_ns / 1e6,
+        )
+
+
+class QueryStats(Dict[str, QueryStat]):
+    """ Statistics keyed by query title """
+
+    def __init__(self, window: int = 1024, slow_ms: float = 100.0):
+        super().__init__()
+        self.window = window
+        self.slow_ns = int(slow_ms * 1e6)
+        self.lock = threading.Lock()
+
+    def record(self, title: str, elapsed_ns: int) -> bool:
+        """ record a query, returns True if it was slow """
+        slow = elapsed_ns >= self.slow_ns
+        with self.lock:
+            stat = self.get(title)
+            if stat is None:
+                stat = self[title] = QueryStat(window=self.window)
+            stat.record(elapsed_ns, slow)
+        return slow
+
+    def summary(self) -> Dict[str, QuerySummary]:
+        """ summary of every query title """
+        with self.lock:
+            return {title: stat.summary() for title, stat in self.items()}
@@ -0,0 +1,265 @@
+""" In-memory ranking of the teams by elo """
+
+import copy
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .db import Database
+from .tables import Result, Team, _decode_team
+
+__all__ = ("Ranking",)
+
+
+# teams are ordered by decreasing elo then increasing team id
+Key = Tuple[float, int]
+
+
+@dataclass
+class _Node:
+    """ treap node, `size` is the number of nodes of the subtree """
+
+    key: Key
+    team: Team
+    priority: float = field(default_factory=random.random)
+    size: int = field(default=1)
+    left: Optional["_Node"] = field(default=None)
+    right: Optional["_Node"] = field(default=None)
+
+
+def _size(node: Optional[_Node]) -> int:
+    return 0 if node is None else node.size
+
+
+def _update(node: _Node) -> _Node:
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node
+
+
+def _split(node: Optional[_Node], key: Key) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """ split the tree into the keys lower than `key` and the others """
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        return _update(node), right
+    left, node.left = _split(node.left, key)
+    return left, _update(node)
+
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    """ merge two trees, every key of `left` is lower than the keys of `right` """
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+def _key(team: Team) -> Key:
+    return (-team.elo, team.team_id)
+
+
+class Ranking:
+    """Teams ordered by elo in an order-statistic treap, ranks and pages are
+    answered in O(log n) without querying the database
+
+    Teams are stored as copies, ranks start at 1.
+    """
+
+    def __init__(self):
+        self.root: Optional[_Node] = None
+        self.keys: Dict[int, Key] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, team_id: int) -> bool:
+        return team_id in self.keys
+
+    def load(
+        self,
+        db: Database,
+        base_elo: float,
+        batch: int = 256,
+        pending: Optional[Dict[int, float]] = None,
+    ):
+        """replace the ranking with every team of the database, `pending` are the
+        elo deltas of the rounds that are not written yet
+        """
+        pending = {} if pending is None else pending
+        rows = db.iter_rows(Team.leaderboard(-1), "LoadRanking", batch)
+        teams = [_decode_team(row, base_elo) for row in rows]
+        for team in teams:
+            team.elo += pending.get(team.team_id, 0.0)
+        with self.lock:
+            self.root = None
+            self.keys.clear()
+            for team in teams:
+                self.__insert(copy.copy(team))
+
+    def drift(
+        self,
+        db: Database,
+        base_elo: float,
+        tolerance: float = 1e-6,
+        pending: Optional[Dict[int, float]] = None,
+    ) -> List[Tuple[int, int, Optional[int]]]:
+        """teams ranked differently by the database (id, database rank, ranking rank),
+        `pending` are the elo deltas of the rounds that are not written yet
+        """
+        standings = db.iter_rows(Team.standings(), "RankingDrift")
+        rows = [(rank, team_id, base_elo + delta) for rank, team_id, delta in standings]
+        if pending:
+            # the database ranks don't include the rounds that are not written yet
+            elos = [(elo + pending.get(tid, 0.0), tid) for _, tid, elo in rows]
+            elos.sort(key=lambda elo: (-elo[0], elo[1]))
+            rows = [(rank, team_id, elo) for rank, (elo, team_id) in enumerate(elos, 1)]
+
+        drifted = []
+        for rank, team_id, expected in rows:
+            team, ranked = self.get(team_id), self.rank(team_id)
+            moved = team is None or abs(team.elo - expected) > tolerance
+            if moved or ranked != rank:
+                drifted.append((team_id, rank, ranked))
+        return drifted
+
+    def add_results(self, results: Iterable[Optional[Result]]):
+        """ move the teams of the results by their delta, unranked teams are added """
+        for result in results:
+            if result is None or result.team is None or result.delta is None:
+                continue
+            if not self.add_delta(result.team.team_id, result.delta):
+                team = copy.copy(result.team)
+                team.elo += result.delta
+                self.put(team)
+
+    def put(self, team: Team):
+        """ add a copy of the team or replace the ranked team with the same id """
+        team = copy.copy(team)
+        with self.lock:
+            self.__remove(team.team_id)
+            self.__insert(team)
+
+    def remove(self, team_id: int) -> Optional[Team]:
+        """ remove a team, returns it if it was ranked """
+        with self.lock:
+            return self.__remove(team_id)
+
+    def add_delta(self, team_id: int, delta: float) -> bool:
+        """ move a team by an elo variation, returns False if it is not ranked """
+        with self.lock:
+            team = self.__remove(team_id)
+            if team is None:
+                return False
+            team.elo += delta
+            self.__insert(team)
+            return True
+
+    def get(self, team_id: int) -> Optional[Team]:
+        """ copy of the ranked team """
+        with self.lock:
+            key = self.keys.get(team_id)
+            if key is None:
+                return None
+            node = self.root
+            while node is not None and node.key != key:
+                node = node.left if key < node.key else node.right
+            return None if node is None else copy.copy(node.team)
+
+    def rank(self, team_id: int) -> Optional[int]:
+        """ rank of a team, None if it is not ranked """
+        with self.lock:
+            key = self.keys.get(team_id)
+            if key is None:
+                return None
+            rank, node = 1, self.root
+            while node is not None:
+                if key <= node.key:
+                    if key == node.key:
+                        return rank + _size(node.left)
+                    node = node.left
+                else:
+                    rank += _size(node.left) + 1
+                    node = node.right
+            return None
+
+    def select(self, rank: int) -> Optional[Team]:
+        """ copy of the team at this rank """
+        with self.lock:
+            node = self.__select(rank)
+            return None if node is None else copy.copy(node.team)
+
+    def page(self, page: int, size: int = 16) -> List[Tuple[int, Team]]:
+        """ ranks and copies of the teams of a page, pages start at 1 """
+        first = (page - 1) * size + 1
+        ranks = range(first, first + size)
+        with self.lock:
+            return [
+                (rank, copy.copy(team))
+                for rank, team in zip(ranks, self.__iter_from(first))
+            ]
+
+    def top(self, count: int) -> List[Team]:
+        """ copies of the `count` best ranked teams """
+        return [team for _, team in self.page(1, count)]
+
+    def __insert(self, team: Team):
+        key = _key(team)
+        left, right = _split(self.root, key)
+        self.root = _merge(_merge(left, _Node(key, team)), right)
+        self.keys[team.team_id] = key
+
+    def __remove(self, team_id: int) -> Optional[Team]:
+        key = self.keys.pop(team_id, None)
+        if key is None:
+            return None
+        left, right = _split(self.root, key)
+        # the first node of `right` is the removed team
+        node, right = _split(right, (key[0], key[1] + 1))
+        self.root = _merge(left, right)
+        return None if node is None else node.team
+
+    def __select(self, rank: int) -> Optional[_Node]:
+        node = self.root
+        while node is not None:
+            left = _size(node.left)
+            if rank <= left:
+                node = node.left
+            elif rank == left + 1:
+                return node
+            else:
+                rank -= left + 1
+                node = node.right
+        return None
+
+    def __iter_from(self, rank: int) -> Iterator[Team]:
+        """ in order walk of the teams starting at a rank """
+        stack: List[_Node] = []
+        node = self.root
+        # descend to the node of `rank`, keeping the ancestors that follow it
+        while node is not None:
+            left = _size(node.left)
+            if rank <= left:
+                stack.append(node)
+                node = node.left
+            elif rank == left + 1:
+                stack.append(node)
+                break
+            else:
+                rank -= left + 1
+                node = node.right
+
+        while stack:
+            node = stack.pop()
+            yield node.team
+            child = node.right
+            while child is not None:
+                stack.append(child)
+                child = child.left
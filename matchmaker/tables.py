@@ -2,10 +2,11 @@
 
 from datetime import datetime
 from dataclasses import dataclass, field
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Sequence, Union
 
 from .operations import Table, Insertable, Loadable
 from .template import (
+    Column,
     ColumnQuery,
     QueryKind,
     Values,
@@ -13,9 +14,16 @@ from .template import (
     Where,
     Eq,
     And,
+    In,
     InnerJoin,
     Alias,
     Conditional,
+    OrderBy,
+    Desc,
+    Limit,
+    Offset,
+    Over,
+    RowNumber,
 )
 
 from .db import Database
@@ -56,15 +64,32 @@ class Player(Table, Insertable, Loadable):
         cond = rhs.match_conditions()
         if cond is None:
             return None
-        query = ColumnQuery(QueryKind.SELECT, rhs.table, "*", Where(cond))
-
-        query.headers = [rhs.primary_key, "name"]
-        query.kind = QueryKind.SELECT
+        query = ColumnQuery(
+            QueryKind.SELECT, rhs.table, [rhs.primary_key, "name"], Where(cond)
+        )
 
         queried = conn.execute(query, "LoadFromPlayer")
         if queried is None:
             return None
-        return cls(*queried.fetchone())
+        return _decode_player(queried.fetchone())
+
+    @classmethod
+    def load_many_from(
+        cls, conn: Database, rhs: Sequence["Player"]
+    ) -> Dict[Any, "Player"]:
+        ids = [player.discord_id for player in rhs]
+        query = ColumnQuery(
+            QueryKind.SELECT,
+            "player",
+            ["discord_id", "name"],
+            Where(In("discord_id", ids)),
+        )
+
+        queried = conn.execute(query, "LoadManyFromPlayer")
+        if queried is None:
+            return {}
+        players = map(_decode_player, queried.fetchall())
+        return {player.discord_id: player for player in players}
 
     def as_insert_query(self):
         return ColumnQuery(
@@ -109,24 +134,36 @@ class Round(Table, Insertable, Loadable):
         queried = conn.execute(query, "LoadFromRound")
         if queried is None:
             return None
+        return _decode_round(queried.fetchone())
 
-        round_id, start, end, part = queried.fetchone()
-        return cls(
-            round_id=round_id,
-            start_time=start,
-            end_time=end,
-            participants=part,
+    @classmethod
+    def load_many_from(
+        cls, conn: Database, rhs: Sequence["Round"]
+    ) -> Dict[Any, "Round"]:
+        ids = [rnd.round_id for rnd in rhs]
+        query = ColumnQuery(
+            QueryKind.SELECT,
+            "turn",
+            ["round_id", "start_time", "end_time", "participants"],
+            Where(In("round_id", ids)),
         )
 
+        queried = conn.execute(query, "LoadManyFromRound")
+        if queried is None:
+            return {}
+        rounds = map(_decode_round, queried.fetchall())
+        return {rnd.round_id: rnd for rnd in rounds}
+
     def as_insert_query(self):
         headers = ["start_time", "participants"]
-        start_time = f"{self.start_time:%Y-%m-%d %H:%M:%S}"
-        values = Values((start_time, self.participants))
+        values = [f"{self.start_time:%Y-%m-%d %H:%M:%S}", self.participants]
         if self.end_time is not None:
             headers.append("end_time")
-            end_time = f"{self.end_time:%Y-%m-%d %H:%M:%S}"
-            values = Values((start_time, self.participants, end_time))
-        return ColumnQuery(QueryKind.INSERT, self.table, headers, values)
+            values.append(f"{self.end_time:%Y-%m-%d %H:%M:%S}")
+        if self.round_id != 0:
+            headers.append("round_id")
+            values.append(self.round_id)
+        return ColumnQuery(QueryKind.INSERT, self.table, headers, Values(values))
 
 
 @dataclass(eq=False)
@@ -185,16 +222,25 @@ class Team(Table, Insertable, Loadable):
         queried = conn.execute(query, "LoadFromTeam")
         if queried is None:
             return None
-        tid, tname, p1id, p1name, p2id, p2name, delta = queried.fetchone()
+        return _decode_team(queried.fetchone(), rhs.elo)
 
-        return cls(
-            team_id=tid,
-            name=tname,
-            player_one=Player(p1id, p1name),
-            player_two=Player(p2id, p2name),
-            elo=rhs.elo + delta,
+    @classmethod
+    def load_many_from(cls, conn: Database, rhs: Sequence["Team"]) -> Dict[Any, "Team"]:
+        """ load teams by id, the elo of each rhs team is the base of its loaded elo """
+        base = {team.team_id: team.elo for team in rhs}
+        query = ColumnQuery(
+            QueryKind.SELECT,
+            "team_details_with_delta",
+            "*",
+            Where(In("team_id", list(base))),
         )
 
+        queried = conn.execute(query, "LoadManyFromTeam")
+        if queried is None:
+            return {}
+        teams = (_decode_team(row, base[row[0]]) for row in queried.fetchall())
+        return {team.team_id: team for team in teams}
+
     def as_insert_query(self):
         return ColumnQuery(
             QueryKind.INSERT,
@@ -203,6 +249,25 @@ class Team(Table, Insertable, Loadable):
             Values((self.name, self.player_one.discord_id, self.player_two.discord_id)),
         )
 
+    @staticmethod
+    def leaderboard(count: int, offset: int = 0) -> ColumnQuery:
+        """ teams with the highest delta sum first (walks the team_rating_delta index) """
+        statements = [OrderBy([Desc("delta_sum")]), Limit(count)]
+        if offset != 0:
+            statements.append(Offset(offset))
+        return ColumnQuery(QueryKind.SELECT, "team_details_with_delta", "*", statements)
+
+    @staticmethod
+    def standings() -> ColumnQuery:
+        """ (rank, team_id, delta_sum) of every team, ranked by SQLite in one pass """
+        rank = Over(RowNumber(), order_by=[Desc("delta_sum"), "team_id"])
+        return ColumnQuery(
+            QueryKind.SELECT,
+            "team_rating",
+            [rank, "team_id", "delta_sum"],
+            OrderBy([Desc("delta_sum"), "team_id"]),
+        )
+
     def absorb_result(self, result: "Result"):
         """ absorb a result """
         assert result.delta is not None
@@ -248,20 +313,29 @@ class Result(Table, Insertable, Loadable):
         if cond is None:
             return None
 
-        query = ColumnQuery(QueryKind.SELECT, rhs.table, "*", Where(cond))
+        query = ColumnQuery(QueryKind.SELECT, rhs.table, RESULT_COLUMNS, Where(cond))
         queried = conn.execute(query, "LoadFromResult")
         if queried is None:
             return None
-        result = queried.fetchone()
-        player_one = Player(discord_id=result[5], name=result[6])
-        player_two = Player(discord_id=result[7], name=result[8])
-        team = Team(
-            team_id=result[3],
-            name=result[4],
-            player_one=player_one,
-            player_two=player_two,
+        return _decode_result(queried.fetchone())
+
+    @classmethod
+    def load_many_from(
+        cls, conn: Database, rhs: Sequence["Result"]
+    ) -> Dict[Any, "Result"]:
+        ids = [result.result_id for result in rhs]
+        query = ColumnQuery(
+            QueryKind.SELECT,
+            "result_with_team_details",
+            RESULT_COLUMNS,
+            Where(In("result_id", ids)),
         )
-        return cls(result_id=result[0], team=team, points=result[1], delta=result[2])
+
+        queried = conn.execute(query, "LoadManyFromResult")
+        if queried is None:
+            return {}
+        results = map(_decode_result, queried.fetchall())
+        return {result.result_id: result for result in results}
 
     @staticmethod
     def elo_for_team(team: Team) -> ColumnQuery:
@@ -282,22 +356,6 @@ class Result(Table, Insertable, Loadable):
         )
 
 
-def __to_result(result: list) -> Result:
-    tid, tname, p1id, p1name, p2id, p2name = result[0:6]
-    rid, rpoints, rdelta = result[6:9]
-    return Result(
-        result_id=rid,
-        points=rpoints,
-        delta=rdelta,
-        team=Team(
-            team_id=tid,
-            name=tname,
-            player_one=Player(discord_id=p1id, name=p1name),
-            player_two=Player(discord_id=p2id, name=p2name),
-        ),
-    )
-
-
 @dataclass(eq=False)
 class Match(Table, Insertable, Loadable):
     """ Representation of the match table """
@@ -361,63 +419,23 @@ class Match(Table, Insertable, Loadable):
         if conds is None:
             return None
 
-        query = ColumnQuery(
-            QueryKind.SELECT,
-            rhs.table,
-            [
-                "match.match_id",
-                "match.odds_ratio",
-                "res1.team_id",  # 2
-                "res1.team_name",
-                "res1.player_one_id",
-                "res1.player_one_name",
-                "res1.player_two_id",
-                "res1.player_two_name",  # 7
-                "res1.result_id",
-                "res1.points",
-                "res1.delta",  # 10,
-                "res2.team_id",  # 11
-                "res2.team_name",
-                "res2.player_one_id",
-                "res2.player_one_name",
-                "res2.player_two_id",
-                "res2.player_two_name",
-                "res2.result_id",  # 17
-                "res2.points",
-                "res2.delta",  # 19
-                "turn.round_id",  # 20
-                "turn.start_time",
-                "turn.end_time",
-                "turn.participants",  # 23
-            ],
-            [
-                InnerJoin(
-                    Alias("result_with_team_details", "res1"),
-                    on=Eq("match.result_one", "res1.result_id"),
-                ),
-                InnerJoin(
-                    Alias("result_with_team_details", "res2"),
-                    on=Eq("match.result_two", "res2.result_id"),
-                ),
-                InnerJoin("turn", on=Eq("match.round_id", "turn.round_id")),
-                Where(conds),
-            ],
-        )
-
-        queried = conn.execute(query, "LoadFromMatch")
+        queried = conn.execute(_match_query(conds), "LoadFromMatch")
         if queried is None:
             return None
-        result = queried.fetchone()
-
-        match_id, odds_ratio = result[:2]
-        rnd = Round(*result[20:24])
-        return cls(
-            match_id=match_id,
-            round=rnd,
-            team_one=__to_result(result[2:11]),
-            team_two=__to_result(result[11:20]),
-            odds_ratio=odds_ratio,
+        return _decode_match(queried.fetchone())
+
+    @classmethod
+    def load_many_from(
+        cls, conn: Database, rhs: Sequence["Match"]
+    ) -> Dict[Any, "Match"]:
+        ids = [match.match_id for match in rhs]
+        queried = conn.execute(
+            _match_query(In("match.match_id", ids)), "LoadManyFromMatch"
         )
+        if queried is None:
+            return {}
+        matches = map(_decode_match, queried.fetchall())
+        return {match.match_id: match for match in matches}
 
     def as_insert_query(self):
         return ColumnQuery(
@@ -435,4 +453,100 @@ class Match(Table, Insertable, Loadable):
         )
 
 
+RESULT_COLUMNS = [
+    "result_id",
+    "team_id",
+    "team_name",
+    "player_one_id",
+    "player_one_name",
+    "player_two_id",
+    "player_two_name",
+    "points",
+    "delta",
+]
+
+MATCH_COLUMNS = [
+    "match.match_id",
+    "match.odds_ratio",
+    *(f"res1.{column}" for column in RESULT_COLUMNS),
+    *(f"res2.{column}" for column in RESULT_COLUMNS),
+    "turn.round_id",
+    "turn.start_time",
+    "turn.end_time",
+    "turn.participants",
+]
+
+
+def _match_query(conds: Conditional) -> ColumnQuery:
+    return ColumnQuery(
+        QueryKind.SELECT,
+        "match",
+        MATCH_COLUMNS,
+        [
+            InnerJoin(
+                Alias("result_with_team_details", "res1"),
+                on=Eq("match.result_one", Column("res1.result_id")),
+            ),
+            InnerJoin(
+                Alias("result_with_team_details", "res2"),
+                on=Eq("match.result_two", Column("res2.result_id")),
+            ),
+            InnerJoin("turn", on=Eq("match.round_id", Column("turn.round_id"))),
+            Where(conds),
+        ],
+    )
+
+
+# row decoders shared by the single and bulk loads
+
+
+def _decode_player(row: Sequence[Any]) -> Player:
+    discord_id, name = row
+    return Player(discord_id=discord_id, name=name)
+
+
+def _decode_round(row: Sequence[Any]) -> Round:
+    round_id, start, end, participants = row
+    return Round(
+        round_id=round_id, start_time=start, end_time=end, participants=participants
+    )
+
+
+def _decode_team(row: Sequence[Any], base_elo: float) -> Team:
+    tid, tname, p1id, p1name, p2id, p2name, delta = row
+    return Team(
+        team_id=tid,
+        name=tname,
+        player_one=Player(p1id, p1name),
+        player_two=Player(p2id, p2name),
+        elo=base_elo + delta,
+    )
+
+
+def _decode_result(row: Sequence[Any]) -> Result:
+    rid, tid, tname, p1id, p1name, p2id, p2name, points, delta = row
+    return Result(
+        result_id=rid,
+        points=points,
+        delta=delta,
+        team=Team(
+            team_id=tid,
+            name=tname,
+            player_one=Player(discord_id=p1id, name=p1name),
+            player_two=Player(discord_id=p2id, name=p2name),
+        ),
+    )
+
+
+def _decode_match(row: Sequence[Any]) -> Match:
+    match_id, odds_ratio = row[:2]
+    return Match(
+        match_id=match_id,
+        round=_decode_round(row[20:24]),
+        team_one=_decode_result(row[2:11]),
+        team_two=_decode_result(row[11:20]),
+        odds_ratio=odds_ratio,
+    )
+
+
 Index = Union[Player, Team, Match, int]
@@ -1,29 +1,70 @@
-""" SQL Templating interface """
+""" SQL Templating interface
+
+Statements are rendered with inlined values, or compiled to a query with `?`
+placeholders when a parameter list is passed to `render`. Compiled queries are
+cached by shape, the structure of the query without its values, so queries
+that only differ by their values are rendered once.
+"""
 
 import abc
-from typing import Any, List, Optional, Union
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple, Union
 from dataclasses import dataclass, field
 from enum import Enum
 
 
+Params = Optional[List[Any]]
+
+PLACEHOLDER = object()
+
+
 class AsStatement(abc.ABC):  # pylint: disable=too-few-public-methods
     """ type that can be rendered """
 
     @abc.abstractmethod
-    def render(self):
-        """ render the statement as a SQL query """
+    def render(self, params: Params = None):
+        """ render the statement as a SQL query, values are appended to params if set """
+
+    @abc.abstractmethod
+    def shape(self, params: List[Any]) -> Hashable:
+        """ structural key of the statement, values are appended to params """
 
 
 Statement = Union[str, int, AsStatement]
 
 
-def render_statement(statement: Statement) -> str:
+def render_statement(statement: Statement, params: Params = None) -> str:
     """ removes AsStatement type of union """
     if isinstance(statement, AsStatement):
-        return statement.render()
+        return statement.render(params)
     return str(statement)
 
 
+def shape_statement(statement: Statement, params: List[Any]) -> Hashable:
+    """ shape of a statement, plain statements are part of the shape """
+    if isinstance(statement, AsStatement):
+        return statement.shape(params)
+    return str(statement)
+
+
+def shape_value(value: Any, params: List[Any]) -> Hashable:
+    """ shape of a value, values are always bound as parameters """
+    params.append(value)
+    return PLACEHOLDER
+
+
+def render_value(value: Any, params: Params = None) -> str:
+    """ render a value as a literal or as a placeholder if params is set """
+    if params is not None:
+        params.append(value)
+        return "?"
+    if isinstance(value, str):
+        escaped = value.replace("'", "''")
+        return f"'{escaped}'"
+    return str(value)
+
+
 class QueryKind(Enum):
     """ Supported query kinds """
 
@@ -33,6 +74,19 @@ class QueryKind(Enum):
     INSERT = 3
 
 
+@dataclass
+class Column(AsStatement):
+    """ column reference used as an operand, plain strings are values """
+
+    name: str
+
+    def render(self, params: Params = None):
+        return self.name
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (Column, self.name)
+
+
 @dataclass
 class WithOperand(AsStatement):
     """ . 'operand' . """
@@ -42,16 +96,26 @@ class WithOperand(AsStatement):
     operation: str = field(init=False)
     wrap: bool = field(default=False)
 
-    def render(self):
-        op1 = self.operand_1
-        if isinstance(self.operand_2, str) and "." not in self.operand_2:
-            op2 = f"'{self.operand_2}'"
+    def render(self, params: Params = None):
+        op1 = render_statement(self.operand_1, params)
+        op2 = self.operand_2
+        if isinstance(op2, AsStatement):
+            op2 = render_statement(op2, params)
         else:
-            op2 = self.operand_2
+            op2 = render_value(op2, params)
 
-        rendered = f"{render_statement(op1)} {self.operation} {render_statement(op2)}"
+        rendered = f"{op1} {self.operation} {op2}"
         return f"({rendered})" if self.wrap else rendered
 
+    def shape(self, params: List[Any]) -> Hashable:
+        op1 = shape_statement(self.operand_1, params)
+        op2 = self.operand_2
+        if isinstance(op2, AsStatement):
+            op2 = shape_statement(op2, params)
+        else:
+            op2 = shape_value(op2, params)
+        return (type(self), self.wrap, op1, op2)
+
 
 @dataclass
 class Eq(WithOperand):
@@ -79,17 +143,38 @@ class And(WithOperand):
         self.wrap = True
 
 
-Conditional = Union[Eq, Or, And]
+@dataclass
+class In(AsStatement):
+    """ SQL . IN (..., ...) """
+
+    operand: Statement
+    values: List[Any]
+
+    def render(self, params: Params = None):
+        operand = render_statement(self.operand, params)
+        values = ",".join(render_value(value, params) for value in self.values)
+        return f"{operand} IN ({values})"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        operand = shape_statement(self.operand, params)
+        params.extend(self.values)
+        return (In, operand, len(self.values))
+
+
+Conditional = Union[Eq, Or, And, In]
 
 
 class Values(AsStatement, tuple):
     """ SQL (..., ..., ) """
 
-    def render(self):
-        convert = lambda x: f"'{x}'" if isinstance(x, str) else str(x)
-        values = ",".join(map(convert, self))
+    def render(self, params: Params = None):
+        values = ",".join(render_value(value, params) for value in self)
         return f"({values})"
 
+    def shape(self, params: List[Any]) -> Hashable:
+        params.extend(self)
+        return (Values, len(self))
+
 
 @dataclass
 class Sum(AsStatement):
@@ -97,8 +182,11 @@ class Sum(AsStatement):
 
     header: Statement
 
-    def render(self):
-        return f"SUM({render_statement(self.header)})"
+    def render(self, params: Params = None):
+        return f"SUM({render_statement(self.header, params)})"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (type(self), shape_statement(self.header, params))
 
 
 @dataclass
@@ -107,8 +195,50 @@ class Max(AsStatement):
 
     header: Statement
 
-    def render(self):
-        return f"MAX({render_statement(self.header)})"
+    def render(self, params: Params = None):
+        return f"MAX({render_statement(self.header, params)})"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (type(self), shape_statement(self.header, params))
+
+
+@dataclass
+class RowNumber(AsStatement):
+    """ SQL ROW_NUMBER() (window function, use it in an Over) """
+
+    def render(self, params: Params = None):
+        return "ROW_NUMBER()"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (RowNumber,)
+
+
+@dataclass
+class Over(AsStatement):
+    """ SQL . OVER (PARTITION BY ., . ORDER BY ., .) """
+
+    function: Statement
+    partition_by: List[Statement] = field(default_factory=list)
+    order_by: List[Statement] = field(default_factory=list)
+
+    def render(self, params: Params = None):
+        window = []
+        if len(self.partition_by) != 0:
+            headers = ",".join(render_statement(h, params) for h in self.partition_by)
+            window.append(f"PARTITION BY {headers}")
+        if len(self.order_by) != 0:
+            headers = ",".join(render_statement(h, params) for h in self.order_by)
+            window.append(f"ORDER BY {headers}")
+        function = render_statement(self.function, params)
+        return f"{function} OVER ({' '.join(window)})"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (
+            Over,
+            shape_statement(self.function, params),
+            tuple(shape_statement(header, params) for header in self.partition_by),
+            tuple(shape_statement(header, params) for header in self.order_by),
+        )
 
 
 @dataclass
@@ -118,11 +248,17 @@ class InnerJoin(AsStatement):
     table: Statement
     on: Optional[Statement] = None  # pylint: disable=invalid-name
 
-    def render(self):
-        table = render_statement(self.table)
+    def render(self, params: Params = None):
+        table = render_statement(self.table, params)
         if self.on is None:
             return f"INNER JOIN {table}"
-        return f"INNER JOIN {table} ON {render_statement(self.on)}\n"
+        return f"INNER JOIN {table} ON {render_statement(self.on, params)}\n"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        table = shape_statement(self.table, params)
+        if self.on is None:
+            return (InnerJoin, table)
+        return (InnerJoin, table, shape_statement(self.on, params))
 
 
 @dataclass
@@ -132,9 +268,12 @@ class Alias(AsStatement):
     table: str
     alias: str
 
-    def render(self):
+    def render(self, params: Params = None):
         return f"{self.table} as {self.alias}"
 
+    def shape(self, params: List[Any]) -> Hashable:
+        return (Alias, self.table, self.alias)
+
 
 @dataclass
 class Where(AsStatement):
@@ -142,8 +281,129 @@ class Where(AsStatement):
 
     conditions: Statement
 
-    def render(self):
-        return f"WHERE {render_statement(self.conditions)}\n"
+    def render(self, params: Params = None):
+        return f"WHERE {render_statement(self.conditions, params)}\n"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (Where, shape_statement(self.conditions, params))
+
+
+@dataclass
+class Desc(AsStatement):
+    """ SQL . DESC """
+
+    header: Statement
+
+    def render(self, params: Params = None):
+        return f"{render_statement(self.header, params)} DESC"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (Desc, shape_statement(self.header, params))
+
+
+@dataclass
+class GroupBy(AsStatement):
+    """ SQL GROUP BY ., . """
+
+    headers: List[Statement]
+
+    def render(self, params: Params = None):
+        headers = ",".join(render_statement(header, params) for header in self.headers)
+        return f"GROUP BY {headers}\n"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (GroupBy, tuple(shape_statement(header, params) for header in self.headers))
+
+
+@dataclass
+class OrderBy(AsStatement):
+    """ SQL ORDER BY ., . (wrap headers in Desc for a descending order) """
+
+    headers: List[Statement]
+
+    def render(self, params: Params = None):
+        headers = ",".join(render_statement(header, params) for header in self.headers)
+        return f"ORDER BY {headers}\n"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (OrderBy, tuple(shape_statement(header, params) for header in self.headers))
+
+
+@dataclass
+class Limit(AsStatement):
+    """ SQL LIMIT . """
+
+    count: int
+
+    def render(self, params: Params = None):
+        return f"LIMIT {render_value(self.count, params)}\n"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (Limit, shape_value(self.count, params))
+
+
+@dataclass
+class Offset(AsStatement):
+    """ SQL OFFSET . (must follow a Limit) """
+
+    count: int
+
+    def render(self, params: Params = None):
+        return f"OFFSET {render_value(self.count, params)}\n"
+
+    def shape(self, params: List[Any]) -> Hashable:
+        return (Offset, shape_value(self.count, params))
+
+
+class ShapeCache:
+    """Bounded LRU cache of compiled SQL keyed by query shape
+    - maxsize: number of shapes kept before the least recently used is evicted
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.queries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    @property
+    def hit_ratio(self) -> float:
+        """ ratio of lookups that found a compiled query """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups != 0 else 0.0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """ get the compiled query of the shape, counts the hit or miss """
+        with self.lock:
+            query = self.queries.get(key)
+            if query is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.queries.move_to_end(key)
+            return query
+
+    def put(self, key: Hashable, query: str):
+        """ store the compiled query of the shape """
+        with self.lock:
+            self.queries[key] = query
+            self.queries.move_to_end(key)
+            while len(self.queries) > self.maxsize:
+                self.queries.popitem(last=False)
+
+    def clear(self):
+        """ drop the compiled queries and reset the counters """
+        with self.lock:
+            self.queries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+SHAPES = ShapeCache()
 
 
 SELECT = """
@@ -168,6 +428,9 @@ class ColumnQuery(AsStatement):
     table: str
     headers: Union[Statement, List[Statement]]
     statement: Union[Statement, List[Statement]]
+    compiled: Optional[Tuple[str, List[Any]]] = field(
+        default=None, init=False, compare=False
+    )
 
     def __repr__(self):
         if self.kind is QueryKind.SELECT:
@@ -185,35 +448,63 @@ class ColumnQuery(AsStatement):
         """ Match table row on the key and value (query.kind is not set) """
         return cls(kind, table, [key], Where(Eq(key, value)))
 
-    def join_headers(self) -> str:
+    def join_headers(self, params: Params = None) -> str:
         """ render the header part of the query """
         if not isinstance(self.headers, list):
             self.headers = [self.headers]
-        return ",".join(map(render_statement, self.headers))
+        return ",".join(render_statement(header, params) for header in self.headers)
 
-    def render_statements(self) -> str:
+    def render_statements(self, params: Params = None, sep: str = " ") -> str:
         """ render the statement part of the query """
         if not isinstance(self.statement, list):
             self.statement = [self.statement]
-        return " ".join(map(render_statement, self.statement))
+        return sep.join(render_statement(stmt, params) for stmt in self.statement)
 
-    def render(self) -> str:
+    def shape(self, params: List[Any]) -> Hashable:
+        headers = self.headers if isinstance(self.headers, list) else [self.headers]
+        stmts = self.statement if isinstance(self.statement, list) else [self.statement]
+        if self.kind is QueryKind.EXISTS:
+            shaped_headers: Tuple[Hashable, ...] = ()
+        else:
+            shaped_headers = tuple(shape_statement(header, params) for header in headers)
+        shaped_stmts = tuple(shape_statement(stmt, params) for stmt in stmts)
+        return (ColumnQuery, self.kind, self.table, shaped_headers, shaped_stmts)
+
+    def compile(self) -> Tuple[str, List[Any]]:
+        """Render the query with placeholders, returns the query and its parameters.
+        The rendered query is cached by shape in `SHAPES`, the shape walk still
+        collects the parameters of every new query object but is only done once
+        per object (don't change a query once it is compiled)
+        """
+        if self.compiled is None:
+            params: List[Any] = []
+            key = self.shape(params)
+            query = SHAPES.get(key)
+            if query is None:
+                query = self.render([])
+                SHAPES.put(key, query)
+            self.compiled = (query, params)
+        return self.compiled
+
+    def render(self, params: Params = None) -> str:
         """ render the whole query """
-        context = {
-            "headers": self.join_headers(),
-            "table": self.table,
-            "statements": self.render_statements(),
-        }
         if self.kind is QueryKind.NONE:
             raise ValueError("QueryKind has not been specified")
 
+        if self.kind is QueryKind.EXISTS:
+            statements = self.render_statements(params)
+            return EXISTS.format(table=self.table, statements=statements)
+
+        context = {
+            "headers": self.join_headers(params),
+            "table": self.table,
+            "statements": self.render_statements(
+                params, "," if self.kind is QueryKind.INSERT else " "
+            ),
+        }
         if self.kind is QueryKind.SELECT:
             return SELECT.format(**context)
 
-        if self.kind is QueryKind.EXISTS:
-            del context["headers"]
-            return EXISTS.format(**context)
-
         if self.kind is QueryKind.INSERT:
             return "INSERT INTO {table}({headers}) VALUES {statements}".format(
                 **context
@@ -0,0 +1,374 @@
+""" Write-behind persistence of finished rounds """
+
+import copy
+import itertools
+import logging
+import os
+import pickle
+import queue
+import sqlite3 as sql
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .db import TransactionError
+from .operations import Storage
+from .tables import Match, Result, Round
+
+__all__ = ("RoundRecord", "RoundWriter", "read_spill")
+
+
+@dataclass(frozen=True)
+class RoundRecord:
+    """ Finished round waiting to be written, holds copies of the round and matches """
+
+    round: Round
+    matches: Tuple[Match, ...]
+
+    @classmethod
+    def of(cls, rnd: Round, matches: List[Match]) -> "RoundRecord":
+        """ record a copy of the round so later changes of the game are not written """
+        return cls(copy.deepcopy(rnd), tuple(copy.deepcopy(matches)))
+
+    def results(self) -> List[Result]:
+        """ results of the matches in insertion order """
+        results = []
+        for match in self.matches:
+            assert match.team_one is not None and match.team_two is not None
+            results.extend((match.team_one, match.team_two))
+        return results
+
+    def deltas(self) -> Dict[int, float]:
+        """ elo delta of every team of the round """
+        deltas: Dict[int, float] = {}
+        for result in self.results():
+            assert result.team is not None
+            team_id = result.team.team_id
+            deltas[team_id] = deltas.get(team_id, 0.0) + result.delta
+        return deltas
+
+
+def read_spill(path: str) -> List[RoundRecord]:
+    """ rounds a round writer has not written, a torn last round is ignored """
+    records = []
+    with open(path, "rb") as spill:
+        while True:
+            try:
+                records.append(pickle.load(spill))
+            except (EOFError, pickle.UnpicklingError):
+                return records
+
+
+class RoundWriter:
+    """Writes finished rounds to the database from a background thread
+    - batch_size: rounds written per transaction
+    - max_pending: rounds queued before `submit` defers rounds to the failed rounds
+    - retries: attempts of a transaction before rounds are written one by one
+    - max_backoff: longest delay in seconds between two retries of the failed rounds
+    - spill_path: file every round is appended to before `submit` returns and
+      removed from once written, so rounds that are not written when the process
+      stops are queued again by `recover` (read them with `read_spill`)
+    - on_submitted: called with every round as its deltas become pending, rounds
+      are not submitted or written meanwhile (see `paused`)
+    - on_written: called with every round once it is committed
+
+    Rounds that can't be written or queued are logged, kept in `failed` and retried
+    with an exponential backoff while the writer runs, their deltas stay pending.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        db: Storage,
+        batch_size: int = 8,
+        max_pending: int = 64,
+        retries: int = 3,
+        retry_delay: float = 0.1,
+        max_backoff: float = 60.0,
+        spill_path: Optional[str] = None,
+        on_submitted: Optional[Callable[[RoundRecord], None]] = None,
+        on_written: Optional[Callable[[RoundRecord], None]] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.db = db
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.spill_path = spill_path
+        self.on_submitted = on_submitted
+        self.on_written = on_written
+
+        self.queue: "queue.Queue[Optional[RoundRecord]]" = queue.Queue(max_pending)
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()
+        self.pending: Dict[int, float] = {}
+        self.unwritten: Dict[int, RoundRecord] = {}
+        self.failed: List[RoundRecord] = []
+        self.failures = 0
+        self.retry_at = 0.0
+        self.thread = threading.Thread(
+            target=self.__drain, name="matchmaker.writer", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, record: RoundRecord, timeout: float = 0.0) -> bool:
+        """queue a round to be written, waits at most `timeout` seconds while
+        `max_pending` rounds are queued, the round is then deferred to the failed
+        rounds (it is still written), returns False if the round was deferred or
+        the writer is closed
+        """
+        if not self.is_running():
+            return False
+        with self.lock:
+            self.__track(record)
+            self.__persist(record)
+        try:
+            self.queue.put(record, timeout > 0, timeout)
+            return True
+        except queue.Full:
+            self.logger.warning(
+                "Write queue is full, round %s is deferred", record.round.round_id
+            )
+            self.failed.append(record)
+            return False
+
+    def recover(self, records: Iterable[RoundRecord] = ()) -> int:
+        """queue the rounds left in `spill_path` and `records` to be written, rounds
+        that are already written or queued are skipped, returns the rounds queued
+        """
+        spilled: List[RoundRecord] = []
+        if self.spill_path is not None and os.path.exists(self.spill_path):
+            spilled = read_spill(self.spill_path)
+
+        recovered = []
+        with self.lock:
+            for record in itertools.chain(spilled, records):
+                round_id = record.round.round_id
+                if round_id in self.unwritten or self.db.exists(Round(round_id=round_id)):
+                    continue
+                self.__track(record)
+                recovered.append(record)
+            self.__trim()
+
+        for record in recovered:
+            self.logger.warning("Recovered round %s", record.round.round_id)
+            self.queue.put(record)
+        return len(recovered)
+
+    def unwritten_ids(self) -> List[int]:
+        """ ids of the submitted rounds that have not been written yet """
+        with self.lock:
+            return list(self.unwritten)
+
+    def is_running(self) -> bool:
+        """ check if the writer thread is running """
+        return self.thread.is_alive()
+
+    def pending_deltas(self) -> Dict[int, float]:
+        """ elo deltas per team of the rounds that have not been written yet """
+        with self.lock:
+            return {
+                team_id: delta for team_id, delta in self.pending.items() if delta != 0
+            }
+
+    @contextmanager
+    def paused(self) -> Iterator["RoundWriter"]:
+        """Block submissions and writes during the block, the database and the
+        pending deltas then hold every submitted round exactly once
+        """
+        with self.write_lock, self.lock:
+            yield self
+
+    def flush(self):
+        """ wait until every queued round has been written """
+        self.queue.join()
+
+    def close(self):
+        """write the queued rounds, retry the failed ones a last time and stop the
+        writer thread (rounds still failing are spilled)
+        """
+        if not self.thread.is_alive():
+            return
+        self.queue.put(None)
+        self.thread.join()
+
+    def __track(self, record: RoundRecord):
+        for team_id, delta in record.deltas().items():
+            self.pending[team_id] = self.pending.get(team_id, 0.0) + delta
+        self.unwritten[record.round.round_id] = record
+        if self.on_submitted is not None:
+            self.on_submitted(record)
+
+    def __persist(self, record: RoundRecord):
+        if self.spill_path is None:
+            return
+        try:
+            with open(self.spill_path, "ab") as spill:
+                pickle.dump(record, spill, pickle.HIGHEST_PROTOCOL)
+                spill.flush()
+                os.fsync(spill.fileno())
+        except OSError as err:
+            self.logger.error(
+                "Failed to persist round %s: %s", record.round.round_id, err
+            )
+
+    def __trim(self):
+        """ rewrite the spill file with the rounds that are not written yet """
+        if self.spill_path is None:
+            return
+        with self.lock:
+            try:
+                if len(self.unwritten) == 0:
+                    if os.path.exists(self.spill_path):
+                        os.remove(self.spill_path)
+                    return
+                tmp = f"{self.spill_path}.tmp"
+                with open(tmp, "wb") as spill:
+                    for record in self.unwritten.values():
+                        pickle.dump(record, spill, pickle.HIGHEST_PROTOCOL)
+                    spill.flush()
+                    os.fsync(spill.fileno())
+                os.replace(tmp, self.spill_path)
+            except OSError as err:
+                self.logger.error("Failed to trim '%s': %s", self.spill_path, err)
+
+    def __settle(self, record: RoundRecord):
+        with self.lock:
+            self.unwritten.pop(record.round.round_id, None)
+            for team_id, delta in record.deltas().items():
+                self.pending[team_id] = self.pending.get(team_id, 0.0) - delta
+                if abs(self.pending[team_id]) < 1e-9:
+                    del self.pending[team_id]
+
+    def __write(self, records: List[RoundRecord]):
+        with self.db.transaction():
+            for record in records:
+                if not self.db.insert(record.round, "RoundInsert"):
+                    raise TransactionError(f"Failed to insert round {record.round}")
+
+                results = record.results()
+                result_ids = self.db.insert_many(results, "ResultInsert")
+                if result_ids is None:
+                    raise TransactionError("Failed to insert results")
+                for result, result_id in zip(results, result_ids):
+                    result.result_id = result_id
+
+                if not self.db.insert_all(record.matches, "MatchInsert"):
+                    raise TransactionError("Failed to insert matches")
+
+    def __attempt(self, records: List[RoundRecord], retries: int) -> bool:
+        for attempt in range(retries):
+            try:
+                self.__write(records)
+                return True
+            except (TransactionError, sql.Error) as err:
+                self.logger.warning(
+                    "Failed to write %d round(s) (attempt %d): %s",
+                    len(records),
+                    attempt + 1,
+                    err,
+                )
+                if attempt + 1 < retries:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+        return False
+
+    def __written(self, record: RoundRecord):
+        self.__settle(record)
+        if self.on_written is None:
+            return
+        try:
+            self.on_written(record)
+        except Exception as err:  # pylint: disable=broad-except
+            self.logger.error("Written round callback raised: %r", err)
+
+    def __commit(self, records: List[RoundRecord]):
+        if self.__attempt(records, self.retries):
+            for record in records:
+                self.__written(record)
+            self.__trim()
+            return
+
+        # isolate the rounds that can't be written from the rest of the batch
+        for record in records:
+            if len(records) > 1 and self.__attempt([record], 1):
+                self.__written(record)
+                continue
+            self.logger.error("Failed to write round %s", record.round.round_id)
+            self.failed.append(record)
+            if self.failures == 0:
+                self.retry_at = time.monotonic() + self.retry_delay
+        self.__trim()
+
+    def __retry(self):
+        """ retry the failed rounds one by one, backing off while any still fails """
+        written = False
+        for record in list(self.failed):
+            if self.__attempt([record], 1):
+                self.failed.remove(record)
+                self.__written(record)
+                written = True
+        if written:
+            self.__trim()
+
+        if len(self.failed) == 0:
+            self.failures = 0
+            return
+        self.failures += 1
+        delay = min(self.max_backoff, self.retry_delay * 2 ** self.failures)
+        self.retry_at = time.monotonic() + delay
+        self.logger.error(
+            "%d round(s) failed to be written, next retry in %.1fs",
+            len(self.failed),
+            delay,
+        )
+
+    def __spill(self):
+        if len(self.failed) == 0:
+            return
+        if self.spill_path is None:
+            for record in self.failed:
+                self.logger.error("Lost round %s: %r", record.round.round_id, record)
+        else:
+            self.__trim()
+            self.logger.error(
+                "Spilled %d round(s) to '%s'", len(self.failed), self.spill_path
+            )
+        for record in self.failed:
+            self.__settle(record)
+
+    def __drain(self):
+        stop = False
+        while not stop:
+            if len(self.failed) != 0 and time.monotonic() >= self.retry_at:
+                with self.write_lock:
+                    self.__retry()
+            try:
+                # rounds deferred by `submit` are picked up within `max_backoff`
+                timeout = self.max_backoff
+                if len(self.failed) != 0:
+                    timeout = max(0.0, self.retry_at - time.monotonic())
+                items = [self.queue.get(timeout=timeout)]
+            except queue.Empty:
+                continue
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [item for item in items if item is not None]
+            stop = len(records) != len(items)
+            try:
+                if len(records) != 0:
+                    with self.write_lock:
+                        self.__commit(records)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+        with self.write_lock:
+            if len(self.failed) != 0:
+                self.__retry()
+            self.__spill()
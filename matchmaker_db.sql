@@ -68,3 +68,6 @@ CREATE VIEW IF NOT EXISTS result_with_team_details AS
 SELECT result.result_id, team.*, result.points, result.delta
 FROM result
 INNER JOIN team_with_details as team ON result.team_id = team.team_id;
+
+-- Indexes and later schema changes are applied by matchmaker/migrations.py
+-- when the database is opened (the applied version is stored in user_version)
@@ -2,14 +2,37 @@
 
 import unittest
 
-from .queries import SelectQueries, SpecializedQueries
+from .queries import (
+    SelectQueries,
+    SpecializedQueries,
+    CompiledQueries,
+    Transactions,
+    StorageProfile,
+    QueryPlans,
+    TeamRatings,
+    Archival,
+    Snapshots,
+    AsyncQueries,
+)
+
+from .analytics import AnalyticsTest
+from .cache import TeamCacheTest
+from .ranking import RankingTest
+from .storage import SQLiteStorageTest, MemoryStorageTest
+from .writer import RoundWriterTest
 
 from .event import EventMapTest
 from .event.events import QueueEventsTest, ResultEventsTest, RoundEventsTest
 from .event.handlers import MatchTriggerHandlerTest, GameEndHandlerTest
 
 from .tables import PlayerTest, TeamTest, ResultTest, MatchTest, RoundTest
-from .mm import MatchMakerTest, QueueContextTest, InGameContextTest, GamesTest
+from .mm import (
+    MatchMakerTest,
+    QueueContextTest,
+    InGameContextTest,
+    GamesTest,
+    JournalTest,
+)
 
 
 class UTGroup:
@@ -46,16 +69,39 @@ class UTGroup:
 
 GROUPS = UTGroup(
     {
-        "all": ["queries", "event", "mm"],
+        "all": [
+            "queries",
+            "tables",
+            "analytics",
+            "cache",
+            "ranking",
+            "storage",
+            "writer",
+            "event",
+            "mm",
+        ],
+        "analytics": ["AnalyticsTest"],
+        "cache": ["TeamCacheTest"],
+        "ranking": ["RankingTest"],
+        "storage": ["SQLiteStorageTest", "MemoryStorageTest"],
+        "writer": ["RoundWriterTest"],
         "queries": [
             "SelectQueries",
             "SpecializedQueries",
+            "CompiledQueries",
+            "Transactions",
+            "StorageProfile",
+            "QueryPlans",
+            "TeamRatings",
+            "Archival",
+            "Snapshots",
+            "AsyncQueries",
         ],
         "tables": ["PlayerTest", "TeamTest", "ResultTest", "MatchTest", "RoundTest"],
         "event": ["EventMapTest", "events", "handlers"],
         "events": ["QueueEventsTest", "ResultEventsTest", "RoundEventsTest"],
         "handlers": ["MatchTriggerHandlerTest", "GameEndHandlerTest"],
-        "mm": ["MatchMakerTest", "GamesTest", "context"],
+        "mm": ["MatchMakerTest", "GamesTest", "JournalTest", "context"],
         "context": ["QueueContextTest", "InGameContextTest"],
     }
 )
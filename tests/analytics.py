@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+
+from matchmaker.analytics import (
+    async_elo_series,
+    async_history_deltas,
+    elo_series,
+    group_deltas,
+    history_deltas,
+)
+
+NAMES = {1: "A", 2: "B", 3: "C"}
+
+
+class AnalyticsTest(unittest.TestCase):
+    def test_history_deltas(self):
+        rows = [(1, 1, 10), (2, 1, -10), (4, 2, 5)]
+        assert list(history_deltas(rows, NAMES.get)) == [
+            (1, 1, "A", 10),
+            (1, 2, "B", -10),
+            (2, 4, "4", 5),
+        ]
+
+    def test_elo_series(self):
+        rows = [(1, 1, 10), (2, 1, -10), (2, 2, 5), (3, 2, -5)]
+        series = elo_series(history_deltas(iter(rows), NAMES.get))
+        assert sorted(series) == [1, 2, 3]
+        assert series[2].name == "B"
+        assert series[2].rounds == [0, 1, 2]
+        assert series[2].deltas == [0, -10, 5]
+
+        only = elo_series(history_deltas(rows, NAMES.get), team_id=3)
+        assert list(only) == [3] and only[3].deltas == [0, -5]
+
+    def test_group_deltas(self):
+        series = {}
+        for row in [(1, 1, 10), (2, 1, -10), (1, 2, 3), (2, 2, -3)]:
+            group_deltas(series, history_deltas((row,), NAMES.get))
+        assert series[1].rounds == [0, 1, 2] and series[1].deltas == [0, 10, 3]
+
+    def test_async_elo_series(self):
+        rows = [(1, 1, 10), (2, 1, -10), (1, 2, 3), (2, 2, -3)]
+
+        async def stream():
+            for row in rows:
+                yield row
+
+        deltas = async_history_deltas(stream(), NAMES.get)
+        series = asyncio.run(async_elo_series(deltas))
+        assert series == elo_series(history_deltas(rows, NAMES.get))
+        assert series[1].rounds == [0, 1, 2] and series[1].deltas == [0, 10, 3]
@@ -0,0 +1,92 @@
+import unittest
+
+from matchmaker import Config, Database
+from matchmaker.cache import TeamCache
+from matchmaker.tables import Player, Team, Round, Match, Result
+from matchmaker.mm.context import InGameContext
+from matchmaker.mm.principal import get_principal
+from matchmaker.event import EventMap
+from matchmaker.event.events import RoundEndEvent
+from matchmaker.event.handlers import TeamCacheHandler
+
+
+def new_team(team_id: int, name: str, elo: float = 1000) -> Team:
+    return Team(
+        team_id=team_id,
+        name=name,
+        player_one=Player(discord_id=2 * team_id),
+        player_two=Player(discord_id=2 * team_id + 1),
+        elo=elo,
+    )
+
+
+class TeamCacheTest(unittest.TestCase):
+    def test_get_by_id_and_name(self):
+        cache = TeamCache()
+        cache.put(new_team(1, "One", 1042), now=0)
+        assert cache.get(team_id=1, now=1).elo == 1042
+        assert cache.get(name="One", now=1).team_id == 1
+        assert cache.get(name="Two", now=1) is None
+        assert cache.hits == 2 and cache.misses == 1
+
+    def test_copies(self):
+        cache = TeamCache()
+        team = new_team(1, "One")
+        cache.put(team, now=0)
+        team.elo = 0
+        cached = cache.get(1, now=0)
+        cached.elo = 0
+        assert cache.get(1, now=0).elo == 1000
+
+    def test_ttl(self):
+        cache = TeamCache(ttl=10)
+        cache.put(new_team(1, "One"), now=0)
+        assert cache.get(1, now=10) is not None
+        assert cache.get(1, now=11) is None
+        assert len(cache) == 0 and cache.get(name="One", now=0) is None
+
+    def test_lru(self):
+        cache = TeamCache(maxsize=2)
+        for i, name in enumerate(("One", "Two"), 1):
+            cache.put(new_team(i, name), now=0)
+        assert cache.get(1, now=0) is not None
+        cache.put(new_team(3, "Three"), now=0)
+        assert cache.get(name="Two", now=0) is None
+        assert cache.get(name="One", now=0) is not None
+        assert cache.get(name="Three", now=0) is not None
+
+    def test_invalidate(self):
+        cache = TeamCache()
+        cache.put(new_team(1, "One"), now=0)
+        cache.put(new_team(2, "Two"), now=0)
+        cache.invalidate(name="One")
+        cache.invalidate(2)
+        assert len(cache) == 0
+
+    def test_round_end(self):
+        cache = TeamCache()
+        rnd = Round(round_id=1)
+        t1, t2, t3 = new_team(1, "One"), new_team(2, "Two"), new_team(3, "Three")
+        for team in (t1, t2, t3):
+            cache.put(team, now=0)
+
+        match = Match(
+            match_id=1,
+            round=rnd,
+            team_one=Result(result_id=1, team=t1),
+            team_two=Result(result_id=2, team=t2),
+        )
+        context = InGameContext(get_principal(rnd, Config()), [match])
+        evmap = EventMap.new()
+        evmap.register(TeamCacheHandler(cache))
+        assert evmap.handle(RoundEndEvent(context, rnd)) is None
+        assert cache.get(1, now=0) is None and cache.get(2, now=0) is None
+        assert cache.get(3, now=0) is not None
+
+    def test_loaded_team(self):
+        db = Database("tests/full_mockdb.sqlite3")
+        cache = TeamCache()
+        team = db.load(Team(name="Team_1_2", elo=1000))
+        cache.put(team)
+        cached = cache.get(name="Team_1_2")
+        assert cached.team_id == team.team_id and cached.elo == team.elo
@@ -1,7 +1,8 @@
 from dataclasses import dataclass, field
 from typing import Any
 
-from matchmaker.event import EventHandler, EventKind, EventContext
+from matchmaker.event import EventHandler, EventKind, EventContext, ExecutionPolicy
+from matchmaker.event.error import HandlingError
 
 
 @dataclass
@@ -11,6 +12,8 @@ class EqHandler(EventHandler):
     expect: Any = field(default=None)
     persistent: bool = field(default=False)
     kind: EventKind = field(default=EventKind.QUEUE)
+    policy: ExecutionPolicy = field(default=ExecutionPolicy.INLINE)
+    fail: bool = field(default=False)
 
     def is_ready(self, ctx: EventContext) -> bool:
         try:
@@ -22,4 +25,6 @@ class EqHandler(EventHandler):
         return self.persistent
 
     def handle(self, ctx: EventContext):
-        pass
+        if self.fail:
+            return HandlingError("Expected failure", self)
+        return None
@@ -4,9 +4,10 @@ from .eq_handler import EqHandler
 
 from matchmaker.tables import Round, Team
 from matchmaker.mm.context import QueueContext
-from matchmaker.event import EventMap, EventKind
-from matchmaker.event.events import QueueEvent
+from matchmaker.event import EventMap, EventKind, ExecutionPolicy
+from matchmaker.event.events import DequeueEvent, QueueEvent
 from matchmaker.event.error import HandlingError
+from matchmaker.event.stats import HandlerStats
 
 
 class EventMapTest(unittest.TestCase):
@@ -49,3 +50,76 @@ class EventMapTest(unittest.TestCase):
         qe = QueueEvent(self.qctx, Team(team_id=69))
         assert not isinstance(evmap.handle(qe), HandlingError)
         assert len(evmap[EventKind.QUEUE]) == 1
+
+    def test_thread_handle(self):
+        evmap = EventMap.new()
+        evmap.register(
+            EqHandler(
+                tag=1,
+                key="team",
+                expect=Team(team_id=69),
+                persistent=True,
+                policy=ExecutionPolicy.THREAD,
+                fail=True,
+            )
+        )
+        qe = QueueEvent(self.qctx, Team(team_id=69))
+        assert evmap.handle(qe) is None
+        with self.assertLogs("matchmaker.event.eventmap", "ERROR"):
+            joined = evmap.join()
+        assert isinstance(joined, HandlingError)
+        assert evmap.join() is None
+        assert len(evmap.pending) == 0
+        assert len(evmap[EventKind.QUEUE]) == 0
+
+    def test_thread_error_not_reported_later(self):
+        evmap = EventMap.new()
+        evmap.register(
+            EqHandler(
+                tag=1,
+                key="team",
+                expect=Team(team_id=69),
+                policy=ExecutionPolicy.THREAD,
+                fail=True,
+            )
+        )
+        assert evmap.handle(QueueEvent(self.qctx, Team(team_id=69))) is None
+        for _, future in evmap.pending:
+            future.exception()
+
+        assert evmap.handle(DequeueEvent(self.qctx, Team(team_id=1))) is None
+        assert isinstance(evmap.join(), HandlingError)
+
+    def test_process_handle(self):
+        evmap = EventMap.new()
+        evmap.register(
+            EqHandler(
+                tag=1,
+                key="team",
+                expect=Team(team_id=69),
+                persistent=True,
+                policy=ExecutionPolicy.PROCESS,
+            )
+        )
+        qe = QueueEvent(self.qctx, Team(team_id=69))
+        assert not isinstance(evmap.handle(qe), HandlingError)
+        assert not isinstance(evmap.join(), HandlingError)
+        assert len(evmap.pending) == 0
+        assert len(evmap[EventKind.QUEUE]) == 1
+
+    def test_stats(self):
+        evmap = EventMap.new()
+        evmap.stats = HandlerStats()
+        evmap.register(
+            EqHandler(tag=1, key="team", expect=Team(team_id=69), persistent=True)
+        )
+        evmap.register(EqHandler(tag=2, key="team", expect=Team(team_id=69), fail=True))
+        qe = QueueEvent(self.qctx, Team(team_id=69))
+        assert isinstance(evmap.handle(qe), HandlingError)
+        assert not isinstance(evmap.handle(qe), HandlingError)
+
+        stat = evmap.stats.snapshot()[(EventKind.QUEUE, "EqHandler")]
+        assert stat.calls == 3
+        assert stat.errors == 1
+        assert sum(stat.histogram) == 3
+        assert stat.percentile(50) <= stat.max_ns
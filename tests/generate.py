@@ -66,8 +66,8 @@ def generate(db):
             )
             assert db.insert(prev_round)
 
-        res1 = Result(result_id=i, team=team[0], points=7, delta=1.0)
-        res2 = Result(result_id=i + 1, team=team[1], points=6, delta=-1.0)
+        res1 = Result(result_id=2 * i - 1, team=team[0], points=7, delta=1.0)
+        res2 = Result(result_id=2 * i, team=team[1], points=6, delta=-1.0)
         assert db.insert(res1)
         assert db.insert(res2)
         assert db.insert(
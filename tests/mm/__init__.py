@@ -2,3 +2,4 @@ from .matchmaker import MatchMakerTest
 from .queuectx import QueueContextTest
 from .ingamectx import InGameContextTest
 from .games import GamesTest
+from .journal import JournalTest
@@ -58,3 +58,14 @@ class GamesTest(unittest.TestCase):
 
         assert g[m1][m1].team_one.points == 7
         assert g[m1][m1].team_two.points == 3
+
+    def test_player_index(self):
+        g = Games.new()
+        context = InGameContext(self.principal1, [self.m1])
+        assert not isinstance(g.push_game(context), Error)
+        assert g[self.p1] is context
+        assert g[self.t2] is context
+
+        g.pop(context.key)
+        assert g[self.p1] is None
+        assert len(g.players) == 0
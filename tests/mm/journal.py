@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+from matchmaker import MatchMaker, Config
+from matchmaker.mm.journal import Journal
+from matchmaker.tables import Player, Team, Round, Match, Result
+from matchmaker.event import EventKind
+from matchmaker.error import Error
+
+
+class JournalTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.teams = [
+            Team(
+                team_id=i,
+                name=f"Team_{i}",
+                player_one=Player(discord_id=2 * i - 1),
+                player_two=Player(discord_id=2 * i),
+                elo=1000,
+            )
+            for i in range(1, 6)
+        ]
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "mm.journal")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def matchmaker(self, **kwargs) -> MatchMaker:
+        return MatchMaker(
+            Config(trigger_threshold=2), Round(round_id=1), Journal(self.path, **kwargs)
+        )
+
+    def result(self, mm: MatchMaker, player: Player) -> Match:
+        match = mm.get_match_of_player(player)
+        return Match(
+            match_id=match.match_id,
+            team_one=Result(result_id=1, team=match.team_one.team, points=1),
+            team_two=Result(result_id=2, team=match.team_two.team, points=0),
+        )
+
+    def test_recover_queue(self):
+        mm = self.matchmaker()
+        assert not isinstance(mm.queue_team(self.teams[0]), Error)
+        assert not isinstance(mm.queue_team(self.teams[1]), Error)
+        assert not isinstance(mm.insert_result(self.result(mm, Player(1))), Error)
+        assert not isinstance(mm.queue_team(self.teams[2]), Error)
+        mm.close()
+
+        mm = self.matchmaker()
+        assert mm.get_queue() == [self.teams[2]]
+        assert len(mm.get_games()) == 0
+        assert len(mm.qctx.history) == 1
+        assert len(mm.evmap[EventKind.RESULT]) == 0
+        assert mm.qctx.round.round_id == 2
+        assert [(rnd.round_id, len(matches)) for rnd, matches in mm.ended] == [(1, 1)]
+        mm.close()
+
+    def test_recover_games(self):
+        mm = self.matchmaker()
+        for team in self.teams[:4]:
+            assert not isinstance(mm.queue_team(team), Error)
+        assert not isinstance(mm.insert_result(self.result(mm, Player(1))), Error)
+        mm.close()
+
+        mm = self.matchmaker()
+        assert len(mm.get_games()) == 1
+        assert len(mm.evmap[EventKind.RESULT]) == 1
+        assert mm.qctx.round.round_id == 3
+        assert mm.get_match_of_player(Player(1)) is None
+        assert not isinstance(mm.insert_result(self.result(mm, Player(5))), Error)
+        assert len(mm.get_games()) == 0
+        mm.close()
+
+    def test_recover_complete_game(self):
+        mm = self.matchmaker()
+        for team in self.teams[:2]:
+            assert not isinstance(mm.queue_team(team), Error)
+        # crash after the last result is journaled, before the round ends
+        mm.journal.append(EventKind.RESULT, self.result(mm, Player(1)))
+        mm.journal.close()
+
+        mm = self.matchmaker()
+        assert len(mm.get_games()) == 0
+        assert len(mm.evmap[EventKind.RESULT]) == 0
+        assert mm.get_match_of_player(Player(1)) is None
+        assert not isinstance(mm.queue_team(self.teams[0]), Error)
+        assert [rnd.round_id for rnd, _ in mm.ended] == [1]
+        mm.close()
+
+    def test_snapshot(self):
+        mm = self.matchmaker(snapshot_every=1)
+        for team in self.teams[:3]:
+            assert not isinstance(mm.queue_team(team), Error)
+        mm.close()
+
+        journal = Journal(self.path)
+        _, records = journal.read()
+        journal.close()
+        assert len(records) <= 1
+
+        mm = self.matchmaker()
+        assert len(mm.get_games()) == 1
+        assert mm.get_queue() == [self.teams[2]]
+        mm.close()
+
+    def test_torn_record(self):
+        mm = self.matchmaker()
+        assert not isinstance(mm.queue_team(self.teams[0]), Error)
+        mm.close()
+
+        with open(self.path, "ab") as journal:
+            journal.write(b"\x01\xff\x00")
+
+        mm = self.matchmaker()
+        assert mm.get_queue() == [self.teams[0]]
+        mm.close()
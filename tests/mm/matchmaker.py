@@ -1,23 +1,193 @@
 import unittest
+from datetime import timedelta
 
+from matchmaker import MatchMaker, Config
+from matchmaker.tables import Player, Team, Round, Match, Result
+from matchmaker.event import EventKind, ExecutionPolicy
+from matchmaker.error import Error
 
-from matchmaker import MatchMaker, Database, Config
-from matchmaker.tables import Player, Team, Round
+from ..event.eq_handler import EqHandler
 
 
 class MatchMakerTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        cls.db = Database("tests/full_mockdb.sqlite3")
-        cls.mm = MatchMaker(Config(), cls.db, Round(round_id=1))
-
         cls.p1 = Player(discord_id=1, name="Player_1")
         cls.p2 = Player(discord_id=2, name="Player_2")
         cls.p3 = Player(discord_id=3, name="Player_3")
         cls.p4 = Player(discord_id=4, name="Player_4")
 
-        cls.t1 = Team(team_id=1, name="Team_1_2", player_one=cls.p1, player_two=cls.p2)
-        cls.t2 = Team(team_id=2, name="Team_3_4", player_one=cls.p3, player_two=cls.p4)
+        cls.t1 = Team(
+            team_id=1, name="Team_1_2", player_one=cls.p1, player_two=cls.p2, elo=1000
+        )
+        cls.t2 = Team(
+            team_id=2, name="Team_3_4", player_one=cls.p3, player_two=cls.p4, elo=1000
+        )
 
         cls.t3 = Team(team_id=3, name="Team_1_3", player_one=cls.p1, player_two=cls.p3)
         cls.t4 = Team(team_id=4, name="Team_2_4", player_one=cls.p2, player_two=cls.p4)
+
+        cls.t5 = Team(
+            team_id=5,
+            name="Team_5_6",
+            player_one=Player(discord_id=5),
+            player_two=Player(discord_id=6),
+            elo=1000,
+        )
+        cls.t6 = Team(
+            team_id=6,
+            name="Team_7_8",
+            player_one=Player(discord_id=7),
+            player_two=Player(discord_id=8),
+            elo=1000,
+        )
+
+    def test_coalesce_queue(self):
+        mm = MatchMaker(
+            Config(trigger_threshold=4, coalesce_window=60), Round(round_id=1)
+        )
+        mm.register_handler(EqHandler(tag=1, key="teams", expect=[self.t1, self.t2]))
+
+        assert not isinstance(mm.queue_team(self.t1), Error)
+        assert not isinstance(mm.queue_team(self.t2), Error)
+        assert len(mm.evmap[EventKind.QUEUE]) == 2
+        assert mm.has_queued_team(self.t1)
+
+        assert not isinstance(mm.flush(), Error)
+        assert len(mm.evmap[EventKind.QUEUE]) == 1
+        assert len(mm.queued) == 0
+        assert mm.flush_timer is None
+
+    def test_coalesce_cancel(self):
+        mm = MatchMaker(Config(coalesce_window=60), Round(round_id=1))
+        mm.register_handler(EqHandler(tag=1, key="team", expect=self.t1))
+        mm.register_handler(
+            EqHandler(tag=2, key="team", expect=self.t1, kind=EventKind.DEQUEUE)
+        )
+
+        assert not isinstance(mm.queue_team(self.t1), Error)
+        assert not isinstance(mm.dequeue_team(self.t1), Error)
+        assert not isinstance(mm.flush(), Error)
+        assert len(mm.evmap[EventKind.QUEUE]) == 2
+        assert len(mm.evmap[EventKind.DEQUEUE]) == 1
+
+    def test_coalesce_mixed(self):
+        mm = MatchMaker(Config(coalesce_window=60), Round(round_id=1))
+        assert not isinstance(mm.queue_team(self.t1), Error)
+        assert not isinstance(mm.flush(), Error)
+
+        mm.register_handler(EqHandler(tag=1, key="team", expect=self.t2))
+        mm.register_handler(
+            EqHandler(tag=2, key="teams", expect=[self.t1], kind=EventKind.DEQUEUE)
+        )
+        assert not isinstance(mm.queue_team(self.t2), Error)
+        assert not isinstance(mm.dequeue_team(self.t1), Error)
+        assert not isinstance(mm.flush(), Error)
+        assert len(mm.evmap[EventKind.QUEUE]) == 1
+        assert len(mm.evmap[EventKind.DEQUEUE]) == 0
+
+    def test_coalesce_threshold(self):
+        mm = MatchMaker(
+            Config(trigger_threshold=2, coalesce_window=60), Round(round_id=1)
+        )
+        assert not isinstance(mm.queue_team(self.t1), Error)
+        assert len(mm.get_games()) == 0
+        assert not isinstance(mm.queue_team(self.t2), Error)
+
+        assert len(mm.get_games()) == 1
+        assert mm.qctx.is_empty()
+        assert mm.qctx.round.round_id == 2
+        assert mm.flush_timer is None
+
+    def test_thread_handler_error(self):
+        mm = MatchMaker(Config(trigger_threshold=2), Round(round_id=1))
+        failing = EqHandler(
+            tag=1,
+            key="team",
+            persistent=True,
+            kind=EventKind.ROUND_START,
+            policy=ExecutionPolicy.THREAD,
+            fail=True,
+        )
+        mm.register_handler(failing)
+
+        assert not isinstance(mm.queue_team(self.t1), Error)
+        with self.assertLogs("matchmaker.event.eventmap", "ERROR") as logs:
+            # the round starts, the threaded handler error is not the queue's error
+            assert not isinstance(mm.queue_team(self.t2), Error)
+            assert isinstance(mm.join(), Error)
+        assert "ERROR:matchmaker.event.eventmap:EqHandler is deregistered" in logs.output
+        assert failing not in mm.evmap[EventKind.ROUND_START]
+        assert mm.join() is None
+        assert len(mm.get_games()) == 1
+
+    def test_handler_stats(self):
+        mm = MatchMaker(
+            Config(trigger_threshold=2, instrument_handlers=True), Round(round_id=1)
+        )
+        assert not isinstance(mm.queue_team(self.t1), Error)
+        assert not isinstance(mm.queue_team(self.t2), Error)
+
+        stats = mm.handler_stats()
+        assert stats[(EventKind.QUEUE, "MatchTriggerHandler")].calls == 1
+        assert stats[(EventKind.QUEUE, "MatchTriggerHandler")].errors == 0
+
+        mm.reset()
+        assert len(mm.handler_stats()) == 1
+        assert MatchMaker(Config(), Round(round_id=1)).handler_stats() == {}
+
+    def test_expire_discard(self):
+        mm = MatchMaker(
+            Config(trigger_threshold=2, round_timeout=60, sweep_interval=3600),
+            Round(round_id=1),
+        )
+        rnd = Round(round_id=1)
+        mm.register_handler(
+            EqHandler(tag=1, key="round", expect=rnd, kind=EventKind.ROUND_END)
+        )
+        mm.register_handler(
+            EqHandler(tag=2, key="round", expect=rnd, kind=EventKind.ROUND_EXPIRE)
+        )
+        assert not isinstance(mm.queue_team(self.t1), Error)
+        assert not isinstance(mm.queue_team(self.t2), Error)
+
+        start = mm.get_games()[self.p1].round.start_time
+        assert mm.expire_rounds(start + timedelta(seconds=30)) == []
+        assert len(mm.expire_rounds(start + timedelta(seconds=90))) == 1
+
+        assert len(mm.get_games()) == 0
+        assert len(mm.get_games().players) == 0
+        assert mm.get_match_of_player(self.p1) is None
+        assert len(mm.evmap[EventKind.RESULT]) == 0
+        assert len(mm.evmap[EventKind.ROUND_END]) == 1
+        assert len(mm.evmap[EventKind.ROUND_EXPIRE]) == 0
+        mm.close()
+
+    def test_expire_finalise(self):
+        mm = MatchMaker(
+            Config(trigger_threshold=4, round_timeout=60, sweep_interval=3600),
+            Round(round_id=1),
+        )
+        mm.register_handler(
+            EqHandler(
+                tag=1, key="round", expect=Round(round_id=1), kind=EventKind.ROUND_END
+            )
+        )
+        for team in (self.t1, self.t2, self.t5, self.t6):
+            assert not isinstance(mm.queue_team(team), Error)
+
+        match = mm.get_match_of_player(self.p1)
+        result = Match(
+            match_id=match.match_id,
+            team_one=Result(result_id=1, team=match.team_one.team, points=1),
+            team_two=Result(result_id=2, team=match.team_two.team, points=0),
+        )
+        assert not isinstance(mm.insert_result(result), Error)
+
+        context = mm.get_games()[self.p1]
+        expired = mm.expire_rounds(context.round.start_time + timedelta(seconds=90))
+        assert len(expired) == 1
+        assert len(context.matches) == 1
+        assert context.is_complete()
+        assert len(mm.evmap[EventKind.ROUND_END]) == 0
+        mm.close()
@@ -1,8 +1,19 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
 import unittest
+from datetime import datetime
 
-from .generate import no_teams, no_rounds
+from .generate import no_teams, no_rounds, no_results
+from .tempdb import TempDatabaseTest
 
-from matchmaker import Database
+from matchmaker import Database, DatabaseConfig, AsyncDatabase
+from matchmaker.db import MEMDB, TransactionError
+from matchmaker.archive import history as history_table
+from matchmaker.migrations import MIGRATIONS, REBUILD_HISTORY, migrate
+from matchmaker.querystats import QueryStats
 from matchmaker.template import *
 from matchmaker.tables import Player, Team, Result, Round, Match
 
@@ -48,10 +59,10 @@ class SelectQueries(unittest.TestCase):
             ],
             [
                 InnerJoin(
-                    Alias("player", "p1"), on=Eq("p1.discord_id ", "team.player_one")
+                    Alias("player", "p1"), on=Eq("p1.discord_id ", Column("team.player_one"))
                 ),
                 InnerJoin(
-                    Alias("player", "p2"), on=Eq("p2.discord_id ", "team.player_two")
+                    Alias("player", "p2"), on=Eq("p2.discord_id ", Column("team.player_two"))
                 ),
                 Where(
                     Or(
@@ -100,3 +111,714 @@ class SelectQueries(unittest.TestCase):
 
         round_id = self.empty_db.execute(query, "RegisterFetchTeamName").fetchone()[0]
         assert round_id is None
+
+
+class CompiledQueries(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = Database("tests/full_mockdb.sqlite3")
+
+    def test_placeholders(self):
+        query = ColumnQuery(
+            QueryKind.SELECT,
+            "team",
+            "*",
+            [
+                InnerJoin(
+                    Alias("player", "p1"), on=Eq("p1.discord_id", Column("team.player_one"))
+                ),
+                Where(And(Eq("name", "Mr.X"), Eq("player_one", 1))),
+            ],
+        )
+        sql, params = query.compile()
+        assert "p1.discord_id = team.player_one" in sql
+        assert "name = ?" in sql and "player_one = ?" in sql
+        assert params == ["Mr.X", 1]
+
+    def test_dotted_value(self):
+        assert Eq("name", "foo.bar").render([]) == "name = ?"
+        query = ColumnQuery(QueryKind.SELECT, "team", "*", Where(Eq("name", "foo.bar")))
+        assert query.compile()[1] == ["foo.bar"]
+        assert Eq("team.team_id", Column("result.team_id")).render([]) == (
+            "team.team_id = result.team_id"
+        )
+
+    def test_same_shape(self):
+        query1 = ColumnQuery.eq_row("player", "discord_id", 1, QueryKind.SELECT)
+        query2 = ColumnQuery.eq_row("player", "discord_id", 2, QueryKind.SELECT)
+        sql1, params1 = query1.compile()
+        sql2, params2 = query2.compile()
+        assert sql1 == sql2
+        assert params1 == [1] and params2 == [2]
+
+    def test_in(self):
+        query = ColumnQuery(QueryKind.SELECT, "team", "*", Where(In("team_id", [1, 2, 3])))
+        sql, params = query.compile()
+        assert "team_id IN (?,?,?)" in sql and params == [1, 2, 3]
+        assert In("name", ["a", "b"]).render() == "name IN ('a','b')"
+        assert query.shape([]) != ColumnQuery(
+            QueryKind.SELECT, "team", "*", Where(In("team_id", [1, 2]))
+        ).shape([])
+
+    def test_order_limit(self):
+        query = ColumnQuery(
+            QueryKind.SELECT,
+            "result",
+            ["team_id", Sum("delta")],
+            [
+                GroupBy(["team_id"]),
+                OrderBy([Desc(Sum("delta")), "team_id"]),
+                Limit(3),
+                Offset(1),
+            ],
+        )
+        sql, params = query.compile()
+        assert "GROUP BY team_id" in sql and "ORDER BY SUM(delta) DESC,team_id" in sql
+        assert "LIMIT ?" in sql and "OFFSET ?" in sql and params == [3, 1]
+        rows = self.db.read(query, "TopDeltas")
+        assert [team_id for team_id, _ in rows] == [2, 3, 4]
+
+    def test_leaderboard(self):
+        rows = self.db.read(Team.leaderboard(5), "Leaderboard")
+        assert [row[0] for row in rows] == [1, 2, 3, 4, 5]
+        rows = self.db.read(Team.leaderboard(2, offset=5), "Leaderboard")
+        assert [row[0] for row in rows] == [6, 7]
+        assert [row[-1] for row in rows] == [
+            compute_mock_delta(Team(team_id=i)) for i in (6, 7)
+        ]
+
+    def test_window(self):
+        running = Over(Sum("delta"), partition_by=["team_id"], order_by=["round_id"])
+        assert running.render() == (
+            "SUM(delta) OVER (PARTITION BY team_id ORDER BY round_id)"
+        )
+        query = ColumnQuery(
+            QueryKind.SELECT,
+            "rating_history",
+            ["round_id", "delta", running],
+            [Where(Eq("team_id", 3)), OrderBy(["round_id"])],
+        )
+        rows = self.db.read(query, "RunningRating")
+        total = 0
+        for _, delta, rating in rows:
+            total += delta
+            assert rating == total
+
+        ranks = ColumnQuery(
+            QueryKind.SELECT,
+            "team_rating",
+            [Over(RowNumber(), order_by=[Desc("delta_sum"), "team_id"]), "delta_sum"],
+            OrderBy([Desc("delta_sum"), "team_id"]),
+        )
+        rows = self.db.read(ranks, "Ranks")
+        assert [row[0] for row in rows] == list(range(1, no_teams() + 1))
+
+    def test_quoted_name(self):
+        self.db.last_err = None
+        assert not self.db.exists(Team(name="O'Neil's"))
+        assert self.db.last_err is None
+        assert "'O''Neil''s'" in Eq("name", "O'Neil's").render()
+
+    def test_shape_cache(self):
+        SHAPES.clear()
+        for i in range(1, 11):
+            self.db.exists(Player(discord_id=i))
+        assert len(SHAPES) == 1
+        assert SHAPES.misses == 1 and SHAPES.hits == 9
+        assert SHAPES.hit_ratio == 0.9
+
+    def test_compile_once(self):
+        query = Player(discord_id=1).as_insert_query()
+        SHAPES.clear()
+        assert query.compile() is query.compile()
+        assert SHAPES.misses == 1 and SHAPES.hits == 0
+
+    def test_shape_params_order(self):
+        query = ColumnQuery(
+            QueryKind.INSERT, "team", ["name", "player_one"], Values(("Mr. X", 1))
+        )
+        params = []
+        query.render(params)
+        sql, compiled = query.compile()
+        assert compiled == params == ["Mr. X", 1]
+        assert sql == query.render([])
+
+    def test_in_params_order(self):
+        operand = Or(Eq("team_id", 1), Eq("team_id", 2))
+        query = ColumnQuery(QueryKind.SELECT, "team", "team_id", Where(In(operand, [1])))
+        params = []
+        query.render(params)
+        sql, compiled = query.compile()
+        assert compiled == params == [1, 2, 1]
+        assert sql == query.render([])
+        rows = self.db.execute(query, "InParams").fetchall()
+        assert sorted(row[0] for row in rows) == [1, 2]
+
+    def test_shape_cache_eviction(self):
+        cache = ShapeCache(maxsize=2)
+        cache.put("a", "A")
+        cache.put("b", "B")
+        assert cache.get("a") == "A"
+        cache.put("c", "C")
+        assert cache.get("b") is None
+        assert cache.get("a") == "A" and cache.get("c") == "C"
+        assert cache.hits == 3 and cache.misses == 1
+
+
+class Transactions(TempDatabaseTest):
+    def setUp(self):
+        super().setUp()
+        self.db = Database(self.path)
+
+    def tearDown(self):
+        del self.db
+
+    def count(self, table: str) -> int:
+        query = ColumnQuery(QueryKind.SELECT, table, "COUNT(*)", [])
+        return self.db.execute(query, "Count").fetchone()[0]
+
+    def results(self):
+        team1, team2 = Team(team_id=1), Team(team_id=2)
+        return [
+            Result(team=team1, points=7, delta=1.0),
+            Result(team=team2, points=3, delta=-1.0),
+            Result(team=team1, points=5, delta=0.5),
+        ]
+
+    def test_insert_many(self):
+        with self.db.transaction():
+            ids = self.db.insert_many(self.results())
+        assert ids == list(range(no_results() + 1, no_results() + 4))
+
+        query = ColumnQuery.eq_row("result", "result_id", ids[1], QueryKind.SELECT)
+        query.headers = ["team_id", "points"]
+        assert self.db.execute(query, "LoadResult").fetchone() == (2, 3)
+
+    def test_rollback(self):
+        rnd = Round(round_id=no_rounds() + 10, start_time=datetime.now(), participants=4)
+        with self.assertRaises(TransactionError):
+            with self.db.transaction():
+                assert self.db.insert(rnd)
+                assert self.db.insert_many(self.results()) is not None
+                raise TransactionError("abort")
+        assert self.count("result") == no_results()
+        assert not self.db.exists(rnd)
+
+    def test_insert_all(self):
+        rnd = Round(round_id=no_rounds() + 10, start_time=datetime.now(), participants=4)
+        with self.db.transaction():
+            assert self.db.insert(rnd)
+            results = self.results()
+            for result, result_id in zip(results, self.db.insert_many(results)):
+                result.result_id = result_id
+            matches = [
+                Match(round=rnd, team_one=results[0], team_two=results[1]),
+                Match(round=rnd, team_one=results[2], team_two=results[1]),
+            ]
+            assert self.db.insert_all(matches)
+        assert self.db.exists(rnd)
+        query = ColumnQuery.eq_row("match", "round_id", rnd.round_id, QueryKind.SELECT)
+        query.headers = ["COUNT(*)"]
+        assert self.db.execute(query, "CountMatches").fetchone()[0] == 2
+
+
+class StorageProfile(TempDatabaseTest):
+    def committed(self, rnd: Round) -> bool:
+        reader = Database(self.path)
+        try:
+            return reader.exists(rnd)
+        finally:
+            reader.close()
+
+    def test_pragmas(self):
+        db = Database(self.path, config=DatabaseConfig(busy_timeout=1234))
+        assert db.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+        assert db.conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        db.close()
+
+    def test_invalid_profile(self):
+        with self.assertRaises(ValueError):
+            Database(self.path, config=DatabaseConfig(commit_policy="never"))
+
+    def test_commit_batch(self):
+        db = Database(self.path, config=DatabaseConfig())
+        rnd = Round(round_id=no_rounds() + 10, start_time=datetime.now(), participants=4)
+        assert db.insert(rnd)
+        assert self.committed(rnd)
+        db.close()
+
+    def test_commit_round(self):
+        db = Database(self.path, config=DatabaseConfig(commit_policy="round"))
+        rnd = Round(round_id=no_rounds() + 10, start_time=datetime.now(), participants=4)
+        assert db.insert(rnd)
+        assert not self.committed(rnd)
+        db.close()
+        assert self.committed(rnd)
+
+    def test_readers(self):
+        config = DatabaseConfig(commit_policy="round", readers=2)
+        db = Database(self.path, config=config)
+        assert db.reader_count == 2
+
+        query = ColumnQuery(QueryKind.SELECT, "turn", "COUNT(*)", [])
+        rnd = Round(round_id=no_rounds() + 10, start_time=datetime.now(), participants=4)
+        assert db.insert(rnd)
+        assert db.read(query, "CountRounds") == [(no_rounds(),)]
+        db.commit()
+        assert db.read(query, "CountRounds") == [(no_rounds() + 1,)]
+
+        insert = Round(round_id=no_rounds() + 11, start_time=datetime.now()).as_insert_query()
+        assert db.read(insert, "ReadOnlyInsert") is None
+        db.close()
+        assert db.reader_count == 0
+
+    def test_no_readers(self):
+        db = Database(self.path, config=DatabaseConfig(journal_mode="delete"))
+        assert db.reader_count == 0
+        query = ColumnQuery(QueryKind.SELECT, "turn", "COUNT(*)", [])
+        assert db.read(query, "CountRounds") == [(no_rounds(),)]
+        db.close()
+
+    def test_iter_rows(self):
+        db = Database(self.path, config=DatabaseConfig(readers=1))
+        query = ColumnQuery(QueryKind.SELECT, "result", "result_id", [])
+        batches = list(db.iter_batches(query, "StreamResults", batch=7))
+        assert all(len(rows) == 7 for rows in batches[:-1])
+        assert 0 < len(batches[-1]) <= 7
+        ids = [row[0] for row in db.iter_rows(query, "StreamResults", batch=7)]
+        assert sorted(ids) == list(range(1, no_results() + 1))
+
+        # the reader is given back when the iteration is left early
+        rows = db.iter_rows(query, "StreamResults", batch=7)
+        next(rows)
+        assert db.readers.empty()
+        rows.close()
+        assert db.readers.qsize() == 1
+        db.close()
+
+    def test_iter_rows_no_readers(self):
+        db = Database(self.path, config=DatabaseConfig(journal_mode="delete"))
+        query = ColumnQuery(QueryKind.SELECT, "result", "result_id", [])
+        assert len(list(db.iter_rows(query, "StreamResults", batch=5))) == no_results()
+        db.close()
+
+    def test_query_stats(self):
+        config = DatabaseConfig(instrument_queries=True, slow_query_ms=0)
+        db = Database(self.path, config=config)
+        with self.assertLogs("matchmaker.db", "WARNING") as logs:
+            for i in range(1, 11):
+                assert db.exists(Team(team_id=i), "TeamExists")
+            db.read(ColumnQuery(QueryKind.SELECT, "turn", "COUNT(*)", []), "Count")
+        assert "Slow TeamExists query" in logs.output[0]
+        assert "SEARCH team USING INTEGER PRIMARY KEY" in logs.output[0]
+
+        summary = db.query_summary()
+        assert summary["TeamExists"].calls == 10 and summary["TeamExists"].slow == 10
+        assert summary["Count"].calls == 1
+        stat = summary["TeamExists"]
+        assert 0 < stat.p50_ms <= stat.p95_ms <= stat.p99_ms <= stat.max_ms
+        db.close()
+
+    def test_query_window(self):
+        stats = QueryStats(window=4, slow_ms=1)
+        for elapsed in (10 ** 8, 1, 2, 3, 4):
+            stats.record("Query", elapsed)
+        stat = stats["Query"]
+        assert stat.calls == 5 and stat.slow == 1
+        assert stat.percentile(50) == 2 and stat.percentile(99) == 4
+        assert stat.max_ns == 10 ** 8
+
+    def test_commit_interval(self):
+        config = DatabaseConfig(commit_policy="interval", commit_interval=0.01)
+        db = Database(self.path, config=config)
+        rnd = Round(round_id=no_rounds() + 10, start_time=datetime.now(), participants=4)
+        assert db.insert(rnd)
+        deadline = time.monotonic() + 2
+        while not self.committed(rnd) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert self.committed(rnd)
+        db.close()
+
+
+class QueryPlans(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = Database("tests/full_mockdb.sqlite3")
+
+    def assert_searches(self, query: ColumnQuery, index: str):
+        plan = self.db.query_plan(query)
+        assert any(index in step for step in plan), plan
+        for table in ("result", "match"):
+            assert not any(step.startswith(f"SCAN {table}") for step in plan), plan
+
+    def test_migrated(self):
+        assert self.db.version == len(MIGRATIONS)
+        assert migrate(self.db.conn.connection) == len(MIGRATIONS)
+
+    def test_team_delta(self):
+        query = ColumnQuery(
+            QueryKind.SELECT, "team_details_with_delta", "*", Where(Eq("team_id", 3))
+        )
+        self.assert_searches(query, "SEARCH rating USING INTEGER PRIMARY KEY")
+        assert not any("result" in step for step in self.db.query_plan(query))
+        self.assert_searches(Result.elo_for_team(Team(team_id=3)), "result_team_delta")
+
+    def test_leaderboard(self):
+        plan = self.db.query_plan(Team.leaderboard(16))
+        assert "SCAN rating USING COVERING INDEX team_rating_delta" in plan, plan
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+
+    def test_match_round(self):
+        query = ColumnQuery.eq_row("match", "round_id", 3, QueryKind.SELECT)
+        self.assert_searches(query, "INDEX match_round")
+
+    def test_match_results(self):
+        for column, index in (
+            ("result_one", "match_result_one"),
+            ("result_two", "match_result_two"),
+        ):
+            query = ColumnQuery.eq_row("match", column, 3, QueryKind.SELECT)
+            self.assert_searches(query, f"INDEX {index}")
+
+    def test_team_players(self):
+        query = ColumnQuery(
+            QueryKind.EXISTS,
+            "team",
+            ["name"],
+            Where(
+                Or(
+                    And(Eq("player_one", 1), Eq("player_two", 2)),
+                    And(Eq("player_one", 2), Eq("player_two", 1)),
+                )
+            ),
+        )
+        self.assert_searches(query, "INDEX team_players")
+        query = ColumnQuery.eq_row("team", "player_two", 2, QueryKind.SELECT)
+        self.assert_searches(query, "INDEX team_player_two")
+
+
+class TeamRatings(TempDatabaseTest):
+    def setUp(self):
+        super().setUp()
+        self.db = Database(self.path)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_loaded_elo(self):
+        for i in (1, 7, no_teams()):
+            team = self.db.load(Team(team_id=i, elo=1000))
+            assert team.elo == 1000 + compute_mock_delta(team)
+        assert self.db.verify_ratings() == []
+
+    def test_result_triggers(self):
+        team = Team(team_id=3)
+        with self.db.transaction():
+            ids = self.db.insert_many([Result(team=team, points=7, delta=12.5)])
+        assert self.db.load(Team(team_id=3)).elo == compute_mock_delta(team) + 12.5
+
+        self.db.conn.execute("UPDATE result SET delta = 2.5 WHERE result_id = ?", ids)
+        assert self.db.load(Team(team_id=3)).elo == compute_mock_delta(team) + 2.5
+
+        self.db.conn.execute("DELETE FROM result WHERE result_id = ?", ids)
+        assert self.db.load(Team(team_id=3)).elo == compute_mock_delta(team)
+        assert self.db.verify_ratings() == []
+
+    def test_new_team(self):
+        team = Team(name="New", player_one=Player(1), player_two=Player(2))
+        assert self.db.insert(team)
+        loaded = self.db.load(Team(name="New", elo=1000))
+        assert loaded is not None and loaded.elo == 1000
+
+    def test_rebuild(self):
+        self.db.conn.execute("UPDATE team_rating SET delta_sum = 100 WHERE team_id = 2")
+        drifted = self.db.verify_ratings()
+        assert drifted == [(2, 100, compute_mock_delta(Team(team_id=2)))]
+        self.db.rebuild_ratings()
+        assert self.db.verify_ratings() == []
+
+
+    def history(self, team_id: int):
+        query = ColumnQuery(
+            QueryKind.SELECT,
+            "rating_history",
+            ["round_id", "rating", "delta"],
+            [Where(Eq("team_id", team_id)), OrderBy(["round_id"])],
+        )
+        return self.db.read(query, "RatingHistory")
+
+    def test_history_written(self):
+        rnd = Round(round_id=no_rounds() + 1, start_time=datetime.now(), participants=4)
+        t3, t4 = Team(team_id=3), Team(team_id=4)
+        results = [
+            Result(team=t3, points=7, delta=12.5),
+            Result(team=t4, points=3, delta=-12.5),
+        ]
+        with self.db.transaction():
+            assert self.db.insert(rnd)
+            for result, result_id in zip(results, self.db.insert_many(results)):
+                result.result_id = result_id
+            match = Match(round=rnd, team_one=results[0], team_two=results[1])
+            assert self.db.insert(match)
+
+        # the rating is the delta sum of the team once the round is written
+        last = rnd.round_id
+        assert self.history(3)[-1] == (last, compute_mock_delta(t3) + 12.5, 12.5)
+        assert self.history(4)[-1] == (last, compute_mock_delta(t4) - 12.5, -12.5)
+
+        # mock matches don't reference the results of their teams, only the
+        # deltas replayed from the matches are compared
+        written = [self.history(i) for i in range(1, no_teams() + 1)]
+        self.db.rebuild_history()
+        rebuilt = [self.history(i) for i in range(1, no_teams() + 1)]
+        deltas = lambda history: [(round_id, delta) for round_id, _, delta in history]
+        assert list(map(deltas, rebuilt)) == list(map(deltas, written))
+
+    def test_history_plan(self):
+        query = ColumnQuery(
+            QueryKind.SELECT,
+            "rating_history",
+            ["round_id", "delta"],
+            [Where(Eq("team_id", 3)), OrderBy(["round_id"])],
+        )
+        plan = self.db.query_plan(query)
+        assert plan == ["SEARCH rating_history USING PRIMARY KEY (team_id=?)"], plan
+
+class Archival(TempDatabaseTest):
+    def setUp(self):
+        super().setUp()
+        archive = self.temp_path("archive.sqlite3")
+        self.db = Database(self.path, config=DatabaseConfig(archive_path=archive))
+
+    def tearDown(self):
+        self.db.close()
+
+    def count(self, table: str) -> int:
+        query = ColumnQuery(QueryKind.SELECT, table, "COUNT(*)", [])
+        return self.db.read(query, "Count")[0][0]
+
+    def test_no_archive(self):
+        db = Database(self.path)
+        assert not db.archived
+        with self.assertLogs("matchmaker.db", "WARNING"):
+            assert db.archive_rounds(datetime.now()) == 0
+        assert db.read(ColumnQuery(QueryKind.SELECT, "all_turn", "COUNT(*)", []), "Count")
+        db.close()
+
+    def test_archive_rounds(self):
+        elos = [self.db.load(Team(team_id=i, elo=1000)).elo for i in (1, 2, 3)]
+        history = self.db.read(
+            ColumnQuery(QueryKind.SELECT, "rating_history", "*", []), "History"
+        )
+        end = self.db.conn.execute(
+            "SELECT end_time FROM turn WHERE round_id = 11"
+        ).fetchone()[0]
+
+        assert self.db.archive_rounds(datetime.fromisoformat(end)) == 10
+        assert self.count(history_table("turn")) == no_rounds() - 10
+        assert self.count(history_table("turn", full=True)) == no_rounds()
+        assert self.count(history_table("match", full=True)) == no_results() // 2
+        assert self.count("archive.match") == 10 * no_results() // 2 // no_rounds()
+        # stats only read the archived rating history when asked for the full history
+        recent = self.count(history_table("rating_history"))
+        assert 0 < recent < len(history)
+        assert self.count(history_table("rating_history", full=True)) == len(history)
+
+        # ratings are kept by the checkpoints
+        assert self.db.verify_ratings() == []
+        assert [self.db.load(Team(team_id=i, elo=1000)).elo for i in (1, 2, 3)] == elos
+        self.db.rebuild_ratings()
+        assert [self.db.load(Team(team_id=i, elo=1000)).elo for i in (1, 2, 3)] == elos
+
+        # the full history is replayed from both databases
+        self.db.rebuild_history()
+        rebuilt = self.db.read(
+            ColumnQuery(QueryKind.SELECT, history_table("rating_history", True), "*", []),
+            "History",
+        )
+        deltas = lambda rows: sorted((row[0], row[1], row[3]) for row in rows)
+        assert deltas(rebuilt) == deltas(history)
+        assert self.count("rating_history") == recent
+
+        # archived rounds are not archived twice
+        assert self.db.archive_rounds(datetime.fromisoformat(end)) == 0
+        assert self.count("archive.turn") == 10
+
+    def test_archive_schema(self):
+        columns = self.db.conn.execute("PRAGMA archive.table_info(result)").fetchall()
+        assert [column[1] for column in columns if column[5] != 0] == ["result_id"]
+        indexes = self.db.conn.execute("PRAGMA archive.index_list(match)").fetchall()
+        assert {"match_round", "match_result_one", "match_result_two"} <= {
+            index[1] for index in indexes
+        }
+
+        plan = self.db.conn.execute(f"EXPLAIN QUERY PLAN {REBUILD_HISTORY[1]}")
+        steps = [row[3] for row in plan.fetchall()]
+        assert not any(step.startswith("SCAN result") for step in steps)
+        assert not any(step.startswith("MATERIALIZE") for step in steps)
+
+    def test_unkeyed_archive(self):
+        self.db.close()
+        archive = self.temp_path("unkeyed.sqlite3")
+        conn = sqlite3.connect(archive)
+        conn.execute("CREATE TABLE result AS SELECT 1 AS result_id, 2, 3, 4.0")
+        conn.commit()
+        conn.close()
+
+        self.db = Database(self.path, config=DatabaseConfig(archive_path=archive))
+        columns = self.db.conn.execute("PRAGMA archive.table_info(result)").fetchall()
+        assert [column[1] for column in columns if column[5] != 0] == ["result_id"]
+        assert self.count("archive.result") == 1
+
+
+class Snapshots(TempDatabaseTest):
+    def setUp(self):
+        super().setUp()
+        self.config = DatabaseConfig(in_memory=True, snapshot_interval=0)
+
+    def on_disk(self, rnd: Round) -> bool:
+        reader = Database(self.path)
+        try:
+            return reader.exists(rnd)
+        finally:
+            reader.close()
+
+    def test_restore(self):
+        db = Database(self.path, config=self.config)
+        assert db.in_memory and db.reader_count == 0
+        assert db.exists(Round(round_id=no_rounds()))
+        assert db.verify_ratings() == []
+        db.close()
+
+    def test_snapshot(self):
+        db = Database(self.path, config=self.config)
+        rnd = Round(round_id=no_rounds() + 1, start_time=datetime.now())
+        assert db.insert(rnd)
+        assert not self.on_disk(rnd)
+        assert db.snapshot()
+        assert self.on_disk(rnd)
+
+        other = Round(round_id=no_rounds() + 2, start_time=datetime.now())
+        assert db.insert(other)
+        db.close()
+        assert self.on_disk(other)
+
+        plain = Database(self.path)
+        assert not plain.snapshot()
+        plain.close()
+
+    def test_snapshot_during_writes(self):
+        db = Database(self.path, config=self.config)
+        stop, written = threading.Event(), []
+
+        def write():
+            round_id = no_rounds()
+            while not stop.is_set():
+                round_id += 1
+                assert db.insert(Round(round_id=round_id, start_time=datetime.now()))
+                written.append(round_id)
+                time.sleep(0.001)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        while len(written) == 0:
+            time.sleep(0.001)
+        before = len(written)
+        assert db.snapshot(pages=1)
+        during = len(written) - before
+        stop.set()
+        writer.join()
+
+        # writes went on during the copy and the snapshot holds a prefix of them
+        assert during > 0
+        conn = sqlite3.connect(self.path)
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        rounds = conn.execute(
+            "SELECT round_id FROM turn WHERE round_id > ? ORDER BY round_id",
+            (no_rounds(),),
+        ).fetchall()
+        conn.close()
+        assert [row[0] for row in rounds] == written[: len(rounds)]
+        assert len(rounds) >= before
+        db.close()
+
+    def test_periodic_snapshot(self):
+        self.config.snapshot_interval = 0.01
+        db = Database(self.path, config=self.config)
+        rnd = Round(round_id=no_rounds() + 1, start_time=datetime.now())
+        with db.transaction():
+            assert db.insert(rnd)
+        deadline = time.monotonic() + 2.0
+        while not self.on_disk(rnd) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert self.on_disk(rnd)
+        db.close()
+
+    def test_private_memdb(self):
+        db = Database(self.path, config=self.config)
+        other = sqlite3.connect(MEMDB, uri=True)
+        assert other.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+        other.close()
+        db.close()
+
+    def test_new_file(self):
+        path = self.temp_path("new.sqlite3")
+        db = Database(path, config=self.config)
+        assert not os.path.exists(path)
+        db.close()
+        assert os.path.exists(path)
+
+    def test_invalid_interval(self):
+        with self.assertRaises(ValueError):
+            DatabaseConfig(snapshot_interval=-1).validate()
+
+
+class AsyncQueries(TempDatabaseTest):
+    def setUp(self):
+        super().setUp()
+        self.db = Database(self.path)
+        self.adb = AsyncDatabase(self.db)
+
+    def tearDown(self):
+        self.adb.close()
+        self.db.close()
+
+    def test_load(self):
+        async def load():
+            exists = await self.adb.exists(Team(name="Team_1_2"))
+            team = await self.adb.load(Team(name="Team_1_2", elo=1000))
+            return exists, team
+
+        exists, team = asyncio.run(load())
+        assert exists and team.elo == 1000 + compute_mock_delta(team)
+
+    def test_execute(self):
+        query = ColumnQuery(QueryKind.SELECT, "result", "COUNT(*)", [])
+        rows = asyncio.run(self.adb.execute(query, "CountResults"))
+        assert rows == [(no_results(),)]
+        assert asyncio.run(self.adb.fetchone(query, "CountResults")) == (no_results(),)
+
+    def test_write_order(self):
+        team = Team(team_id=1)
+
+        async def write():
+            inserts = [
+                self.adb.insert_many([Result(team=team, points=i, delta=i)])
+                for i in range(20)
+            ]
+            return await asyncio.gather(*inserts)
+
+        ids = [inserted[0] for inserted in asyncio.run(write())]
+        assert ids == list(range(no_results() + 1, no_results() + 21))
+        query = ColumnQuery.eq_row("result", "result_id", ids[-1], QueryKind.SELECT)
+        query.headers = ["points"]
+        assert self.db.execute(query, "LastPoints").fetchone()[0] == 19
+
+    def test_iter_rows(self):
+        query = ColumnQuery(QueryKind.SELECT, "team", "team_id", [])
+
+        async def stream():
+            return [row[0] async for row in self.adb.iter_rows(query, "Teams", batch=3)]
+
+        assert sorted(asyncio.run(stream())) == list(range(1, no_teams() + 1))
@@ -0,0 +1,138 @@
+import random
+import unittest
+
+from matchmaker import Config, Database
+from matchmaker.ranking import Ranking
+from matchmaker.tables import Player, Team, Round, Match, Result
+from matchmaker.mm.context import InGameContext
+from matchmaker.mm.principal import get_principal
+from matchmaker.event import EventMap
+from matchmaker.event.events import RoundEndEvent
+from matchmaker.event.handlers import RankingHandler
+
+from .generate import no_teams
+
+
+def new_team(team_id: int, elo: float) -> Team:
+    return Team(
+        team_id=team_id,
+        name=f"Team_{team_id}",
+        player_one=Player(discord_id=2 * team_id),
+        player_two=Player(discord_id=2 * team_id + 1),
+        elo=elo,
+    )
+
+
+def expected_order(elos):
+    return [tid for tid, _ in sorted(elos.items(), key=lambda x: (-x[1], x[0]))]
+
+
+class RankingTest(unittest.TestCase):
+    def test_rank_and_select(self):
+        ranking = Ranking()
+        for team_id, elo in ((1, 1000), (2, 1100), (3, 900), (4, 1100)):
+            ranking.put(new_team(team_id, elo))
+        assert len(ranking) == 4
+        assert [ranking.rank(i) for i in (1, 2, 3, 4)] == [3, 1, 4, 2]
+        assert ranking.select(1).team_id == 2 and ranking.select(4).team_id == 3
+        assert ranking.select(5) is None and ranking.rank(5) is None
+
+    def test_add_delta(self):
+        ranking = Ranking()
+        for team_id, elo in ((1, 1000), (2, 1010), (3, 1020)):
+            ranking.put(new_team(team_id, elo))
+        assert ranking.add_delta(1, 30)
+        assert [team.team_id for team in ranking.top(3)] == [1, 3, 2]
+        assert ranking.get(1).elo == 1030
+        assert not ranking.add_delta(4, 10)
+
+    def test_copies(self):
+        ranking = Ranking()
+        team = new_team(1, 1000)
+        ranking.put(team)
+        team.elo = 0
+        ranking.get(1).elo = 0
+        assert ranking.get(1).elo == 1000
+
+    def test_random_updates(self):
+        rng = random.Random(42)
+        ranking = Ranking()
+        elos = {}
+        for team_id in range(1, 201):
+            elos[team_id] = float(rng.randint(900, 1100))
+            ranking.put(new_team(team_id, elos[team_id]))
+        for _ in range(500):
+            team_id = rng.randint(1, 200)
+            delta = float(rng.randint(-20, 20))
+            elos[team_id] += delta
+            assert ranking.add_delta(team_id, delta)
+        for team_id in rng.sample(range(1, 201), 20):
+            del elos[team_id]
+            assert ranking.remove(team_id).team_id == team_id
+
+        order = expected_order(elos)
+        assert len(ranking) == len(order)
+        assert [ranking.rank(team_id) for team_id in order] == list(range(1, 181))
+        page = ranking.page(3, size=16)
+        assert [rank for rank, _ in page] == list(range(33, 49))
+        assert [team.team_id for _, team in page] == order[32:48]
+        assert [team.team_id for _, team in ranking.page(12, size=16)] == order[176:]
+        assert ranking.page(13, size=16) == []
+
+    def test_load(self):
+        db = Database("tests/full_mockdb.sqlite3")
+        ranking = Ranking()
+        ranking.load(db, 1000, batch=4)
+        assert len(ranking) == no_teams()
+        teams = ranking.top(no_teams())
+        assert [team.elo for team in teams] == sorted(
+            (team.elo for team in teams), reverse=True
+        )
+        loaded = db.load(Team(team_id=teams[2].team_id, elo=1000))
+        assert teams[2].elo == loaded.elo and teams[2].name == loaded.name
+        db.close()
+
+    def test_drift(self):
+        db = Database("tests/full_mockdb.sqlite3")
+        ranking = Ranking()
+        ranking.load(db, 1000)
+        assert ranking.drift(db, 1000) == []
+
+        last = ranking.select(no_teams())
+        assert ranking.add_delta(last.team_id, 1000)
+        drifted = ranking.drift(db, 1000)
+        assert (last.team_id, no_teams(), 1) in drifted
+        assert len(drifted) == no_teams()
+        db.close()
+
+    def test_pending(self):
+        db = Database("tests/full_mockdb.sqlite3")
+        ranking = Ranking()
+        stored = db.load(Team(team_id=1, elo=1000))
+        pending = {1: 1000.0}
+        ranking.load(db, 1000, pending=pending)
+        assert ranking.rank(1) == 1 and ranking.get(1).elo == stored.elo + 1000
+        assert ranking.drift(db, 1000, pending=pending) == []
+        drifted = ranking.drift(db, 1000)
+        assert [ranked for team_id, _, ranked in drifted if team_id == 1] == [1]
+        db.close()
+
+    def test_round_end(self):
+        ranking = Ranking()
+        rnd = Round(round_id=1)
+        t1, t2, t3 = new_team(1, 1000), new_team(2, 1010), new_team(3, 1020)
+        for team in (t1, t2):
+            ranking.put(team)
+
+        match = Match(
+            match_id=1,
+            round=rnd,
+            team_one=Result(result_id=1, team=t1, delta=25),
+            team_two=Result(result_id=2, team=t3, delta=-25),
+        )
+        context = InGameContext(get_principal(rnd, Config()), [match])
+        evmap = EventMap.new()
+        evmap.register(RankingHandler(ranking))
+        assert evmap.handle(RoundEndEvent(context, rnd)) is None
+        assert [team.team_id for team in ranking.top(3)] == [1, 2, 3]
+        assert ranking.get(1).elo == 1025 and ranking.get(3).elo == 995
@@ -0,0 +1,122 @@
+import unittest
+from datetime import datetime
+
+from .tempdb import TempDatabaseTest
+
+from matchmaker import Database
+from matchmaker.db import TransactionError
+from matchmaker.memory import MemoryStorage
+from matchmaker.operations import Storage
+from matchmaker.tables import Match, Player, Result, Round, Team
+from matchmaker.template import Column, Eq
+from matchmaker.writer import RoundRecord, RoundWriter
+
+
+def new_team(name: str, one: int, two: int) -> Team:
+    return Team(name=name, player_one=Player(one), player_two=Player(two))
+
+
+class StorageContract:
+    """ checks shared by every storage backend """
+
+    db: Storage
+
+    def add_teams(self):
+        players = [Player(i, f"player {i}") for i in range(1, 5)]
+        assert self.db.insert_many(players) == [1, 2, 3, 4]
+        ids = self.db.insert_many([new_team("A", 1, 2), new_team("B", 3, 4)])
+        assert ids is not None and len(ids) == 2
+        assert ids[1] == ids[0] + 1
+        return ids
+
+    def test_insert_load(self):
+        one, two = self.add_teams()
+        assert self.db.exists(Player(1))
+        assert not self.db.exists(Player(5))
+        assert self.db.exists(Team(name="B"))
+
+        team = self.db.load(Team(name="A", elo=1000))
+        assert team.team_id == one and team.elo == 1000
+        assert team.player_two.discord_id == 2
+
+        teams = [Team(team_id=one), Team(team_id=two), Team(team_id=9)]
+        loaded = self.db.load_many(teams)
+        assert sorted(loaded) == [one, two]
+        assert loaded[two].name == "B"
+
+    def test_duplicate_name(self):
+        self.add_teams()
+        assert not self.db.insert(new_team("A", 1, 3))
+        assert self.db.insert_many([new_team("C", 1, 3), new_team("A", 2, 4)]) is None
+        assert not self.db.exists(Team(name="C"))
+
+    def test_rollback(self):
+        self.add_teams()
+        with self.assertRaises(TransactionError):
+            with self.db.transaction():
+                assert self.db.insert(new_team("C", 1, 3))
+                raise TransactionError("abort")
+        assert not self.db.exists(Team(name="C"))
+        assert self.db.insert(new_team("C", 1, 3))
+
+    def test_round_writer(self):
+        one, two = self.add_teams()
+        rnd = Round(round_id=1, start_time=datetime.now(), participants=4)
+        match = Match(
+            round=rnd,
+            team_one=Result(team=Team(team_id=one), points=1, delta=8.0),
+            team_two=Result(team=Team(team_id=two), points=0, delta=-8.0),
+        )
+        writer = RoundWriter(self.db, retry_delay=0.001)
+        try:
+            assert writer.submit(RoundRecord.of(rnd, [match]))
+            writer.flush()
+        finally:
+            writer.close()
+
+        assert self.db.exists(Round(round_id=1))
+        assert self.db.load(Team(team_id=one, elo=1000)).elo == 1008
+        assert self.db.load(Team(team_id=two, elo=1000)).elo == 992
+
+
+class SQLiteStorageTest(StorageContract, TempDatabaseTest):
+    mockdb = "tests/empty_mockdb.sqlite3"
+
+    def setUp(self):
+        super().setUp()
+        self.db = Database(self.path)
+
+    def tearDown(self):
+        self.db.close()
+
+
+class MemoryStorageTest(StorageContract, unittest.TestCase):
+    def setUp(self):
+        self.db = MemoryStorage()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_unsupported_conditions(self):
+        self.add_teams()
+        team = Team(team_id=1)
+        team.match_conditions = lambda: Eq("team_id", Column("team.team_id"))
+        with self.assertLogs("matchmaker.memory", "ERROR"):
+            assert not self.db.exists(team)
+            assert self.db.load(team) is None
+        assert not self.db.exists(Result(result_id=1))
+        assert self.db.load_many([Round(round_id=1)]) == {}
+
+    def test_rollback_team(self):
+        self.add_teams()
+        with self.assertRaises(TransactionError):
+            with self.db.transaction():
+                assert self.db.insert(new_team("C", 1, 3))
+                raise TransactionError("abort")
+        assert sorted(self.db.deltas) == sorted(self.db.teams)
+
+    def test_loaded_copies(self):
+        self.add_teams()
+        team = self.db.load(Team(name="A"))
+        team.player_one.name = "changed"
+        assert self.db.load(Player(1)).name == "player 1"
@@ -2,6 +2,7 @@ import unittest
 
 from .generate import PLAYERS, no_teams, no_rounds, no_matches, no_results
 
+from matchmaker import Database
 from matchmaker.tables import Player, Team, Result, Match, Round
 
 
@@ -32,6 +33,11 @@ class PlayerTest(unittest.TestCase):
             assert player.discord_id == i
             assert player.name == f"Player_{i}"
 
+    def test_load_many_players(self):
+        players = self.db.load_many([Player(discord_id=i) for i in range(PLAYERS + 2)])
+        assert sorted(players) == list(range(1, PLAYERS + 1))
+        assert players[3].name == "Player_3"
+
 
 class TeamTest(unittest.TestCase):
     @classmethod
@@ -59,6 +65,14 @@ class TeamTest(unittest.TestCase):
             assert team is not None
             assert team.team_id == i
 
+    def test_load_many_teams(self):
+        teams = self.db.load_many([Team(team_id=i, elo=1000) for i in range(1, 11)])
+        assert len(teams) == 10
+        for i, team in teams.items():
+            assert team.team_id == i
+            assert team == self.db.load(Team(team_id=i))
+            assert team.elo == self.db.load(Team(team_id=i, elo=1000)).elo
+
 
 class MatchTest(unittest.TestCase):
     @classmethod
@@ -86,6 +100,16 @@ class MatchTest(unittest.TestCase):
             assert match is not None
             assert match.match_id == i
 
+    def test_load_many_matches(self):
+        ids = range(1, no_matches() + 1)
+        matches = self.db.load_many([Match(match_id=i) for i in ids])
+        assert len(matches) == no_matches()
+        match = matches[7]
+        loaded = self.db.load(Match(match_id=7))
+        assert match.round.round_id == loaded.round.round_id
+        assert match.team_one.result_id == loaded.team_one.result_id
+        assert match.team_two.team.name == loaded.team_two.team.name
+
 
 class ResultTest(unittest.TestCase):
     @classmethod
@@ -113,6 +137,15 @@ class ResultTest(unittest.TestCase):
             assert result is not None
             assert result.result_id == i
 
+    def test_load_result_fields(self):
+        result = self.db.load(Result(result_id=2))
+        assert result.points == 6 and result.delta == -1.0
+        assert result.team.player_one.name.startswith("Player_")
+
+    def test_load_many_results(self):
+        results = self.db.load_many([Result(result_id=i) for i in (1, 2, 3)])
+        assert [results[i].points for i in (1, 2, 3)] == [7, 6, 7]
+
 
 class RoundTest(unittest.TestCase):
     @classmethod
@@ -139,3 +172,8 @@ class RoundTest(unittest.TestCase):
             round = self.db.load(Round(round_id=i))
             assert round is not None
             assert round.round_id == i
+
+    def test_load_many_rounds(self):
+        ids = range(1, no_rounds() + 1)
+        rounds = self.db.load_many([Round(round_id=i) for i in ids])
+        assert sorted(rounds) == list(range(1, no_rounds() + 1))
@@ -0,0 +1,25 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TempDatabaseTest(unittest.TestCase):
+    """Test case working on a private copy of a mock database
+    - mockdb: mock database copied to `path` before each test
+
+    The temporary directory is removed after `tearDown`, so subclasses only close
+    what they opened on top of it.
+    """
+
+    mockdb = "tests/full_mockdb.sqlite3"
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = self.temp_path("mockdb.sqlite3")
+        shutil.copy(self.mockdb, self.path)
+
+    def temp_path(self, name: str) -> str:
+        """ path of a file named `name` in the temporary directory """
+        return os.path.join(self.tmpdir, name)
@@ -0,0 +1,183 @@
+import os
+import shutil
+import threading
+from datetime import datetime
+
+from .generate import no_rounds, no_results
+from .tempdb import TempDatabaseTest
+
+from matchmaker import Database, MemoryStorage
+from matchmaker.db import TransactionError
+from matchmaker.tables import Player, Team, Round, Match, Result
+from matchmaker.template import ColumnQuery, QueryKind
+from matchmaker.writer import RoundRecord, RoundWriter, read_spill
+
+
+def new_round(round_id: int, delta: float = 10.0) -> RoundRecord:
+    rnd = Round(round_id=round_id, start_time=datetime.now(), participants=4)
+    matches = [
+        Match(
+            round=rnd,
+            team_one=Result(team=Team(team_id=1), points=1, delta=delta),
+            team_two=Result(team=Team(team_id=2), points=0, delta=-delta),
+        ),
+        Match(
+            round=rnd,
+            team_one=Result(team=Team(team_id=3), points=1, delta=delta),
+            team_two=Result(team=Team(team_id=1), points=0, delta=-delta / 2),
+        ),
+    ]
+    return RoundRecord.of(rnd, matches)
+
+
+class FlakyStorage(MemoryStorage):
+    """ in-memory storage whose first transactions fail """
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        for team_id in (1, 2, 3):
+            players = Player(2 * team_id), Player(2 * team_id + 1)
+            assert self.insert(Team(None, str(team_id), *players))
+
+    def transaction(self):
+        if self.failures > 0:
+            self.failures -= 1
+            raise TransactionError("flaky")
+        return super().transaction()
+
+
+class RoundWriterTest(TempDatabaseTest):
+    def setUp(self):
+        super().setUp()
+        self.db = Database(self.path)
+        self.written = []
+        self.writer = RoundWriter(
+            self.db, retry_delay=0.001, on_written=self.written.append
+        )
+
+    def tearDown(self):
+        self.writer.close()
+        self.db.close()
+
+    def count(self, table: str) -> int:
+        query = ColumnQuery(QueryKind.SELECT, table, "COUNT(*)", [])
+        return self.db.execute(query, "Count").fetchone()[0]
+
+    def test_write(self):
+        records = [new_round(no_rounds() + i) for i in range(1, 4)]
+        for record in records:
+            assert self.writer.submit(record)
+        self.writer.flush()
+
+        assert self.count("result") == no_results() + 12
+        assert self.count("match") == no_results() // 2 + 6
+        assert self.written == records
+        assert self.writer.pending_deltas() == {}
+        assert self.db.verify_ratings() == []
+
+    def test_pending(self):
+        record = new_round(no_rounds() + 1)
+        with self.db.lock:
+            assert self.writer.submit(record)
+            assert self.writer.pending_deltas() == {1: 5.0, 2: -10.0, 3: 10.0}
+        self.writer.flush()
+        assert self.writer.pending_deltas() == {}
+
+    def test_immutable_record(self):
+        rnd = Round(round_id=no_rounds() + 1, start_time=datetime.now(), participants=4)
+        result = Result(team=Team(team_id=1), points=1, delta=3.0)
+        match = Match(round=rnd, team_one=result, team_two=result)
+        record = RoundRecord.of(rnd, [match])
+        result.delta = 100.0
+        assert record.deltas() == {1: 6.0}
+
+    def test_failed_round(self):
+        duplicate = new_round(1)
+        valid = new_round(no_rounds() + 1)
+        with self.db.lock:
+            assert self.writer.submit(duplicate)
+            assert self.writer.submit(valid)
+        self.writer.flush()
+
+        assert self.writer.failed == [duplicate]
+        assert self.written == [valid]
+        assert self.count("result") == no_results() + 4
+        # the failed round is not written yet
+        assert self.writer.pending_deltas() == duplicate.deltas()
+
+        spill = self.temp_path("failed")
+        self.writer.spill_path = spill
+        self.writer.close()
+        assert read_spill(spill) == [duplicate]
+        assert self.writer.pending_deltas() == {}
+
+    def test_recover(self):
+        spill = self.temp_path("crashed")
+        record = new_round(no_rounds() + 1)
+        crashed = RoundWriter(
+            FlakyStorage(10 ** 6), retry_delay=0.001, spill_path=self.temp_path("failed")
+        )
+        assert crashed.submit(record)
+        # the round is persisted before it is acknowledged, a crash leaves it there
+        shutil.copy(self.temp_path("failed"), spill)
+        crashed.close()
+        assert read_spill(spill) == [record]
+
+        writer = RoundWriter(self.db, spill_path=spill)
+        assert writer.recover([record, new_round(1)]) == 1
+        assert writer.pending_deltas() == record.deltas()
+        writer.flush()
+        assert self.db.exists(Round(round_id=no_rounds() + 1))
+        assert writer.unwritten_ids() == [] and not os.path.exists(spill)
+        assert writer.recover([record]) == 0
+        writer.close()
+
+    def test_retry(self):
+        db = FlakyStorage(self.writer.retries)
+        written = []
+        writer = RoundWriter(db, retry_delay=0.05, on_written=written.append)
+        record = new_round(1)
+        assert writer.submit(record)
+        writer.flush()
+        assert writer.failed == [record] and written == []
+
+        writer.close()
+        assert writer.failed == [] and written == [record]
+        assert db.exists(Round(round_id=1))
+        assert writer.pending_deltas() == {}
+
+    def test_paused(self):
+        ranked = []
+        writer = RoundWriter(self.db, on_submitted=ranked.append)
+        record = new_round(no_rounds() + 1)
+        with writer.paused():
+            submit = threading.Thread(target=writer.submit, args=(record,))
+            submit.start()
+            submit.join(0.05)
+            assert submit.is_alive()
+            assert ranked == [] and writer.pending_deltas() == {}
+        submit.join()
+        writer.flush()
+        assert ranked == [record]
+
+        # written rounds are settled before a pause starts
+        with writer.paused():
+            assert writer.pending_deltas() == {}
+            assert self.count("result") == no_results() + 4
+        writer.close()
+
+    def test_backpressure(self):
+        writer = RoundWriter(self.db, max_pending=1, retry_delay=0.001)
+        deferred = new_round(no_rounds() + 3)
+        with self.db.lock:
+            assert writer.submit(new_round(no_rounds() + 1))
+            assert writer.submit(new_round(no_rounds() + 2), 1.0)
+            with self.assertLogs("matchmaker.writer", "WARNING"):
+                assert not writer.submit(deferred, 0.01)
+            assert writer.failed == [deferred]
+            assert writer.pending_deltas()[2] == -30.0
+        writer.close()
+        assert writer.failed == []
+        assert self.count("result") == no_results() + 12
+        assert not writer.submit(new_round(no_rounds() + 4))